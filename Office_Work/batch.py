@@ -0,0 +1,98 @@
+from excel_ingest import EXCEL_WORKERS, streams_excel, worker_pool, xlsx_totals
+from segmentation import MerchantTotals, csv_chunks
+import os
+import shutil
+import zipfile
+import pandas as pd
+
+# Settlement files for /retrieve/batch: any number of uploads, each a CSV/Excel file or a ZIP of them.
+# Uploads are saved to the request's temp directory (ZIPs unpacked there) and each file is parsed
+# and totalled in the parsing pool (excel_ingest.worker_pool), so a month of files spreads over the
+# cores instead of taking 30 round trips. A file that cannot be read is reported, not fatal.
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 100))
+BATCH_MAX_BYTES = int(os.environ.get('BATCH_MAX_BYTES', 2 * 1024 ** 3))  # Unzipped, across the batch
+SETTLEMENT_EXTENSIONS = ('.csv', '.xlsx', '.xlsm', '.xls')
+
+class BatchRejected(ValueError):
+    pass
+
+def is_settlement_file(name):
+    return name.lower().endswith(SETTLEMENT_EXTENSIONS)
+
+def save_uploads(files, directory):
+    """ Saves the uploads, and the settlement files inside any ZIP, under directory.
+
+    Returns (saved, skipped): saved lists (name, path) in upload order, a ZIP member named by its
+    path in the archive; skipped lists {"file", "reason"} for what is not a settlement file.
+    Raises BatchRejected past BATCH_MAX_FILES files or BATCH_MAX_BYTES unzipped bytes.
+    """
+    saved, skipped, total = [], [], 0
+
+    def target(name):
+        if len(saved) == BATCH_MAX_FILES:
+            raise BatchRejected(f"More than {BATCH_MAX_FILES} files in one batch")
+        return os.path.join(directory, f'{len(saved)}-{os.path.basename(name)}')
+
+    for file in files:
+        if not file.filename.lower().endswith('.zip'):
+            if not is_settlement_file(file.filename):
+                skipped.append({"file": file.filename, "reason": "not a CSV or Excel file"})
+                continue
+            path = target(file.filename)
+            file.save(path)
+            saved.append((file.filename, path))
+            total += os.path.getsize(path)
+            if total > BATCH_MAX_BYTES:
+                raise BatchRejected(f"Batch is larger than {BATCH_MAX_BYTES} bytes")
+        else:
+            try:
+                archive = zipfile.ZipFile(file.stream)
+            except zipfile.BadZipFile:
+                skipped.append({"file": file.filename, "reason": "not a readable ZIP"})
+                continue
+            with archive:
+                for member in archive.infolist():
+                    if member.is_dir():
+                        continue
+                    if not is_settlement_file(member.filename):
+                        skipped.append({"file": member.filename, "reason": "not a CSV or Excel file"})
+                        continue
+                    total += member.file_size  # zipfile never reads past the declared size
+                    if total > BATCH_MAX_BYTES:
+                        raise BatchRejected(f"Batch is larger than {BATCH_MAX_BYTES} bytes unzipped")
+                    path = target(member.filename)
+                    with archive.open(member) as source, open(path, 'wb') as f:
+                        shutil.copyfileobj(source, f)
+                    saved.append((member.filename, path))
+    return saved, skipped
+
+def file_totals(path, name, brand_mapping, details, chunk_rows):
+    """ (MerchantTotals, None) of one saved settlement file, or (None, reason) if it cannot be read.
+    Runs in a pool process, so its sheets are parsed here rather than in the pool. """
+    try:
+        totals = MerchantTotals(brand_mapping, details)
+        if name.lower().endswith('.csv'):
+            for chunk in csv_chunks(path, chunk_rows):
+                totals.add(chunk, continues=True)
+        elif streams_excel(name):
+            totals = xlsx_totals(path, brand_mapping, details, chunk_rows, parallel=False)
+        else:
+            excel_data = pd.ExcelFile(path)
+            for sheet_name in excel_data.sheet_names:
+                totals.add(pd.read_excel(excel_data, sheet_name=sheet_name, header=None))
+        totals.open_header = None
+        return totals, None
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+def batch_totals(saved, brand_mapping, details, chunk_rows):
+    """ Yields (name, totals, reason) for each saved file, in upload order, parsing files in parallel. """
+    names = [name for name, _ in saved]
+    paths = [path for _, path in saved]
+    args = (brand_mapping, details, chunk_rows)
+    if EXCEL_WORKERS > 1 and len(saved) > 1:
+        outcomes = worker_pool().map(file_totals, paths, names, *([arg] * len(saved) for arg in args))
+    else:
+        outcomes = (file_totals(path, name, *args) for name, path in saved)
+    for name, (totals, reason) in zip(names, outcomes):
+        yield name, totals, reason
@@ -0,0 +1,109 @@
+""" Excel ingest of a multi-sheet settlement workbook: the streamed, column-projected reader against pd.read_excel.
+
+The workbook is written to a temp .xlsx with --sheets sheets of --rows rows each, laid out like
+bench_segmentation.py's sheets (41 columns, of which /retrieve uses 7), with the other 34 columns
+filled as in a real export (numbers, dates, repeated codes). The old path is what /retrieve
+did before excel_ingest.py: pd.ExcelFile, pd.read_excel of every sheet, then merchant_results. Both
+must give the same results. The streamed reader is timed with each --workers count (0 = inline).
+
+    python benchmarks/bench_excel_ingest.py [--sheets 4] [--rows 50000] [--blocks 20] [--seed 7]
+                                            [--workers 0 4] [--chunk-rows 100000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import excel_ingest  # noqa: E402
+from bench_segmentation import settlement_sheet  # noqa: E402
+from segmentation import USED_COLUMNS, merchant_results  # noqa: E402
+from merchant_registry import registry  # noqa: E402
+
+
+def fill_unused(df, seed):
+    """ Puts values in the columns /retrieve ignores: amounts, serial numbers, dates and a few codes. """
+    rng = np.random.default_rng(seed)
+    codes = np.array([f"TERM{i:03d}" for i in range(50)], dtype=object)
+    for column in df.columns.difference(USED_COLUMNS):
+        kind = column % 4
+        if kind == 0:
+            df[column] = np.round(rng.random(len(df)) * 1000, 2)
+        elif kind == 1:
+            df[column] = rng.integers(100000000, 999999999, len(df))
+        elif kind == 2:
+            df[column] = np.datetime64("2025-02-01") + rng.integers(0, 28, len(df)).astype("timedelta64[D]")
+        else:
+            df[column] = codes[rng.integers(0, len(codes), len(df))]
+    return df
+
+
+def write_workbook(path, sheets, rows, blocks, seed):
+    workbook = Workbook(write_only=True)
+    for number in range(sheets):
+        df = fill_unused(settlement_sheet(rows, blocks, seed + number), seed + number).astype(object)
+        sheet = workbook.create_sheet(f"Sheet{number + 1}")
+        for row in df.where(df.notna(), None).itertuples(index=False):
+            sheet.append(row)
+    workbook.save(path)
+
+
+def read_excel_results(path):
+    excel_data = pd.ExcelFile(path)
+    sheets = [pd.read_excel(excel_data, sheet_name=s, header=None) for s in excel_data.sheet_names]
+    return merchant_results(sheets, registry.mapping())
+
+
+def streamed_results(path, chunk_rows):
+    with open(path, "rb") as stream:
+        return excel_ingest.workbook_totals(stream, registry.mapping(), True, chunk_rows).results()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sheets", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=50000, help="rows per sheet")
+    parser.add_argument("--blocks", type=int, default=20, help="HD blocks per sheet")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 4], help="EXCEL_WORKERS values to time")
+    parser.add_argument("--chunk-rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        write_workbook(path, args.sheets, args.rows, args.blocks, args.seed)
+        print(f"{args.sheets} sheets x {args.rows} rows, {os.path.getsize(path) / 1e6:.1f} MB, {os.cpu_count()} CPUs")
+
+        started = time.perf_counter()
+        expected = read_excel_results(path)
+        baseline = time.perf_counter() - started
+        print(f"read_excel          {baseline:8.2f} s")
+
+        for workers in args.workers:
+            excel_ingest.EXCEL_WORKERS = workers
+            if excel_ingest.pool is not None:
+                excel_ingest.pool.shutdown()
+                excel_ingest.pool = None
+            if workers > 1:
+                excel_ingest.worker_pool().submit(int).result()  # Pool start-up is paid once per worker, not per request
+            started = time.perf_counter()
+            results = streamed_results(path, args.chunk_rows)
+            seconds = time.perf_counter() - started
+            same = json.dumps(results, sort_keys=True) == json.dumps(expected, sort_keys=True)
+            print(f"streamed, {workers} workers {seconds:8.2f} s  {baseline / seconds:5.1f}x  "
+                  f"{'same results' if same else 'RESULTS DIFFER'}")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
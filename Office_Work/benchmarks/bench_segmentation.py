@@ -0,0 +1,113 @@
+""" HD/DT segmentation of a synthetic settlement sheet: the one-pass engine against the old per-header loop.
+
+The sheet is built in memory with the layout /retrieve expects (record type in column 0, merchant id in
+column 1, brand and outlet on HD rows in columns 13/14, amounts in 19/21/35), with blocks of random
+length and some DT rows for other merchants. The old loop re-filtered the whole sheet for every HD row,
+so it is timed once; the engine is timed best of --repeat. The old loop is timed as /retrieve ran it, so
+its counts differ from the engine's: a merchant's result was overwritten at each of its HD rows, leaving
+only the DT rows after its last HD (later blocks included). The speed-up compares the cost of that loop,
+not of the same rows.
+
+--registry-size pads the merchant registry with made-up brands, to show matching stays flat as it grows.
+
+    python benchmarks/bench_segmentation.py [--rows 1000000] [--blocks 100] [--seed 7] [--repeat 3]
+                                            [--registry-size 6] [--skip-legacy]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from segmentation import merchant_results  # noqa: E402
+from merchant_registry import registry  # noqa: E402
+
+BRAND_MAPPING = registry.mapping().to_dict()
+
+COLUMNS = 41
+
+
+def settlement_sheet(rows, blocks, seed):
+    """ A DataFrame shaped like pd.read_csv(..., header=None) of a settlement file. """
+    rng = np.random.default_rng(seed)
+    brands = np.array(list(BRAND_MAPPING) + ["UNKNOWN BRAND"], dtype=object)
+    merchants = np.array(list(BRAND_MAPPING.values()) + ["999"], dtype=object)
+
+    is_header = np.zeros(rows, dtype=bool)
+    is_header[np.sort(rng.choice(np.arange(1, rows), blocks - 1, replace=False))] = True
+    is_header[0] = True
+    block = np.cumsum(is_header) - 1
+    block_brand = rng.integers(0, len(brands), blocks)
+    # Most DT rows carry their block's merchant id, some another merchant's
+    row_merchant = np.where(rng.random(rows) < 0.9, block_brand[block], rng.integers(0, len(merchants), rows))
+
+    data = {column: np.full(rows, np.nan, dtype=object) for column in range(COLUMNS)}
+    data[0] = np.where(is_header, "HD", "DT").astype(object)
+    data[1] = np.where(is_header, "HDR", merchants[row_merchant]).astype(object)
+    data[13][is_header] = brands[block_brand]
+    data[14][is_header] = [f"Outlet {i}" for i in range(blocks)]
+    for column, scale in ((19, 50), (21, 5), (35, 500)):
+        amounts = np.round(rng.random(rows) * scale, 2)
+        data[column] = np.where(is_header, np.nan, amounts)
+    return pd.DataFrame(data)
+
+
+def legacy_results(df):
+    """ The pre-engine /retrieve loop: every HD re-filters the whole sheet. A merchant's result is overwritten
+    at each of its HD rows, so it holds the DT rows after its last HD, later blocks included. """
+    results = {}
+    header_rows = df[df[0] == "HD"].index
+    for header_row in header_rows:
+        brand_name = str(df.iloc[header_row, 13]).strip().upper()
+        if brand_name in BRAND_MAPPING:
+            merchant_id = BRAND_MAPPING[brand_name]
+            dt_rows = df[(df[0] == "DT") & (df[1].astype(str) == merchant_id) & (df.index > header_row)]
+            if not dt_rows.empty:
+                extracted_data = dt_rows[[19, 21, 35]].copy()
+                extracted_data.columns = ['COMM_AMOUNT', 'VAT_AMOUNT', 'SETT_AMOUNT']
+                extracted_data = extracted_data.apply(pd.to_numeric, errors='coerce').fillna(0)
+                results[merchant_id] = (extracted_data.sum(), extracted_data.to_dict('records'))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--blocks", type=int, default=100, help="HD blocks in the sheet")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3, help="engine runs; the best one counts")
+    parser.add_argument("--registry-size", type=int, default=0, help="registry size (default: merchants.csv)")
+    parser.add_argument("--skip-legacy", action="store_true", help="do not time the old loop")
+    args = parser.parse_args()
+
+    df = settlement_sheet(args.rows, args.blocks, args.seed)
+    brands = registry.mapping()
+    padding = max(args.registry_size - len(brands), 0)
+    brands = pd.concat([brands, pd.Series({f"BRAND {i}": str(2000000000 + i) for i in range(padding)}, dtype=object)])
+    print(f"{args.rows} rows, {args.blocks} HD blocks, seed {args.seed}, {len(brands)} registered merchants")
+
+    best = float("inf")
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        results = merchant_results([df], brands)
+        best = min(best, time.perf_counter() - started)
+    rows = sum(len(result["transaction_details"]) for result in results.values())
+    print(f"engine   {best:9.3f} s  {len(results)} merchants, {rows} DT rows counted")
+
+    if args.skip_legacy:
+        return
+    started = time.perf_counter()
+    legacy = legacy_results(df)
+    seconds = time.perf_counter() - started
+    rows = sum(len(details) for _, details in legacy.values())
+    print(f"legacy   {seconds:9.3f} s  {len(legacy)} merchants, {rows} DT rows counted "
+          f"(from each merchant's last HD on; its earlier blocks overwritten)")
+    print(f"speed-up {seconds / best:9.1f}x  (the old loop's cost; it counts different rows, see above)")
+
+
+if __name__ == "__main__":
+    main()
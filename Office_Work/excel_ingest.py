@@ -0,0 +1,239 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from segmentation import MerchantTotals, TEXT_COLUMNS, USED_COLUMNS
+from xml.etree import ElementTree
+from xml.parsers import expat
+import multiprocessing
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+import zipfile
+import numpy as np
+import pandas as pd
+
+# Excel ingest for .xlsx/.xlsm settlement workbooks. Each sheet's XML is streamed through expat,
+# and only cells in the columns segmentation uses are decoded, picked out by their reference
+# (A1, N1, ...). Every other cell is skipped without building anything. Ids and names become
+# text as pd.read_excel + astype(str) rendered them, and amounts stay numbers. Rows go to
+# MerchantTotals in chunks, so memory does not grow with the sheet.
+# Sheets are independent, so each one is parsed and totalled in its own process (the parsing is
+# Python, so threads would share one core). The per-sheet totals are merged back in sheet order.
+# EXCEL_WORKERS=0 parses the sheets one after another in the request instead.
+# Other formats (.xls, .ods) go through pd.read_excel as before.
+EXCEL_WORKERS = int(os.environ.get('EXCEL_WORKERS', min(4, os.cpu_count() or 1)))
+STREAMED_EXTENSIONS = ('.xlsx', '.xlsm')
+READ_BYTES = 1024 * 1024
+
+MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELATIONSHIP_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+RELATIONSHIP = '{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+# Element names as expat reports them with namespace_separator=' '
+CELL, ROW, VALUE, TEXT, STRING_ITEM, PHONETIC = (f'{MAIN} {name}' for name in ('c', 'row', 'v', 't', 'si', 'rPh'))
+
+COLUMN_POSITIONS = {column: position for position, column in enumerate(USED_COLUMNS)}
+TEXT_POSITIONS = {COLUMN_POSITIONS[column] for column in TEXT_COLUMNS}
+# Strings pd.read_excel reads as NaN by default (its na_values)
+NA_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+             'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+pool = None
+pool_lock = threading.Lock()
+
+def streams_excel(filename):
+    return filename.lower().endswith(STREAMED_EXTENSIONS)
+
+def column_number(letters):
+    """ 0-based column of a cell reference's letters ('N' -> 13). """
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number - 1
+
+def excel_text(value):
+    """ A text cell as pd.read_excel + astype(str) rendered it: whole floats as ints, blanks and NA markers as 'nan'. """
+    if value is None or (isinstance(value, str) and value in NA_VALUES):
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def cell_value(cell_type, text):
+    """ A cell's value from its type attribute and text, as openpyxl reads it (text cells not yet looked up). """
+    if cell_type in ('s', 'str', 'inlineStr'):
+        return text
+    if cell_type == 'd':
+        return datetime.fromisoformat(text) if text else None  # ISO 8601 date cells
+    if cell_type == 'b':
+        return text == '1'
+    if cell_type == 'e' or not text:
+        return None  # #N/A, #DIV/0! ...: pandas reads error cells as NaN
+    return float(text) if '.' in text or 'e' in text or 'E' in text else int(text)
+
+def parse(parser, archive, path, parsed=None):
+    """ Feeds a workbook part to an expat parser; with parsed, yields parsed() after each block. """
+    with archive.open(path) as stream:
+        while True:
+            data = stream.read(READ_BYTES)
+            parser.Parse(data, not data)
+            if parsed:
+                yield parsed()
+            if not data:
+                return
+
+def shared_strings(archive, path):
+    """ The workbook's shared string table (phonetic runs left out, as Excel displays them). """
+    strings, parts = [], []
+    phonetic = 0
+    parser = expat.ParserCreate(namespace_separator=' ')
+
+    def start(name, attributes):
+        nonlocal phonetic
+        if name == PHONETIC:
+            phonetic += 1
+        elif name == STRING_ITEM:
+            parts.clear()
+
+    def end(name):
+        nonlocal phonetic
+        if name == PHONETIC:
+            phonetic -= 1
+        elif name == STRING_ITEM:
+            strings.append(''.join(parts))
+
+    def text(data):
+        if not phonetic:
+            parts.append(data)
+
+    parser.StartElementHandler, parser.EndElementHandler, parser.CharacterDataHandler = start, end, text
+    if path in archive.namelist():
+        for _ in parse(parser, archive, path):
+            pass
+    return strings
+
+def workbook_parts(archive):
+    """ The shared strings path and (name, path) of every worksheet, in workbook order. """
+    relationships = {}
+    for relationship in ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels')).iter(RELATIONSHIP):
+        target = relationship.get('Target')
+        path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+        relationships[relationship.get('Id')] = (relationship.get('Type').rsplit('/', 1)[-1], path)
+    strings = next((path for kind, path in relationships.values() if kind == 'sharedStrings'), 'xl/sharedStrings.xml')
+    sheets = []
+    for sheet in ElementTree.fromstring(archive.read('xl/workbook.xml')).iter(f'{{{MAIN}}}sheet'):
+        kind, path = relationships[sheet.get(RELATIONSHIP_ID)]
+        if kind == 'worksheet':  # Chart sheets have no cells
+            sheets.append((sheet.get('name'), path))
+    return strings, sheets
+
+def sheet_rows(archive, path, strings):
+    """ Yields one sheet's rows in batches as its XML streams in; each row holds its USED_COLUMNS values. """
+    rows, row, parts = [], None, []
+    columns = {}  # Reference letters -> column, as every row repeats them
+    column = position = cell_type = None
+    collecting = False
+    parser = expat.ParserCreate(namespace_separator=' ')
+    parser.buffer_text = True
+
+    def start(name, attributes):
+        nonlocal row, column, position, cell_type, collecting
+        if name == CELL:
+            reference = attributes.get('r')
+            if reference:
+                letters = reference.rstrip('0123456789')
+                column = columns.get(letters)
+                if column is None:
+                    column = columns[letters] = column_number(letters)
+            else:
+                column += 1  # r is optional
+            position = COLUMN_POSITIONS.get(column)
+            cell_type = attributes.get('t')
+            parts.clear()
+        elif name == VALUE or name == TEXT:
+            collecting = position is not None
+        elif name == ROW:
+            row, column, position = [None] * len(USED_COLUMNS), -1, None
+
+    def end(name):
+        nonlocal collecting
+        if name == VALUE or name == TEXT:
+            collecting = False
+        elif name == CELL and position is not None:
+            value = cell_value(cell_type, ''.join(parts))
+            if cell_type == 's':
+                value = strings[int(value)]
+            row[position] = excel_text(value) if position in TEXT_POSITIONS else value
+        elif name == ROW:
+            rows.append(row)
+
+    def text(data):
+        if collecting:
+            parts.append(data)
+
+    def parsed():
+        batch = rows[:]
+        rows.clear()
+        return batch
+
+    parser.StartElementHandler, parser.EndElementHandler, parser.CharacterDataHandler = start, end, text
+    yield from parse(parser, archive, path, parsed)
+
+def sheet_totals(path, sheet_name, brand_mapping, details, chunk_rows):
+    """ MerchantTotals of one sheet, added chunk_rows rows at a time. Runs in a pool process. """
+    totals = MerchantTotals(brand_mapping, details)
+    pending, first_row = [], 0
+
+    def add(chunk):
+        totals.add(pd.DataFrame(chunk, columns=USED_COLUMNS, index=range(first_row, first_row + len(chunk))),
+                   continues=True)
+        return first_row + len(chunk)
+
+    with zipfile.ZipFile(path) as archive:
+        strings_path, sheets = workbook_parts(archive)
+        strings = shared_strings(archive, strings_path)
+        for rows in sheet_rows(archive, dict(sheets)[sheet_name], strings):
+            pending.extend(rows)
+            while len(pending) >= chunk_rows:
+                first_row = add(pending[:chunk_rows])
+                del pending[:chunk_rows]
+    if pending:
+        add(pending)
+    totals.open_header = None  # Only needed between chunks; keeps the pickled result small
+    return totals
+
+def worker_pool():
+    """ This process's parsing pool (sheets here, whole files for /retrieve/batch), started on first use,
+    so never in a gunicorn master before the fork. """
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = ProcessPoolExecutor(EXCEL_WORKERS, mp_context=multiprocessing.get_context('fork'))
+    return pool
+
+def xlsx_totals(path, brand_mapping, details, chunk_rows, parallel=True):
+    """ MerchantTotals of every sheet of an .xlsx/.xlsm file, merged in sheet order. parallel=False
+    parses the sheets here, as a pool process must. """
+    with zipfile.ZipFile(path) as archive:
+        sheet_names = [name for name, _ in workbook_parts(archive)[1]]
+
+    args = (brand_mapping, details, chunk_rows)
+    if parallel and EXCEL_WORKERS > 1 and len(sheet_names) > 1:
+        sheets = worker_pool().map(sheet_totals, [path] * len(sheet_names), sheet_names,
+                                   *([arg] * len(sheet_names) for arg in args))
+    else:
+        sheets = (sheet_totals(path, sheet_name, *args) for sheet_name in sheet_names)
+    totals = MerchantTotals(brand_mapping, details)
+    for sheet in sheets:
+        totals.merge(sheet)
+    return totals
+
+def workbook_totals(stream, brand_mapping, details, chunk_rows):
+    """ xlsx_totals of an .xlsx/.xlsm upload stream. """
+    fd, path = tempfile.mkstemp(prefix='retrieve-', suffix='.xlsx')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+        return xlsx_totals(path, brand_mapping, details, chunk_rows)
+    finally:
+        os.remove(path)
@@ -0,0 +1,23 @@
+import os
+
+# Read by gunicorn from the working directory (see Procfile). testing.py, pandas and openpyxl are
+# imported and warmed up once in the master, then shared copy-on-write by the workers.
+# PRELOAD_APP=0 makes every worker import and warm up on its own instead.
+preload_app = os.environ.get("PRELOAD_APP", "1") != "0"
+
+
+def when_ready(server):
+    if preload_app:
+        import testing
+        try:
+            testing.warm_up()
+        except Exception:
+            server.log.exception("Warm-up failed; workers will start cold")
+            return
+        testing.startup['preloaded'] = True
+        server.log.info("App preloaded and warmed up: %s", testing.startup['seconds'])
+
+
+def post_worker_init(worker):
+    import testing
+    testing.start_warm_up()
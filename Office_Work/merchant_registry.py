@@ -0,0 +1,109 @@
+from threading import Lock
+import csv
+import os
+import sqlite3
+import time
+import pandas as pd
+
+# Brand -> merchant id registry. HD rows name their brand in column 13; its DT rows count when their
+# merchant id is the one registered for that brand. The registry is a CSV file (brand_name,merchant_id)
+# or, for a path ending in .db/.sqlite/.sqlite3, a SQLite table merchants(brand_name, merchant_id).
+# Changes are picked up without a restart: at most every REGISTRY_CHECK_SECONDS a request checks the
+# file (or the database's data_version) and reloads it if it changed. An edit that does not load
+# (duplicate brand, missing column) is reported on GET /merchants and the last good registry stays.
+MERCHANT_REGISTRY = os.environ.get('MERCHANT_REGISTRY',
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), 'merchants.csv'))
+REGISTRY_CHECK_SECONDS = float(os.environ.get('REGISTRY_CHECK_SECONDS', 5))
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS merchants (
+    brand_name TEXT PRIMARY KEY,
+    merchant_id TEXT NOT NULL
+)
+"""
+
+class RegistryError(ValueError):
+    pass
+
+def normalized(rows, source):
+    """ brand -> merchant id Series from (brand_name, merchant_id) pairs, brands as HD rows are matched
+    (stripped, upper case). Its index is a hash table, so mapping HD brands costs the same for 6
+    merchants or 6000. """
+    brands = {}
+    for brand_name, merchant_id in rows:
+        brand = str(brand_name or '').strip().upper()
+        merchant = str(merchant_id or '').strip()
+        if not brand or not merchant:
+            raise RegistryError(f'{source}: every merchant needs a brand_name and a merchant_id')
+        if brands.get(brand, merchant) != merchant:
+            raise RegistryError(f'{source}: {brand} is registered to both {brands[brand]} and {merchant}')
+        brands[brand] = merchant
+    if not brands:
+        raise RegistryError(f'{source}: no merchants registered')
+    return pd.Series(brands, dtype=object)
+
+class MerchantRegistry:
+    def __init__(self, path=MERCHANT_REGISTRY):
+        self.path = path
+        self.lock = Lock()
+        self.brands = None
+        self.version = None  # File stat (or SQLite data_version) the current brands were loaded from
+        self.connection = None
+        self.pid = None
+        self.checked = 0.0
+        self.loaded = None
+        self.error = None
+
+    def is_sqlite(self):
+        return self.path.lower().endswith(SQLITE_EXTENSIONS)
+
+    def current_version(self):
+        if self.is_sqlite():
+            if self.connection is None or self.pid != os.getpid():  # Never use the gunicorn master's connection
+                self.connection, self.pid = sqlite3.connect(self.path, check_same_thread=False), os.getpid()
+                self.connection.execute(SCHEMA)
+            return self.connection.execute('PRAGMA data_version').fetchone()[0]
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def read(self):
+        if self.is_sqlite():
+            return normalized(self.connection.execute('SELECT brand_name, merchant_id FROM merchants'), self.path)
+        with open(self.path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            if not {'brand_name', 'merchant_id'} <= set(reader.fieldnames or ()):
+                raise RegistryError(f'{self.path}: expected brand_name and merchant_id columns')
+            return normalized(((row['brand_name'], row['merchant_id']) for row in reader), self.path)
+
+    def mapping(self):
+        """ The current brand -> merchant id Series, reloaded first if the registry changed.
+        Raises RegistryError if it has never loaded. """
+        with self.lock:
+            if self.brands is None or time.monotonic() - self.checked >= REGISTRY_CHECK_SECONDS:
+                self.checked = time.monotonic()
+                try:
+                    version = self.current_version()
+                    if version != self.version:
+                        self.brands, self.version = self.read(), version
+                        self.loaded, self.error = time.time(), None
+                except (OSError, sqlite3.Error, csv.Error, RegistryError) as e:
+                    self.error = str(e)
+            if self.brands is None:
+                raise RegistryError(f'Merchant registry not loaded: {self.error}')
+            return self.brands
+
+    def status(self):
+        brands = self.mapping()
+        return {
+            "source": self.path,
+            "merchants": len(brands),
+            "loaded": datetime_text(self.loaded),
+            "error": self.error,
+            "brands": [{"brand_name": brand, "merchant_id": merchant} for brand, merchant in brands.items()]
+        }
+
+def datetime_text(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)) if timestamp else None
+
+registry = MerchantRegistry()
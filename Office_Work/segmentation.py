@@ -0,0 +1,130 @@
+import pandas as pd
+
+# HD/DT settlement segmentation. Every HD row opens a block that runs up to the next HD. A running
+# count of HD rows tags each row with its block in one pass, so the sheet is never re-filtered per
+# header, and a single groupby totals every block.
+MERCHANT_COLUMN = 1
+BRAND_COLUMN = 13
+OUTLET_COLUMN = 14
+AMOUNT_COLUMNS = {19: 'COMM_AMOUNT', 21: 'VAT_AMOUNT', 35: 'SETT_AMOUNT'}
+AMOUNTS = list(AMOUNT_COLUMNS.values())
+TEXT_COLUMNS = [0, MERCHANT_COLUMN, BRAND_COLUMN, OUTLET_COLUMN]
+USED_COLUMNS = TEXT_COLUMNS + list(AMOUNT_COLUMNS)  # All a sheet needs
+
+def segment_sheet(df, brand_mapping):
+    """ Splits one sheet into HD blocks and totals each block's DT rows.
+
+    A DT row belongs to the block of the last HD above it, and counts when its merchant id is the
+    one brand_mapping gives that block's brand. Returns (blocks, amounts):
+    blocks  - one row per block with matching DT rows, indexed by block number: merchant_id,
+              brand_name, company_outlet_name and the COMM/VAT/SETT totals;
+    amounts - the counted DT rows' amounts (floats, blanks as 0), with their block number.
+    """
+    record_type = df[0]
+    is_header = record_type == 'HD'
+    block = is_header.cumsum()  # 0 for anything above the first HD
+
+    headers = pd.DataFrame({
+        'brand_name': df.loc[is_header, BRAND_COLUMN].astype(str).str.strip().str.upper().values,
+        'company_outlet_name': df.loc[is_header, OUTLET_COLUMN].astype(str).str.strip().values,
+    }, index=block[is_header].values)
+    headers['merchant_id'] = headers['brand_name'].map(brand_mapping)
+    headers = headers.dropna(subset=['merchant_id'])
+
+    is_detail = (record_type == 'DT') & block.isin(headers.index)
+    owner = block[is_detail].map(headers['merchant_id'])
+    # Stringify merchant ids of candidate rows only, once
+    counted = df.loc[is_detail, MERCHANT_COLUMN].astype(str) == owner
+    rows = df.loc[counted[counted].index, list(AMOUNT_COLUMNS)]
+
+    # Always float, so a chunk whose amounts all happen to be whole numbers reads like the rest
+    amounts = rows.apply(pd.to_numeric, errors='coerce').fillna(0).astype(float).rename(columns=AMOUNT_COLUMNS)
+    amounts['block'] = block[amounts.index]
+    blocks = headers.join(amounts.groupby('block')[AMOUNTS].sum(), how='inner')
+    return blocks, amounts
+
+def records(frame):
+    """ frame.to_dict('records') for the amount columns, built from plain lists (about a third faster). """
+    return [dict(zip(AMOUNTS, values)) for values in zip(*(frame[column].tolist() for column in AMOUNTS))]
+
+class MerchantTotals:
+    """ Running merchant_results: sheets, or consecutive chunks of one sheet, are added one at a time.
+
+    Only each merchant's names, running COMM/VAT/SETT totals and (with details) its counted DT
+    amounts are kept, so a sheet read in chunks never has to be in memory whole. A block may run
+    across chunks: the last HD row seen is kept and put in front of the next chunk.
+    """
+
+    def __init__(self, brand_mapping, details=True):
+        self.brand_mapping = brand_mapping
+        self.details = details
+        self.names = {}  # merchant_id -> (brand_name, company_outlet_name) of its first block
+        self.totals = {}  # merchant_id -> COMM/VAT/SETT totals so far, in order of first appearance
+        self.amounts = {}  # merchant_id -> counted DT amounts, one frame per chunk
+        self.open_header = None  # Last HD row so far, for DT rows continuing its block in the next chunk
+
+    def add(self, df, continues=False):
+        """ Adds a sheet, or with continues=True the next chunk of the sheet added last. """
+        if continues and self.open_header is not None:
+            df = pd.concat([self.open_header, df])
+        header_rows = df.index[df[0] == 'HD']
+        if len(header_rows):
+            self.open_header = df.loc[header_rows[-1:]]
+
+        blocks, amounts = segment_sheet(df, self.brand_mapping)
+        for merchant_id, brand_name, outlet_name, *block_totals in zip(
+                blocks['merchant_id'], blocks['brand_name'], blocks['company_outlet_name'],
+                *(blocks[column].tolist() for column in AMOUNTS)):
+            self.names.setdefault(merchant_id, (brand_name, outlet_name))
+            totals = self.totals.setdefault(merchant_id, [0] * len(AMOUNTS))
+            for i, total in enumerate(block_totals):
+                totals[i] += total
+        if self.details and not amounts.empty:
+            owners = amounts['block'].map(blocks['merchant_id'])
+            for merchant_id, rows in amounts[AMOUNTS].groupby(owners, sort=False):
+                self.amounts.setdefault(merchant_id, []).append(rows)
+
+    def merge(self, other):
+        """ Adds another sheet's MerchantTotals, as if that sheet had been added here. """
+        for merchant_id, totals in other.totals.items():
+            self.names.setdefault(merchant_id, other.names[merchant_id])
+            running = self.totals.setdefault(merchant_id, [0] * len(AMOUNTS))
+            for i, total in enumerate(totals):
+                running[i] += total
+            if self.details:
+                self.amounts.setdefault(merchant_id, []).extend(other.amounts.get(merchant_id, []))
+
+    def results(self):
+        """ Returns {merchant_id: result}, as merchant_results does (without details, no transaction_details). """
+        results = {}
+        for merchant_id, totals in self.totals.items():
+            brand_name, outlet_name = self.names[merchant_id]
+            result = {
+                "brand_name": brand_name,
+                "company_outlet_name": outlet_name,
+                "merchant_id": merchant_id,
+            }
+            for column, total in zip(AMOUNTS, totals):
+                result[column] = round(float(total), 2)
+            if self.details:
+                result["transaction_details"] = records(pd.concat(self.amounts[merchant_id]))
+            results[merchant_id] = result
+        return results
+
+def csv_chunks(stream, chunk_rows):
+    """ Reads a settlement CSV (a path or binary stream) chunk_rows rows at a time, only the used columns. """
+    # Ids and names stay text in every chunk; amounts are parsed as numbers where they are
+    return pd.read_csv(stream, header=None, usecols=USED_COLUMNS, dtype=dict.fromkeys(TEXT_COLUMNS, str),
+                       encoding='utf-8', chunksize=chunk_rows)
+
+def merchant_results(sheets, brand_mapping):
+    """ Returns {merchant_id: result} over all sheets, in order of first appearance.
+
+    Blocks of the same merchant (in any sheet) are added together; brand and outlet names come
+    from its first block. Each result has brand_name, company_outlet_name, merchant_id, the
+    rounded COMM/VAT/SETT totals and transaction_details (one dict per DT row, in file order).
+    """
+    totals = MerchantTotals(brand_mapping)
+    for df in sheets:
+        totals.add(df)
+    return totals.results()
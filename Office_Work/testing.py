@@ -1,21 +1,110 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, request, jsonify, make_response, g, Response
 from flask_cors import CORS
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from contextlib import contextmanager
+from batch import BatchRejected, batch_totals, save_uploads
+from excel_ingest import streams_excel, workbook_totals
+from merchant_registry import RegistryError, registry
+from segmentation import MerchantTotals, csv_chunks
 import pandas as pd
 from io import BytesIO, StringIO
 from datetime import datetime
-import re, os
+import re, os, tempfile, time, threading
 
 app = Flask(__name__)
 CORS(app, origins=["https://coodecrafters.github.io"])
 
-BRAND_MAPPING = {
-    "SFERA": "1000020410",
-    "WOMEN SECRET": "1000027886",
-    "STRADIVARIUS AL MARYAH": "1000058592",
-    "SPRINGFIELD": "1000239457",
-    "ZARA HOME": "1000175313",
-    "LEFTIES": "1000175297"
-}
+# Per-stage timings of /retrieve: receive (multipart body + file read), parse_workbook (CSV/Excel
+# into DataFrames), segment (HD/DT matching and totals) and serialize (JSON response).
+# Exposed as Prometheus histograms on /metrics and per request in the Server-Timing header.
+STAGE_SECONDS = Histogram('retrieve_stage_seconds', 'Time per /retrieve request spent in each stage.', ['stage'],
+                          buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+# CSV uploads are parsed straight from the upload stream, CSV_CHUNK_ROWS rows at a time and only the
+# columns segmentation uses, with each chunk folded into running totals and dropped, so parsing
+# takes the same memory for any file size. ?details=0 leaves out transaction_details, the one part
+# of the response that still grows with the file. .xlsx sheets are streamed the same way (excel_ingest.py).
+CSV_CHUNK_ROWS = int(os.environ.get('CSV_CHUNK_ROWS', 100000))
+
+RETRIEVE_REQUESTS = Counter('retrieve_requests', '/retrieve requests, by result.', ['result'])
+STARTUP_SECONDS = Gauge('startup_seconds', 'Seconds this process spent starting up, by phase.', ['phase'])
+
+# Cold start: gunicorn.conf.py imports this module in the master and runs warm_up() there before
+# forking, so the workers share pandas/openpyxl copy-on-write instead of each importing its own.
+# /ready answers 503 until this process is warm (without gunicorn.conf.py, its first call warms up).
+startup = {'ready': threading.Event(), 'started': False, 'preloaded': False, 'seconds': {}}
+startup_lock = threading.Lock()
+
+def process_started():
+    """ Wall-clock start of this process, from /proc; None where unavailable. """
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/stat') as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith('btime '))
+    except (OSError, IndexError, ValueError, StopIteration):
+        return None
+    return boot_time + start_ticks / os.sysconf('SC_CLK_TCK')
+
+def record_startup(phase, seconds):
+    startup['seconds'][phase] = round(seconds, 3)
+    STARTUP_SECONDS.labels(phase).set(seconds)
+
+def warm_up():
+    """ Parses a tiny built-in CSV and workbook through the same pandas calls /retrieve uses. """
+    started = time.perf_counter()
+    df = pd.read_csv(StringIO('HD,1000020410,\nDT,1000020410,1.5\n'), header=None)
+    workbook = BytesIO()
+    df.to_excel(workbook, header=False, index=False)
+    excel_data = pd.ExcelFile(BytesIO(workbook.getvalue()))
+    for sheet_name in excel_data.sheet_names:
+        sheet = pd.read_excel(excel_data, sheet_name=sheet_name, header=None)
+        sheet[sheet[0] == 'DT'][[1, 2]].apply(pd.to_numeric, errors='coerce').fillna(0).sum()
+    registry.mapping()  # Loads the merchant registry, so a broken one shows up in the start-up log
+    record_startup('warmup', time.perf_counter() - started)
+    process_start = process_started()
+    if process_start is not None:
+        record_startup('ready', time.time() - process_start)
+    startup['ready'].set()
+
+def start_warm_up():
+    """ Warms up in the background, once per process (a no-op after a preloaded warm-up). """
+    with startup_lock:
+        if startup['started'] or startup['ready'].is_set():
+            return
+        startup['started'] = True
+    threading.Thread(target=warm_up_or_start_cold, name='warmup', daemon=True).start()
+
+def warm_up_or_start_cold():
+    try:
+        warm_up()
+    finally:
+        startup['ready'].set()  # A failed warm-up only means the first request pays the cold start
+
+@contextmanager
+def timed(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        g.stage_seconds[stage] = g.stage_seconds.get(stage, 0.0) + time.perf_counter() - started
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    g.stage_seconds = {}
+
+@app.after_request
+def add_server_timing(response):
+    if request.path not in ('/retrieve', '/retrieve/batch') or request.method != 'POST':
+        return response
+    timings = dict(g.stage_seconds, total=time.perf_counter() - g.request_started)
+    if request.path == '/retrieve':  # Batches would skew the per-file histograms; they only get the header
+        for stage, seconds in timings.items():
+            STAGE_SECONDS.labels(stage).observe(seconds)
+        RETRIEVE_REQUESTS.labels({200: 'success', 404: 'no_match'}.get(response.status_code, 'error')).inc()
+    response.headers['Server-Timing'] = ', '.join(f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in timings.items())
+    response.headers['Timing-Allow-Origin'] = 'https://coodecrafters.github.io'
+    return response
 
 def extract_date_from_filename(filename):
     match = re.search(r'(\d{2}\.\d{2}\.\d{2})', filename)
@@ -34,6 +123,28 @@ def keepalive():
         "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     })
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    start_warm_up()
+    status = {
+        "ready": startup['ready'].is_set(),
+        "preloaded": startup['preloaded'],
+        "pid": os.getpid(),
+        "seconds": dict(startup['seconds'])
+    }
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/merchants', methods=['GET'])
+def merchants():
+    try:
+        return jsonify(registry.status())
+    except RegistryError as e:
+        return jsonify({"error": str(e)}), 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
 @app.route('/retrieve', methods=['POST', 'OPTIONS'])
 def retrieve_data():
     # Handle OPTIONS preflight
@@ -45,74 +156,149 @@ def retrieve_data():
         return response
 
     try:
-        if 'excelFile' not in request.files:
-            return jsonify({"error": "No file uploaded"}), 400
+        with timed('receive'):
+            if 'excelFile' not in request.files:
+                return jsonify({"error": "No file uploaded"}), 400
 
-        file = request.files['excelFile']
-        if file.filename == '':
-            return jsonify({"error": "No selected file"}), 400
+            file = request.files['excelFile']
+            if file.filename == '':
+                return jsonify({"error": "No selected file"}), 400
+            is_csv = file.filename.lower().endswith('.csv')
 
         file_date = extract_date_from_filename(file.filename)
+        totals = MerchantTotals(registry.mapping(), details=request.args.get('details') != '0')
 
-        if file.filename.lower().endswith('.csv'):
-            df = pd.read_csv(StringIO(file.read().decode('utf-8')), header=None)
-            sheets = {'csv_data': df}
+        if is_csv:
+            chunks = csv_chunks(file.stream, CSV_CHUNK_ROWS)
+            while True:
+                with timed('parse_workbook'):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                with timed('segment'):
+                    totals.add(chunk, continues=True)
+        elif streams_excel(file.filename):
+            # Sheets are parsed and totalled together (in parallel), so this stage covers both
+            with timed('parse_workbook'):
+                totals = workbook_totals(file.stream, totals.brand_mapping, totals.details, CSV_CHUNK_ROWS)
         else:
-            excel_data = pd.ExcelFile(BytesIO(file.read()))
-            sheets = {s: pd.read_excel(excel_data, sheet_name=s, header=None) for s in excel_data.sheet_names}
+            with timed('parse_workbook'):
+                excel_data = pd.ExcelFile(BytesIO(file.read()))
+                sheets = [pd.read_excel(excel_data, sheet_name=s, header=None) for s in excel_data.sheet_names]
+            with timed('segment'):
+                for sheet in sheets:
+                    totals.add(sheet)
+
+        with timed('segment'):
+            results = totals.results()
+            for result in results.values():
+                result["date"] = file_date
+
+        if not results:
+            return jsonify({"error": "No matching data found in the file"}), 404
 
-        results = {}
+        with timed('serialize'):
+            response = jsonify({
+                "status": "success",
+                "date": file_date,
+                "data": list(results.values())
+            })
+        response.headers['Access-Control-Allow-Origin'] = 'https://coodecrafters.github.io'
+        return response
 
-        for sheet_name, df in sheets.items():
-            header_rows = df[df[0] == "HD"].index
+    except Exception as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Access-Control-Allow-Origin'] = 'https://coodecrafters.github.io'
+        return response, 500
 
-            for header_row in header_rows:
-                brand_name = str(df.iloc[header_row, 13]).strip().upper()
+def day_order(date):
+    """ Sort key for the dd-mm-YYYY dates extract_date_from_filename returns; undated files go last. """
+    return (date is None, datetime.strptime(date, '%d-%m-%Y') if date else None)
 
-                if brand_name in BRAND_MAPPING:
-                    merchant_id = BRAND_MAPPING[brand_name]
-                    outlet_name = str(df.iloc[header_row, 14]).strip()
+@app.route('/retrieve/batch', methods=['POST', 'OPTIONS'])
+def retrieve_batch():
+    """ Many settlement files (several excelFile parts, or ZIPs of them) in one request.
 
-                    dt_rows = df[
-                        (df[0] == "DT") &
-                        (df[1].astype(str) == merchant_id) &
-                        (df.index > header_row)
-                    ]
+    Files are parsed in parallel and grouped by the date in their names. The response has, per day,
+    the files and their merchant results as /retrieve returns them (merged if a day has several
+    files), and per merchant the totals over the whole range with the number of days it appears
+    in. transaction_details are left out unless ?details=1, as a month of them is rarely wanted.
+    """
+    if request.method == 'OPTIONS':
+        response = make_response('', 204)
+        response.headers['Access-Control-Allow-Origin'] = 'https://coodecrafters.github.io'
+        response.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+        return response
 
-                    if not dt_rows.empty:
-                        extracted_data = dt_rows[[19, 21, 35]].copy()
-                        extracted_data.columns = ['COMM_AMOUNT', 'VAT_AMOUNT', 'SETT_AMOUNT']
-                        extracted_data = extracted_data.apply(pd.to_numeric, errors='coerce').fillna(0)
+    try:
+        with tempfile.TemporaryDirectory(prefix='batch-') as directory:
+            with timed('receive'):
+                files = [file for file in request.files.getlist('excelFile') if file.filename]
+                if not files:
+                    return jsonify({"error": "No file uploaded"}), 400
+                saved, skipped = save_uploads(files, directory)
 
-                        totals = extracted_data.sum()
+            details = request.args.get('details') == '1'
+            brand_mapping = registry.mapping()  # One registry version for the whole batch
+            days = {}
+            # Files are parsed and totalled together, in the pool, so this stage covers both
+            with timed('parse_workbook'):
+                for name, totals, reason in batch_totals(saved, brand_mapping, details, CSV_CHUNK_ROWS):
+                    if totals is None:
+                        skipped.append({"file": name, "reason": reason})
+                        continue
+                    day = days.setdefault(extract_date_from_filename(os.path.basename(name)),
+                                          {"files": [], "totals": MerchantTotals(brand_mapping, details)})
+                    day["files"].append(name)
+                    day["totals"].merge(totals)
 
-                        results[merchant_id] = {
-                            "brand_name": brand_name,
-                            "company_outlet_name": outlet_name,
-                            "merchant_id": merchant_id,
-                            "COMM_AMOUNT": round(float(totals['COMM_AMOUNT']), 2),
-                            "VAT_AMOUNT": round(float(totals['VAT_AMOUNT']), 2),
-                            "SETT_AMOUNT": round(float(totals['SETT_AMOUNT']), 2),
-                            "transaction_details": extracted_data.to_dict('records'),
-                            "date": file_date
-                        }
+        with timed('segment'):
+            overall = MerchantTotals(brand_mapping, details=False)
+            day_counts = {}
+            day_results = []
+            for date in sorted(days, key=day_order):
+                results = days[date]["totals"].results()
+                for result in results.values():
+                    result["date"] = date
+                    day_counts[result["merchant_id"]] = day_counts.get(result["merchant_id"], 0) + 1
+                overall.merge(days[date]["totals"])
+                day_results.append({"date": date, "files": days[date]["files"], "data": list(results.values())})
+            totals = list(overall.results().values())
+            for result in totals:
+                result["days"] = day_counts[result["merchant_id"]]
 
-        if not results:
-            return jsonify({"error": "No matching data found in the file"}), 404
+        if not totals:
+            response = jsonify({"error": "No matching data found in the files", "skipped": skipped})
+            response.headers['Access-Control-Allow-Origin'] = 'https://coodecrafters.github.io'
+            return response, 404
 
-        response = jsonify({
-            "status": "success",
-            "date": file_date,
-            "data": list(results.values())
-        })
+        dates = [date for date in days if date is not None]
+        with timed('serialize'):
+            response = jsonify({
+                "status": "success",
+                "from": min(dates, key=day_order) if dates else None,
+                "to": max(dates, key=day_order) if dates else None,
+                "days": day_results,
+                "totals": totals,
+                "skipped": skipped
+            })
         response.headers['Access-Control-Allow-Origin'] = 'https://coodecrafters.github.io'
         return response
 
+    except BatchRejected as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Access-Control-Allow-Origin'] = 'https://coodecrafters.github.io'
+        return response, 413
     except Exception as e:
         response = jsonify({"error": str(e)})
         response.headers['Access-Control-Allow-Origin'] = 'https://coodecrafters.github.io'
         return response, 500
 
+process_start = process_started()
+if process_start is not None:
+    record_startup('import', time.time() - process_start)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 3000))
     app.run(host='0.0.0.0', port=port)
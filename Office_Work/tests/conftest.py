@@ -0,0 +1,6 @@
+import os
+import sys
+
+OFFICE_WORK = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, OFFICE_WORK)
+sys.path.insert(0, os.path.join(OFFICE_WORK, 'benchmarks'))  # bench_segmentation builds random sheets
@@ -0,0 +1,110 @@
+""" /retrieve/batch uploads: limits, skipped members, grouping by day, and ZIPs mixing CSV and .xlsx. """
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import batch
+import testing
+from batch import BatchRejected, batch_totals, save_uploads
+from bench_segmentation import BRAND_MAPPING, settlement_sheet
+from segmentation import AMOUNTS, merchant_results
+
+SHEETS = [settlement_sheet(300, 10, seed) for seed in (11, 12, 13)]
+
+def csv_bytes(df):
+    buffer = io.BytesIO()
+    df.to_csv(buffer, header=False, index=False)
+    return buffer.getvalue()
+
+def xlsx_bytes(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, header=False, index=False)
+    return buffer.getvalue()
+
+def zip_bytes(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+def upload(name, data):
+    return FileStorage(io.BytesIO(data), name)
+
+def totals_of(results):
+    return {merchant: [result[column] for column in AMOUNTS] for merchant, result in results.items()}
+
+def test_non_settlement_files_and_members_are_skipped(tmp_path):
+    files = [
+        upload('Settlement 01.03.25.csv', csv_bytes(SHEETS[0])),
+        upload('notes.txt', b'not a settlement'),
+        upload('month.zip', zip_bytes([('march/Settlement 02.03.25.csv', csv_bytes(SHEETS[1])),
+                                       ('march/readme.md', b'#'), ('march/', b'')])),
+        upload('broken.zip', b'PK not really'),
+    ]
+    saved, skipped = save_uploads(files, str(tmp_path))
+    assert [name for name, _ in saved] == ['Settlement 01.03.25.csv', 'march/Settlement 02.03.25.csv']
+    assert skipped == [{'file': 'notes.txt', 'reason': 'not a CSV or Excel file'},
+                       {'file': 'march/readme.md', 'reason': 'not a CSV or Excel file'},
+                       {'file': 'broken.zip', 'reason': 'not a readable ZIP'}]
+    assert [open(path, 'rb').read() for _, path in saved] == [csv_bytes(SHEETS[0]), csv_bytes(SHEETS[1])]
+
+@pytest.mark.parametrize('zipped', [False, True], ids=['uploads', 'zip-members'])
+def test_file_limit(zipped, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'BATCH_MAX_FILES', 2)
+    members = [(f'{day}.03.25.csv', b'HD') for day in ('01', '02', '03')]
+    files = [upload('month.zip', zip_bytes(members))] if zipped else [upload(*member) for member in members]
+    with pytest.raises(BatchRejected, match='More than 2 files'):
+        save_uploads(files, str(tmp_path))
+    members = members[:2]
+    files = [upload('month.zip', zip_bytes(members))] if zipped else [upload(*member) for member in members]
+    assert len(save_uploads(files, str(tmp_path))[0]) == 2
+
+@pytest.mark.parametrize('zipped, message', [(False, 'larger than 100 bytes'), (True, 'larger than 100 bytes unzipped')],
+                         ids=['uploads', 'zip-members'])
+def test_byte_limit(zipped, message, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'BATCH_MAX_BYTES', 100)
+    members = [('a.csv', b'x' * 60), ('b.csv', b'x' * 60)]
+    files = [upload('month.zip', zip_bytes(members))] if zipped else [upload(*member) for member in members]
+    with pytest.raises(BatchRejected, match=message):
+        save_uploads(files, str(tmp_path))
+
+def test_zip_of_a_csv_and_an_xlsx_gives_each_files_totals(tmp_path):
+    files = [upload('day.zip', zip_bytes([('day/a.csv', csv_bytes(SHEETS[0])), ('day/b.xlsx', xlsx_bytes(SHEETS[1])),
+                                          ('day/c.xlsx', b'not a workbook')]))]
+    saved, _ = save_uploads(files, str(tmp_path))
+    outcomes = list(batch_totals(saved, BRAND_MAPPING, False, 100))
+    assert [name for name, _, _ in outcomes] == ['day/a.csv', 'day/b.xlsx', 'day/c.xlsx']
+    for (_, totals, reason), df in zip(outcomes[:2], SHEETS):
+        assert reason is None
+        assert totals_of(totals.results()) == totals_of(merchant_results([df], BRAND_MAPPING))
+    assert outcomes[2][1] is None and outcomes[2][2]  # Unreadable: reported with a reason
+
+def test_files_are_grouped_by_the_day_in_their_names():
+    files = [
+        (io.BytesIO(csv_bytes(SHEETS[2])), 'Settlement 02.03.25.csv'),
+        (io.BytesIO(zip_bytes([('Settlement 01.03.25.csv', csv_bytes(SHEETS[0])),
+                               ('Settlement 01.03.25.xlsx', xlsx_bytes(SHEETS[1]))])), 'march.zip'),
+        (io.BytesIO(b'x'), 'notes.txt'),
+    ]
+    response = testing.app.test_client().post('/retrieve/batch', data={'excelFile': files},
+                                              content_type='multipart/form-data')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['from'], body['to']) == ('01-03-2025', '02-03-2025')
+    assert [(day['date'], day['files']) for day in body['days']] == [
+        ('01-03-2025', ['Settlement 01.03.25.csv', 'Settlement 01.03.25.xlsx']),
+        ('02-03-2025', ['Settlement 02.03.25.csv']),
+    ]
+    first_day = {result['merchant_id']: [result[column] for column in AMOUNTS] for result in body['days'][0]['data']}
+    assert first_day == totals_of(merchant_results(SHEETS[:2], BRAND_MAPPING))
+    overall = merchant_results(SHEETS, BRAND_MAPPING)
+    assert {result['merchant_id']: [result[column] for column in AMOUNTS] for result in body['totals']} == totals_of(overall)
+    days = {merchant: sum(merchant in merchant_results(sheets, BRAND_MAPPING) for sheets in (SHEETS[:2], SHEETS[2:]))
+            for merchant in overall}
+    assert {result['merchant_id']: result['days'] for result in body['totals']} == days
+    assert body['skipped'] == [{'file': 'notes.txt', 'reason': 'not a CSV or Excel file'}]
+    assert all('transaction_details' not in result for result in body['days'][0]['data'])
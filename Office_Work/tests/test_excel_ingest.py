@@ -0,0 +1,115 @@
+""" The streamed .xlsx reader gives segmentation the same cells pd.read_excel does, for every cell form. """
+import io
+import zipfile
+from xml.sax.saxutils import escape
+
+import pandas as pd
+import pytest
+
+from bench_segmentation import BRAND_MAPPING, settlement_sheet
+from excel_ingest import NA_VALUES, shared_strings, sheet_rows, workbook_parts, xlsx_totals
+from segmentation import TEXT_COLUMNS, USED_COLUMNS, merchant_results
+
+MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+PACKAGE = 'http://schemas.openxmlformats.org/package/2006/relationships'
+DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+def workbook(rows, strings=()):
+    """ A one-sheet .xlsx written by hand, so each cell's XML is exactly as given. """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('[Content_Types].xml', (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '<Override PartName="/xl/sharedStrings.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/></Types>'))
+        archive.writestr('_rels/.rels', (
+            f'<Relationships xmlns="{PACKAGE}"><Relationship Id="rId1" Type="{DOCUMENT}/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'))
+        archive.writestr('xl/workbook.xml', (
+            f'<workbook xmlns="{MAIN}" xmlns:r="{DOCUMENT}"><sheets>'
+            '<sheet name="Settlement" sheetId="1" r:id="rId1"/></sheets></workbook>'))
+        archive.writestr('xl/_rels/workbook.xml.rels', (
+            f'<Relationships xmlns="{PACKAGE}">'
+            f'<Relationship Id="rId1" Type="{DOCUMENT}/worksheet" Target="worksheets/sheet1.xml"/>'
+            f'<Relationship Id="rId2" Type="{DOCUMENT}/sharedStrings" Target="sharedStrings.xml"/></Relationships>'))
+        archive.writestr('xl/sharedStrings.xml', f'<sst xmlns="{MAIN}">' + ''.join(f'<si>{item}</si>' for item in strings)
+                         + '</sst>')
+        archive.writestr('xl/worksheets/sheet1.xml', f'<worksheet xmlns="{MAIN}"><sheetData>'
+                         + ''.join(f'<row r="{i}">{cells}</row>' for i, cells in enumerate(rows, start=1))
+                         + '</sheetData></worksheet>')
+    return buffer.getvalue()
+
+def comparable(value):
+    return None if pd.isna(value) else value
+
+def streamed(data):
+    """ The rows sheet_rows decodes, as segmentation will see them. """
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        strings_path, sheets = workbook_parts(archive)
+        rows = [row for batch in sheet_rows(archive, sheets[0][1], shared_strings(archive, strings_path)) for row in batch]
+    return [[comparable(value) for value in row] for row in rows]
+
+def read_excel(data):
+    """ The same rows from pd.read_excel, text columns rendered with astype(str) as segmentation does. """
+    df = pd.read_excel(io.BytesIO(data), header=None).reindex(columns=USED_COLUMNS).astype(object)
+    for column in TEXT_COLUMNS:
+        df[column] = df[column].astype(str)
+    return [[comparable(value) for value in row] for row in df.itertuples(index=False)]
+
+# Every text column holds some text, as settlement sheets do: pd.read_excel turns a column of numbers
+# and blanks into floats ('101.0'), which a streamed cell cannot know, so ids keep their integer form.
+STRINGS = ['<t>HD</t>', '<t>DT</t>', '<t xml:space="preserve"> zara </t>',
+           '<r><t>Outlet </t></r><r><rPr><b/></rPr><t>A</t></r><rPh sb="0" eb="6"><t>auto</t></rPh>', '<t>N/A</t>']
+CELL_FORMS = {
+    'shared strings': [
+        '<c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>0</v></c><c r="N1" t="s"><v>2</v></c><c r="O1" t="s"><v>3</v></c>',
+        '<c r="A2" t="s"><v>1</v></c><c r="B2" t="s"><v>4</v></c><c r="T2"><v>10</v></c>',
+    ],
+    'inline strings': [
+        '<c r="A1" t="inlineStr"><is><t>HD</t></is></c><c r="B1" t="inlineStr"><is><t>HDR</t></is></c>'
+        '<c r="N1" t="inlineStr"><is><r><t>ZA</t></r><r><t>RA</t></r></is></c>',
+        '<c r="A2" t="inlineStr"><is><t>DT</t></is></c><c r="B2" t="inlineStr"><is><t>101</t></is></c>',
+    ],
+    'cells without r': [
+        '<c t="s"><v>0</v></c><c t="s"><v>0</v></c><c r="N1" t="s"><v>2</v></c><c t="s"><v>3</v></c><c><v>4</v></c>',
+        '<c t="s"><v>1</v></c><c><v>101</v></c><c r="T2"><v>1.5</v></c><c/><c r="V2"><v>2</v></c>',
+    ],
+    'error cells': [
+        '<c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>0</v></c><c r="N1" t="e"><v>#REF!</v></c>'
+        '<c r="O1" t="s"><v>3</v></c><c r="AJ1" t="e"><v>#N/A</v></c>',
+        '<c r="A2" t="s"><v>1</v></c><c r="B2" t="str"><v>101</v></c><c r="O2" t="e"><v>#NAME?</v></c>'
+        '<c r="T2" t="e"><v>#DIV/0!</v></c>',
+    ],
+    'typed values': [
+        '<c r="A1" t="s"><v>0</v></c><c r="B1" t="str"><v>HDR</v></c><c r="N1" t="d"><v>2025-03-01T00:00:00</v></c>'
+        '<c r="O1" t="s"><v>3</v></c><c r="T1" t="b"><v>1</v></c>',
+        '<c r="A2" t="s"><v>1</v></c><c r="B2"><v>101</v></c><c r="N2"><v>101.5</v></c><c r="O2"><v>-3</v></c>'
+        '<c r="T2"><v>12.50</v></c><c r="V2"><v>1E-2</v></c><c r="AJ2" t="b"><v>0</v></c>',
+    ],
+}
+
+@pytest.mark.parametrize('form', list(CELL_FORMS))
+def test_cells_read_as_pd_read_excel_reads_them(form):
+    data = workbook(CELL_FORMS[form], STRINGS)
+    assert streamed(data) == read_excel(data)
+
+def test_na_markers_read_as_blanks():
+    strings = [f'<t>{escape(value)}</t>' for value in sorted(NA_VALUES) if value] + ['<t>HD</t>']
+    rows = [f'<c r="A{i}" t="s"><v>{len(strings) - 1}</v></c><c r="B{i}" t="s"><v>{i - 1}</v></c>'
+            for i in range(1, len(strings))]
+    data = workbook(rows, strings)
+    assert streamed(data) == read_excel(data)
+    assert all(row[1] is None for row in streamed(data))
+
+def test_xlsx_totals_match_the_pandas_path(tmp_path):
+    df = settlement_sheet(600, 15, seed=6)
+    path = tmp_path / 'settlement.xlsx'
+    df.to_excel(path, header=False, index=False)
+    totals = xlsx_totals(str(path), BRAND_MAPPING, True, 100, parallel=False)
+    assert totals.results() == merchant_results([pd.read_excel(path, header=None)], BRAND_MAPPING)
@@ -0,0 +1,100 @@
+""" HD/DT segmentation: blocks end at the next HD, merchants add up across blocks, chunks and sheets. """
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench_segmentation import BRAND_MAPPING, settlement_sheet
+from segmentation import AMOUNTS, MerchantTotals, csv_chunks, merchant_results
+
+BRANDS = pd.Series({'ZARA': '101', 'MASSIMO DUTTI': '102'}, dtype=object)
+
+def sheet(rows):
+    """ A settlement sheet from (record type, merchant id, brand, outlet, comm, vat, sett) tuples. """
+    data = {column: [np.nan] * len(rows) for column in range(41)}
+    for i, (record_type, merchant, brand, outlet, comm, vat, sett) in enumerate(rows):
+        data[0][i], data[1][i], data[13][i], data[14][i] = record_type, merchant, brand, outlet
+        data[19][i], data[21][i], data[35][i] = comm, vat, sett
+    return pd.DataFrame(data)
+
+def reference(df, brand_mapping):
+    """ Row-by-row totals: a DT row counts for the block of the last HD above it. """
+    totals, owner = {}, None
+    for record_type, merchant, brand, comm, vat, sett in zip(df[0], df[1], df[13], df[19], df[21], df[35]):
+        if record_type == 'HD':
+            owner = brand_mapping.get(str(brand).strip().upper())
+        elif record_type == 'DT' and owner is not None and str(merchant) == owner:
+            running = totals.setdefault(owner, [0.0] * 3)
+            for i, amount in enumerate((comm, vat, sett)):
+                running[i] += 0 if pd.isna(amount) else float(amount)
+    return {merchant: [round(total, 2) for total in running] for merchant, running in totals.items()}
+
+def totals_of(results):
+    return {merchant: [result[column] for column in AMOUNTS] for merchant, result in results.items()}
+
+def test_block_ends_at_the_next_header():
+    df = sheet([
+        ('HD', 'HDR', 'zara ', 'Outlet A', None, None, None),
+        ('DT', '101', None, None, 10, 1, 100),
+        ('DT', '102', None, None, 99, 9, 999),  # Another merchant's row inside ZARA's block
+        ('HD', 'HDR', 'MASSIMO DUTTI', 'Outlet B', None, None, None),
+        ('DT', '101', None, None, 50, 5, 500),  # After the next HD: not ZARA's any more
+        ('DT', '102', None, None, 20, 2, 200),
+    ])
+    results = merchant_results([df], BRANDS)
+    assert totals_of(results) == {'101': [10.0, 1.0, 100.0], '102': [20.0, 2.0, 200.0]}
+    assert results['101']['brand_name'] == 'ZARA' and results['101']['company_outlet_name'] == 'Outlet A'
+    assert results['101']['transaction_details'] == [{'COMM_AMOUNT': 10.0, 'VAT_AMOUNT': 1.0, 'SETT_AMOUNT': 100.0}]
+
+def test_blocks_of_a_merchant_add_up_with_names_from_the_first():
+    df = sheet([
+        ('DT', '101', None, None, 7, 7, 7),  # Above the first HD: no block
+        ('HD', 'HDR', 'ZARA', 'Outlet A', None, None, None),
+        ('DT', '101', None, None, 1, 0.5, 10),
+        ('HD', 'HDR', 'UNKNOWN', 'Outlet X', None, None, None),
+        ('DT', '101', None, None, 8, 8, 8),  # Unregistered brand's block
+        ('HD', 'HDR', 'ZARA', 'Outlet C', None, None, None),
+        ('DT', 101, None, None, 2, 'n/a', 20),  # Merchant id as a number, an unreadable amount
+    ])
+    results = merchant_results([df], BRANDS)
+    assert totals_of(results) == {'101': [3.0, 0.5, 30.0]}
+    assert results['101']['company_outlet_name'] == 'Outlet A'
+    assert len(results['101']['transaction_details']) == 2
+
+@pytest.mark.parametrize('chunk_rows', [2, 7, 1000])
+def test_chunks_give_the_same_results_as_the_whole_sheet(chunk_rows):
+    df = settlement_sheet(600, 15, seed=3)
+    whole = merchant_results([df], BRAND_MAPPING)
+    totals = MerchantTotals(BRAND_MAPPING)
+    for start in range(0, len(df), chunk_rows):
+        totals.add(df.iloc[start:start + chunk_rows], continues=True)
+    assert totals.results() == whole
+    assert totals_of(whole) == reference(df, BRAND_MAPPING)
+
+def test_merge_is_the_same_as_adding_the_sheets_in_order():
+    sheets = [settlement_sheet(2000, 20, seed) for seed in (1, 2)]
+    merged = MerchantTotals(BRAND_MAPPING)
+    for df in sheets:
+        sheet_totals = MerchantTotals(BRAND_MAPPING)
+        sheet_totals.add(df)
+        merged.merge(sheet_totals)
+    assert merged.results() == merchant_results(sheets, BRAND_MAPPING)
+
+def test_without_details_only_totals_are_kept():
+    df = settlement_sheet(2000, 20, seed=4)
+    totals = MerchantTotals(BRAND_MAPPING, details=False)
+    totals.add(df)
+    results = totals.results()
+    assert results and all('transaction_details' not in result for result in results.values())
+    assert totals_of(results) == totals_of(merchant_results([df], BRAND_MAPPING))
+
+def test_csv_chunks_read_the_file_as_one_sheet():
+    df = settlement_sheet(2000, 20, seed=5)
+    buffer = io.BytesIO()
+    df.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    totals = MerchantTotals(BRAND_MAPPING)
+    for chunk in csv_chunks(buffer, 300):
+        totals.add(chunk, continues=True)
+    assert totals_of(totals.results()) == reference(df, BRAND_MAPPING)
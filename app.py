@@ -1,106 +1,122 @@
 from flask import Flask, request, jsonify
-import pdfplumber
-import re
+from engine import DEFAULT_PROFILE, PROFILES, UnknownProfile, pipeline
+from extraction_context import RequestContext
+from jobs import register_job_routes
+from ledger import register_ledger_routes
+from metrics import register_metrics
+from party_names import party_names
+from request_trace import register_trace_routes, start_trace
+from pdf_source import ArchiveRejected, spooled_uploads
+from result_cache import extract_with_cache, result_cache
+from spreadsheet_export import UnknownFormat, export_columns, spreadsheet_response, wants_spreadsheet
+from streaming import ndjson_response, wants_ndjson
+from warmup import register_readiness_routes, startup
 import os
 
-app = Flask(__name__)
-UPLOAD_FOLDER = "uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-VALID_VAT_TERMS = {"Zero Rated", "Not Taxable", "Not Applicable"}
-skipped_files = []  # List to store skipped file names
-
-def extract_invoice_data(pdf_path):
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            text = "\n".join([page.extract_text() for page in pdf.pages if page.extract_text()])
-
-        # Extract Invoice or Credit Note Number
-        invoice_no = re.search(r"INVOICE NUMBER\s*([\w-]+)", text) or re.search(r"CREDIT NOTE NUMBER\s*([\w-]+)", text)
-        
-        # Extract Invoice or Credit Note Date
-        invoice_date = re.search(r"INVOICE DATE\s*([\dA-Za-z-]+)", text) or re.search(r"DATE\s*([\dA-Za-z-]+)", text)
-
-        # Extract Subtotal
-        subtotal = re.search(r"SUBTOTAL\s*([\d.,]+)", text)
-
-        # Extract Total AED
-        total_aed = re.search(r"TOTAL AED\s*([\d.,]+)", text)
-
-        # Initialize Invoice Data
-        invoice_details = {
-            "Invoice No": invoice_no.group(1) if invoice_no else "N/A",
-            "Invoice Date": invoice_date.group(1) if invoice_date else "N/A",
-            "Non Taxable Amount": 0,
-            "Taxable Amount": 0,
-            "VAT Value": 0,
-            "Total AED": float(total_aed.group(1).replace(",", "")) if total_aed else 0
-        }
-
-        # Extract charge description details
-        vat_entries = set()
-        lines = text.split("\n")
-        found_charge_table = False
-
-        for line in lines:
-            if "CHARGE DESCRIPTION" in line:
-                found_charge_table = True
-                continue
-
-            if found_charge_table:
-                match = re.search(r"(.+?)\s+(Zero Rated|Not Taxable|Not Applicable|\d+%=\d+\.\d+)?\s+([\d.,]+)\s+([\d.,]+)", line)
-                if match:
-                    vat_status = match.group(2) if match.group(2) else "Taxable"
-                    vat_entries.add(vat_status)
-
-        # If VAT entries contain disallowed terms, skip the file and log
-        if not vat_entries.issubset(VALID_VAT_TERMS):
-            skipped_files.append(os.path.basename(pdf_path))
-            return None  # Skip this file
-
-        # If all VAT entries are valid, use Subtotal as Non-Taxable Amount
-        subtotal_value = float(subtotal.group(1).replace(",", "")) if subtotal else 0
-        invoice_details["Non Taxable Amount"] = subtotal_value
-        invoice_details["Taxable Amount"] = 0
-        invoice_details["VAT Value"] = 0
-
-        return invoice_details
-
-    except Exception as e:
-        print(f"Error processing {os.path.basename(pdf_path)}: {str(e)}")  # Log error in console
-        return None  # Skip this file
-
-@app.route("/upload", methods=["POST"])
-def upload_file():
-    global skipped_files  # Reset the skipped files list for each request
-    skipped_files = []
-
-    if "file" not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
-
-    uploaded_files = request.files.getlist("file")
-    results = []
-
-    for file in uploaded_files:
-        file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(file_path)
-        extracted_data = extract_invoice_data(file_path)
-
-        if extracted_data:  # Only add if it's not skipped
-            results.append(extracted_data)
-
-    # Print skipped files in a structured format
-    if skipped_files:
-        print("\n===== Skipped Files =====")
-        for skipped in skipped_files:
-            print(skipped)
-        print("========================\n")
-
-    return jsonify(results)
-
-@app.route("/health", methods=["GET"])
-def health_check():
-    return jsonify({"status": "UP"}), 200
+
+def create_app(default_profile=DEFAULT_PROFILE):
+    """ Builds the extraction server. Every profile is served by the same warm worker pool;
+    requests pick one with ?profile=<name> and fall back to default_profile. """
+    app = Flask(__name__)
+
+    def request_profile():
+        return request.args.get("profile", default_profile)
+
+    def request_pipeline():
+        return pipeline(request_profile())
+
+    @app.errorhandler(UnknownProfile)
+    @app.errorhandler(UnknownFormat)
+    def unknown_option(e):
+        return jsonify({"error": str(e)}), 400
+
+    @app.errorhandler(ArchiveRejected)
+    def archive_rejected(e):
+        return jsonify({"error": str(e)}), 413
+
+    @app.route("/upload", methods=["POST"])
+    def upload_file():
+        if "file" not in request.files:
+            return jsonify({"error": "No file uploaded"}), 400
+
+        extract_func, cache_tag = request_pipeline()
+
+        # ?trace=1 (or ?trace=a.pdf,b.pdf) records lines and rule decisions, served from /traces/<id>
+        tracing = start_trace(request_profile())
+        if tracing:
+            extract_func = tracing.bind(extract_func)
+
+        # Accept: application/x-ndjson streams one line per invoice as soon as it is extracted
+        if wants_ndjson():
+            return ndjson_response(request.files.getlist("file"), extract_func, cache_tag, tracing)
+
+        # ?format=csv|xlsx streams a spreadsheet in the column layout of json_to_column_extractor.html
+        export_format = wants_spreadsheet()
+        if export_format:
+            columns = export_columns(PROFILES[request_profile()])
+            return spreadsheet_response(request.files.getlist("file"), extract_func, cache_tag, export_format,
+                                        columns, tracing)
+
+        # Uploads are read in memory (large ones spool to temp files that are removed afterwards);
+        # repeats come from the cache and the rest are extracted across all cores, in upload order.
+        # All state lives in this request's context, so threaded workers can serve requests concurrently.
+        # A single ZIP upload is expanded in memory the same way, with rows also keyed by archive path.
+        with spooled_uploads(request.files.getlist("file")) as uploads:
+            context = RequestContext(by_file=uploads.archive)
+            for outcome in uploads.ignored:
+                context.add(outcome)
+            for outcome in extract_with_cache(extract_func, uploads.sources, cache_tag, tracing and tracing.wants):
+                context.add(outcome)
+                if tracing:
+                    tracing.add(outcome)
+
+        # Skipped files and their reasons are returned alongside the results
+        response = jsonify(context.to_json())
+        response.headers["X-Pages-Skipped"] = str(context.pages_skipped)  # Pages never opened thanks to early exit
+        if tracing:
+            tracing.save()
+            response.headers["X-Trace-Id"] = tracing.id
+        return response
+
+    @app.route("/profiles", methods=["GET"])
+    def list_profiles():
+        return jsonify({
+            "default": default_profile,
+            "profiles": {name: [column for column, _ in profile["columns"]] for name, profile in PROFILES.items()},
+        }), 200
+
+    @app.route("/party-names", methods=["GET"])
+    def party_names_status():
+        return jsonify(party_names.status()), 200
+
+    @app.route("/health", methods=["GET"])
+    def health_check():
+        return jsonify({"status": "UP"}), 200
+
+    # GET /ready: 503 until this worker has warmed up, then 200 with its start-up timings
+    register_readiness_routes(app)
+
+    @app.route("/cache/stats", methods=["GET"])
+    def cache_stats():
+        return jsonify(result_cache.stats()), 200
+
+    # Background batch API: POST /jobs, GET /jobs/<id>, GET /jobs/<id>/result
+    register_job_routes(app, request_pipeline)
+
+    # Queries over every document extracted so far: GET /ledger/invoices, /ledger/totals, /ledger/duplicates
+    register_ledger_routes(app)
+
+    # GET /traces/<id> for requests made with ?trace=
+    register_trace_routes(app)
+
+    # Prometheus GET /metrics, plus a Server-Timing stage breakdown on /upload and POST /jobs
+    register_metrics(app, result_cache)
+
+    return app
+
+
+app = create_app(os.environ.get("EXTRACTION_PROFILE", DEFAULT_PROFILE))
+startup.app_imported()
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,182 @@
+""" Latency, batch throughput and peak RSS of extract_invoice_data for every profile, on synthetic PDFs.
+
+Generates the corpus in memory (see synthetic_invoices.py), so nothing is read from disk and the
+result cache is bypassed. For each profile:
+
+  * per-file latency (p50/p95/mean) of sequential extraction in a fresh process, whose peak RSS
+    is reported as well, so one profile's memory does not leak into the next one's number;
+  * with ROI_EXTRACTION=1 only, the time region-of-interest extraction saves on the templates listed
+    in layout_templates.py: the mean latency of the same run with it off, less the mean with it on
+    (reported, not compared, as it is a difference of two noisy figures);
+  * batch throughput of the whole corpus through the shared process pool, with --workers
+    processes (not EXTRACT_WORKERS, so the figures compare across machines and settings).
+
+Results are compared with benchmarks/baselines.json; the run exits with status 1 when any metric
+is worse than its baseline by more than --threshold. Baselines are machine specific, so refresh
+them with --save-baseline on the machine that runs the comparison. ROI_EXTRACTION is opt-in here as
+it is in the server.
+
+    python benchmarks/bench_extraction.py [--count 40] [--seed 7] [--repeat 3] [--workers 2]
+                                          [--profiles a,b] [--threshold 0.2] [--save-baseline]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from engine import PROFILES, extract_for_pool  # noqa: E402
+import extract_pool  # noqa: E402
+from layout_templates import ROI_EXTRACTION  # noqa: E402
+from pdf_source import PDFSource  # noqa: E402
+from synthetic_invoices import corpus, invoice_pdf  # noqa: E402
+
+BASELINE_FILE = os.path.join(BENCH_DIR, "baselines.json")
+LOWER_IS_BETTER = ["p50_ms", "p95_ms", "mean_ms", "peak_rss_mb"]
+HIGHER_IS_BETTER = ["files_per_s"]
+
+
+def make_sources(count, seed):
+    return [PDFSource(spec.file_name, invoice_pdf(spec, seed), None, spec.number) for spec in corpus(count, seed)]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def measure_latency(profile_name, count, seed, repeat):
+    """ Runs in a fresh process: sequential per-file latency (best of repeat) plus that process's peak RSS. """
+    sources = make_sources(count, seed)
+    latencies = [float("inf")] * len(sources)
+    statuses = {"ok": 0, "skipped": 0, "error": 0}
+    extract_for_pool(sources[0], profile_name)  # Warm up imports and regex caches
+    for run in range(repeat):
+        for i, source in enumerate(sources):
+            started = time.perf_counter()
+            outcome = extract_for_pool(source, profile_name)
+            latencies[i] = min(latencies[i], (time.perf_counter() - started) * 1000)
+            if run == 0:
+                statuses[outcome.status] += 1
+    latencies.sort()
+    return {
+        "p50_ms": round(percentile(latencies, 0.5), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "statuses": statuses,
+    }
+
+
+def latency_in_child(profile_name, count, seed, repeat, roi_extraction):
+    """ measure_latency in a fresh spawned process, with ROI extraction on or off there. """
+    previous = os.environ.get("ROI_EXTRACTION")
+    os.environ["ROI_EXTRACTION"] = "1" if roi_extraction else "0"  # The child reads it on import
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as child:
+            return child.submit(measure_latency, profile_name, count, seed, repeat).result()
+    finally:
+        if previous is None:
+            del os.environ["ROI_EXTRACTION"]
+        else:
+            os.environ["ROI_EXTRACTION"] = previous
+
+
+def measure_throughput(profile_name, sources, repeat):
+    """ Best-of-repeat files per second for the whole batch through the process pool. """
+    extract_func = partial(extract_for_pool, profile_name=profile_name)
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extract_pool.map_in_pool(extract_func, sources)
+        best = min(best, time.perf_counter() - started)
+    return round(len(sources) / best, 2)
+
+
+def compare(results, baseline, threshold):
+    """ Returns the human-readable list of metrics that regressed beyond the threshold. """
+    regressions = []
+    for profile_name, metrics in results.items():
+        base = baseline.get(profile_name)
+        if not base:
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if not base.get(metric):
+                continue
+            change = (metrics[metric] - base[metric]) / base[metric]
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            if change > threshold:
+                regressions.append(f"{profile_name}.{metric}: {base[metric]} -> {metrics[metric]} ({change:+.0%} worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=40, help="synthetic documents per run")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best one counts")
+    parser.add_argument("--workers", type=int, default=2, help="extraction pool processes for the throughput run")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="comma-separated profile names")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed fractional regression")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the results to {BASELINE_FILE}")
+    args = parser.parse_args()
+
+    settings = {"count": args.count, "seed": args.seed, "repeat": args.repeat, "workers": args.workers}
+    extract_pool.EXTRACT_WORKERS = args.workers  # Before the pool starts; it is sized on first use
+    sources = make_sources(args.count, args.seed)
+    extract_pool.map_in_pool(partial(extract_for_pool, profile_name="subtotal"), sources[:args.workers])  # Start it
+
+    results = {}
+    print(f"{args.count} documents, seed {args.seed}, {args.workers} workers, threshold {args.threshold:.0%}")
+    print(f"{'profile':<20}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}{'files/s':>9}{'RSS MB':>9}{'ROI ms':>9}  ok/skipped/error")
+    for profile_name in args.profiles.split(","):
+        metrics = latency_in_child(profile_name, args.count, args.seed, args.repeat, ROI_EXTRACTION)
+        if ROI_EXTRACTION:
+            full_text = latency_in_child(profile_name, args.count, args.seed, args.repeat, False)
+            metrics["roi_saved_ms"] = round(full_text["mean_ms"] - metrics["mean_ms"], 2)
+        metrics["files_per_s"] = measure_throughput(profile_name, sources, args.repeat)
+        results[profile_name] = metrics
+        statuses = metrics["statuses"]
+        print(f"{profile_name:<20}{metrics['p50_ms']:>9}{metrics['p95_ms']:>9}{metrics['mean_ms']:>9}"
+              f"{metrics['files_per_s']:>9}{metrics['peak_rss_mb']:>9}{metrics.get('roi_saved_ms', '-'):>9}  "
+              f"{statuses['ok']}/{statuses['skipped']}/{statuses['error']}")
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump({"settings": settings, "machine": platform.platform(), "profiles": results}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {BASELINE_FILE}")
+        return
+
+    if not os.path.exists(BASELINE_FILE):
+        print("No baseline yet; run with --save-baseline first.")
+        return
+    with open(BASELINE_FILE) as f:
+        baseline = json.load(f)
+    if baseline["settings"] != settings:
+        print(f"Baseline was recorded with {baseline['settings']}, not {settings}; not comparing.")
+        sys.exit(2)
+    regressions = compare(results, baseline["profiles"], args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+""" Per-invoice parse cost of the rule-table scanner vs the old per-field generator scans.
+
+Runs on already-extracted numbered lines, so pdfplumber.open / extract_text time is excluded.
+
+    python benchmarks/bench_field_scanner.py [--invoices 2000] [--rows 25]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from field_rules import CHARGE_TABLE, DOCUMENT_FIELDS, FieldScanner  # noqa: E402
+
+VALID_NON_TAXABLE_TERMS = {"Zero Rated", "Not Taxable", "Not Applicable"}
+STATUSES = ["Zero Rated", "Not Taxable", "5%=2.50", "Not Applicable", ""]
+
+
+def make_lines(rows):
+    """ Builds the numbered lines of a typical one-page carrier invoice. """
+    raw = [
+        "TAX INVOICE",
+        "INVOICE NUMBER INV-204518",
+        "INVOICE DATE 01-Mar-2025",
+        "SHIPPER CONSIGNEE",
+        "ACME LOGISTICS LLC D H TRADING GROUP SPC CO",
+        "BILL OF LADING MAEU123456 VESSEL MSC AURORA VOYAGE 512W",
+        "CHARGE DESCRIPTION VAT AMOUNT TOTAL",
+    ]
+    for i in range(rows):
+        status = STATUSES[i % len(STATUSES)]
+        raw.append(f"Charge line {i} {status} {50 + i}.00 {52 + i}.50".replace("  ", " "))
+    raw += ["TOTAL CHARGES 9,999.00", "SUBTOTAL 9,500.00", "VAT 499.00", "TOTAL AED 9,999.00"]
+    raw += [f"Terms and conditions paragraph {i} of the carrier" for i in range(20)]
+    return [f"{n}: {line}" for n, line in enumerate(raw, start=1)]
+
+
+def legacy_parse(lines):
+    """ The pre-scanner extraction from server.py: one generator scan per field, two searches per hit. """
+    invoice_no = next((re.search(r"(INVOICE NUMBER|CREDIT NOTE NUMBER)\s*([\w-]+)", line, re.IGNORECASE).group(2)
+                       for line in lines if re.search(r"(INVOICE NUMBER|CREDIT NOTE NUMBER)", line, re.IGNORECASE)), "N/A")
+    invoice_date = next((re.search(r"(INVOICE DATE|DATE)\s*([\dA-Za-z-]+)", line, re.IGNORECASE).group(2)
+                         for line in lines if re.search(r"(INVOICE DATE|DATE)", line, re.IGNORECASE)), "N/A")
+    vat_value = sum([float(match.group(1).replace(",", ""))
+                     for line in lines if (match := re.search(r"VAT\s*([\d.,]+)", line))], 0)
+    subtotal = next((float(re.search(r"SUBTOTAL\s*([\d.,]+)", line).group(1).replace(",", ""))
+                     for line in lines if "SUBTOTAL" in line), 0)
+    total_aed = next((float(re.search(r"TOTAL AED\s*([\d.,]+)", line).group(1).replace(",", ""))
+                      for line in lines if "TOTAL AED" in line), 0)
+    non_taxable = taxable = 0
+    relevant_section = False
+    for line in lines:
+        if "CHARGE DESCRIPTION" in line:
+            relevant_section = True
+            continue
+        if "TOTAL CHARGES" in line:
+            relevant_section = False
+        if relevant_section:
+            match = re.search(r"(\d+): (.+?)\s+((?:Zero Rated|Not Taxable|Not Applicable|5%=\d+\.\d+))?\s+([\d.,]+)\s+([\d.,]+)", line)
+            if match:
+                vat_status = match.group(3) if match.group(3) else "Taxable"
+                charge_value = float(match.group(5).replace(",", ""))
+                if vat_status in VALID_NON_TAXABLE_TERMS:
+                    non_taxable += charge_value
+                else:
+                    taxable += charge_value
+    return invoice_no, invoice_date, vat_value, subtotal, total_aed, non_taxable, taxable
+
+
+def scanner_parse(scanner, lines):
+    fields, rows = scanner.scan(lines)
+    non_taxable = sum(value for status, value in rows if status in VALID_NON_TAXABLE_TERMS)
+    taxable = sum(value for status, value in rows if status not in VALID_NON_TAXABLE_TERMS)
+    return (fields["invoice_no"], fields["invoice_date"], fields["vat_value"], fields["subtotal"],
+            fields["total_aed"], non_taxable, taxable)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=25, help="charge-table rows per invoice")
+    args = parser.parse_args()
+
+    lines = make_lines(args.rows)
+    scanner = FieldScanner(DOCUMENT_FIELDS, CHARGE_TABLE)
+    assert legacy_parse(lines) == scanner_parse(scanner, lines), "scanner and legacy parse disagree"
+
+    legacy = min(timeit.repeat(lambda: legacy_parse(lines), number=args.invoices, repeat=3))
+    scanned = min(timeit.repeat(lambda: scanner_parse(scanner, lines), number=args.invoices, repeat=3))
+
+    print(f"{len(lines)} lines/invoice, {args.rows} charge rows, {args.invoices} invoices")
+    print(f"legacy generators : {legacy / args.invoices * 1e6:8.1f} us/invoice")
+    print(f"rule-table scanner: {scanned / args.invoices * 1e6:8.1f} us/invoice")
+    print(f"speed-up          : {legacy / scanned:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+""" Synthetic carrier-style invoice and credit-note PDFs for offline benchmarks.
+
+Writes minimal PDF 1.4 files by hand (Helvetica text only), so no PDF library is needed to
+generate them. Documents follow the layout the extraction rules expect: header fields, a
+SHIPPER/CONSIGNEE block (every other document also has a CONSIGNEE line naming the consignee, which
+the consignee-check profile reads), a charge table that can run over several pages, totals, a remittance
+footer and optional terms-and-conditions pages.
+
+    python benchmarks/synthetic_invoices.py --out /tmp/invoices [--count 50] [--seed 7]
+"""
+import argparse
+import os
+import random
+from collections import namedtuple
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+TOP, BOTTOM, LEADING = 800, 60, 14
+TABLE_LINES_PER_PAGE = 38  # Leaves room below the table for the footer on every page
+
+CONSIGNEES = ["D H TRADING GROUP SPC CO", "DUBAI HOLDING GROUP - INDITEX PROJECT", "INDITEX S.A."]
+SHIPPERS = ["ACME LOGISTICS LLC", "GULF FREIGHT SERVICES", "ORIENT SHIPPING AGENCY"]
+CHARGES = ["Ocean Freight", "Terminal Handling", "Documentation Fee", "Delivery Order", "Port Security",
+           "Inspection", "Storage", "Container Cleaning", "Bill of Lading Fee", "Fuel Surcharge"]
+NON_TAXABLE = ["Zero Rated", "Not Taxable", "Not Applicable"]
+VAT_MIXES = ["non-taxable", "mixed", "taxable"]
+
+InvoiceSpec = namedtuple("InvoiceSpec", "file_name kind number consignee consignee_line rows vat_mix terms_pages")
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages):
+    """ Builds a PDF whose pages each show the given list of text lines, top to bottom. """
+    objects = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>", None]  # 1: font, 2: page tree
+    kids = []
+    for lines in pages:
+        ops = ["BT", "/F1 10 Tf"]
+        for i, line in enumerate(lines):
+            if line:
+                ops.append(f"1 0 0 1 40 {TOP - i * LEADING} Tm ({_escape(line)}) Tj")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 1 0 R >> >> >>" % (PAGE_WIDTH, PAGE_HEIGHT, len(objects)))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, len(objects), xref)
+    return out
+
+
+def _charge_rows(spec, rng):
+    rows = []
+    for i in range(spec.rows):
+        amount = rng.randint(20, 4000) + rng.choice([0, 0.25, 0.5, 0.75])
+        taxable = spec.vat_mix == "taxable" or (spec.vat_mix == "mixed" and i % 3 == 1)
+        if taxable:
+            vat = round(amount * 0.05, 2)
+            rows.append((f"{CHARGES[i % len(CHARGES)]} {i + 1}", f"5%={vat:.2f}", amount, amount + vat))
+        else:
+            rows.append((f"{CHARGES[i % len(CHARGES)]} {i + 1}", rng.choice(NON_TAXABLE), amount, amount))
+    return rows
+
+
+def invoice_pdf(spec, seed=0):
+    """ Renders one InvoiceSpec to PDF bytes. """
+    rng = random.Random(f"{seed}:{spec.number}")
+    credit_note = spec.kind == "credit-note"
+    header = [
+        "CREDIT NOTE" if credit_note else "TAX INVOICE",
+        f"{'CREDIT NOTE' if credit_note else 'INVOICE'} NUMBER {spec.number}",
+        f"INVOICE DATE {rng.randint(1, 28):02d}-Mar-2025",
+        "SHIPPER CONSIGNEE",
+        f"{rng.choice(SHIPPERS)} {spec.consignee}",
+    ] + ([f"CONSIGNEE {spec.consignee}"] if spec.consignee_line else []) + [
+        f"BILL OF LADING MAEU{rng.randint(100000, 999999)} VESSEL MSC AURORA VOYAGE {rng.randint(100, 999)}W",
+        "",
+        "CHARGE DESCRIPTION VAT AMOUNT TOTAL",
+    ]
+    rows = _charge_rows(spec, rng)
+    subtotal = sum(amount for _, _, amount, _ in rows)
+    total = sum(total for _, _, _, total in rows)
+    body = [f"{name} {status} {amount:,.2f} {line_total:,.2f}" for name, status, amount, line_total in rows]
+    body += [f"TOTAL CHARGES {total:,.2f}", f"SUBTOTAL {subtotal:,.2f}", f"VAT {total - subtotal:,.2f}",
+             f"TOTAL AED {total:,.2f}"]
+    footer = [f"Please remit to account {rng.randint(10 ** 9, 10 ** 10 - 1)} quoting the document number",
+              "Payment due within 30 days. Disputes must be raised within 7 days of the document date."]
+    footer_row = (TOP - BOTTOM) // LEADING - len(footer)
+
+    pages = []
+    lines = header
+    for line in body:
+        if len(lines) >= TABLE_LINES_PER_PAGE:
+            pages.append(lines)
+            lines = ["CHARGE DESCRIPTION (CONTINUED) VAT AMOUNT TOTAL"]
+        lines.append(line)
+    pages.append(lines)
+    pages = [page + [""] * (footer_row - len(page)) + footer for page in pages]
+    for n in range(spec.terms_pages):
+        pages.append([f"Terms and conditions of carriage, clause {n + 1}.{i + 1}: the carrier shall not be liable "
+                      f"for delay or loss arising from causes beyond its control." for i in range(45)])
+    return make_pdf(pages)
+
+
+def corpus(count, seed=0):
+    """ A deterministic mix of invoices and credit notes with varying pages, table sizes and VAT mixes. """
+    rng = random.Random(seed)
+    specs = []
+    for i in range(count):
+        kind = "credit-note" if i % 5 == 4 else "invoice"
+        number = f"{'CN' if kind == 'credit-note' else 'INV'}-{100000 + i}"
+        specs.append(InvoiceSpec(
+            file_name=f"{number}.pdf",
+            kind=kind,
+            number=number,
+            consignee=CONSIGNEES[i // len(VAT_MIXES) % len(CONSIGNEES)],  # Every consignee gets every VAT mix
+            consignee_line=i % 2 == 0,
+            rows=rng.choice([3, 8, 15, 30, 60]),
+            vat_mix=VAT_MIXES[i % len(VAT_MIXES)],
+            terms_pages=rng.choice([0, 0, 1, 3]),
+        ))
+    return specs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", required=True, help="directory to write the PDFs to")
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for spec in corpus(args.count, args.seed):
+        with open(os.path.join(args.out, spec.file_name), "wb") as f:
+            f.write(invoice_pdf(spec, args.seed))
+    print(f"Wrote {args.count} PDFs to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
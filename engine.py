@@ -0,0 +1,345 @@
+from extraction_context import FileOutcome
+from field_rules import CHARGE_TABLE, DOCUMENT_FIELDS, FieldRule, FieldScanner, stripped
+from functools import partial
+from layout_templates import ROI_EXTRACTION, charges_outside, covers_fields, match_template, region_texts
+from page_text import PageText, rss_bytes
+from prefilter import PREFILTER, first_page_rejects, first_page_text
+from party_names import party_names
+from pdf_source import open_pdf
+import pdfplumber
+import re
+
+# One extraction engine for every workflow. The rules that used to be split across app.py and
+# server.py .. server6.py are composable behaviours, and a profile picks one of each:
+#
+#   layout      "text":  regexes over the joined page text (app.py, server3.py, server5.py)
+#               "lines": one-pass FieldScanner over numbered lines (server.py, server4.py, server6.py)
+#   accounting  "subtotal": SUBTOTAL is reported as non-taxable, files with taxable charges are skipped
+#               "line-sum": charge rows are summed per VAT status, all-non-taxable files are skipped
+#   tax_invoice_exemption  files named "... TAX INVOICE ..." are never skipped as all-non-taxable
+#   consignee   None
+#               "text-filter": skip unless CONSIGNEE_NAME appears anywhere (server3.py)
+#               "field-check": skip unless the CONSIGNEE field contains CONSIGNEE_NAME (server4.py)
+#               "base-names": longest known party name on the line under SHIPPER/CONSIGNEE (server5.py)
+#               "base-names-suffix": longest known party name ending that line is the consignee (server6.py)
+#   columns     output keys, in order, mapped to internal field names
+
+VALID_NON_TAXABLE_TERMS = {"Zero Rated", "Not Taxable", "Not Applicable"}
+CONSIGNEE_NAME = "D H TRADING GROUP SPC CO"  # Required consignee name
+# Known party names for the base-names modes live in party_names.txt (see party_names.py)
+RULES_VERSION = "engine-1"  # Bump when the extraction rules change, to invalidate cached results
+
+SUBTOTAL_RULES = {"layout": "text", "accounting": "subtotal", "tax_invoice_exemption": False}
+LINE_SUM_RULES = {"layout": "lines", "accounting": "line-sum", "tax_invoice_exemption": True}
+
+PROFILES = {
+    "subtotal": {**SUBTOTAL_RULES, "consignee": None, "columns": [
+        ("Invoice No", "invoice_no"), ("Invoice Date", "invoice_date"),
+        ("Non Taxable Amount", "non_taxable"), ("Taxable Amount", "taxable"),
+        ("VAT Value", "vat_value"), ("Total AED", "total_aed"),
+    ]},
+    "consignee-filter": {**SUBTOTAL_RULES, "consignee": "text-filter", "columns": [
+        ("Invoice No", "invoice_no"), ("Invoice Date", "invoice_date"), ("Consignee Name", "consignee"),
+        ("Non Taxable Amount", "non_taxable"), ("Taxable Amount", "taxable"),
+        ("VAT Value", "vat_value"), ("Total AED", "total_aed"),
+    ]},
+    "shipper-consignee": {**SUBTOTAL_RULES, "consignee": "base-names", "columns": [
+        ("Invoice No", "invoice_no"), ("Invoice Date", "invoice_date"),
+        ("Shipper", "shipper"), ("Consignee", "consignee"),
+        ("Non Taxable Amount", "non_taxable"), ("Taxable Amount", "taxable"),
+        ("VAT Value", "vat_value"), ("Total AED", "total_aed"),
+    ]},
+    "tax-invoice": {**LINE_SUM_RULES, "consignee": None, "columns": [
+        ("Document No", "invoice_no"), ("Document Date", "invoice_date"), ("VAT Value", "vat_value"),
+        ("Non Taxable Amount", "non_taxable"), ("Taxable Amount", "taxable"), ("Total AED", "total_aed"),
+    ]},
+    "consignee-check": {**LINE_SUM_RULES, "consignee": "field-check", "columns": [
+        ("Invoice No", "invoice_no"), ("Invoice Date", "invoice_date"), ("Consignee Name", "consignee"),
+        ("VAT Value", "vat_value"), ("Non Taxable Amount", "non_taxable"), ("Taxable Amount", "taxable"),
+        ("Total AED", "total_aed"),
+    ]},
+    "party-split": {**LINE_SUM_RULES, "consignee": "base-names-suffix", "columns": [
+        ("Document No", "invoice_no"), ("Document Date", "invoice_date"),
+        ("Shipper", "shipper"), ("Consignee", "consignee"), ("VAT Value", "vat_value"),
+        ("Non Taxable Amount", "non_taxable"), ("Taxable Amount", "taxable"), ("Total AED", "total_aed"),
+    ]},
+}
+DEFAULT_PROFILE = "subtotal"
+
+# Once all of these have been seen, the remaining pages are not extracted
+LAYOUT_MARKERS = {
+    "text": [r"INVOICE NUMBER|CREDIT NOTE NUMBER", r"DATE", r"SUBTOTAL", r"TOTAL AED", r"TOTAL CHARGES"],
+    "lines": [r"(?i)INVOICE NUMBER|CREDIT NOTE NUMBER", r"(?i)DATE", r"VAT\s*[\d.,]+", r"SUBTOTAL",
+              r"TOTAL AED", r"TOTAL CHARGES"],
+}
+CONSIGNEE_MARKERS = {
+    None: [],
+    "text-filter": [re.escape(CONSIGNEE_NAME)],
+    "field-check": [r"CONSIGNEE"],
+    "base-names": [r"SHIPPER.*CONSIGNEE"],
+    "base-names-suffix": [r"SHIPPER CONSIGNEE"],
+}
+for _profile in PROFILES.values():
+    _profile["markers"] = [re.compile(p) for p in
+                           LAYOUT_MARKERS[_profile["layout"]] + CONSIGNEE_MARKERS[_profile["consignee"]]]
+    # Single-consignee profiles reject other consignees' files from page 1 (see prefilter.py)
+    _profile["prefilter"] = _profile["consignee"] in ("text-filter", "field-check")
+
+# "text" layout patterns
+INVOICE_NUMBER = re.compile(r"INVOICE NUMBER\s*([\w-]+)")
+CREDIT_NOTE_NUMBER = re.compile(r"CREDIT NOTE NUMBER\s*([\w-]+)")
+INVOICE_DATE = re.compile(r"INVOICE DATE\s*([\dA-Za-z-]+)")
+ANY_DATE = re.compile(r"DATE\s*([\dA-Za-z-]+)")
+SUBTOTAL = re.compile(r"SUBTOTAL\s*([\d.,]+)")
+TOTAL_AED = re.compile(r"TOTAL AED\s*([\d.,]+)")
+TEXT_CHARGE_ROW = re.compile(r"(.+?)\s+(Zero Rated|Not Taxable|Not Applicable|\d+%=\d+\.\d+)?\s+([\d.,]+)\s+([\d.,]+)")
+
+# "lines" layout scanners
+LINE_SCANNER = FieldScanner(DOCUMENT_FIELDS, CHARGE_TABLE)
+LINE_SCANNER_WITH_CONSIGNEE = FieldScanner(DOCUMENT_FIELDS + [
+    FieldRule("consignee", "CONSIGNEE", r"(?i)CONSIGNEE\s*(?P<value>.+)", "first", stripped, "N/A"),
+], CHARGE_TABLE)
+
+
+class UnknownProfile(ValueError):
+    pass
+
+
+def get_profile(name):
+    if name not in PROFILES:
+        raise UnknownProfile(f"Unknown profile '{name}'. Choose one of: {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+def read_full_text(pdf, outcome, profile, first_page=None):
+    """ Returns the joined page text, extracting each page once and stopping at the profile's markers.
+    first_page is page 1's text if it was already extracted.
+
+    Returns None (and skips the file) when a page or memory budget ran out before every marker was seen.
+    """
+    pages = PageText(pdf, profile["markers"], first_page=first_page)  # One extract_text per page, early exit
+    text = "\n".join(pages)
+    outcome.count_pages(pages)
+    if pages.stopped and not pages.complete:
+        return outcome.skip(pages.stopped, pages.stopped_detail)
+    return text
+
+
+def read_text(source, outcome, profile):
+    """ Returns the text the profile's rules run on.
+
+    With ROI_EXTRACTION on, known templates are read region by region (see layout_templates.py); unknown
+    layouts, regions that turn out to miss a field and charge lines outside them fall back to the full text. Returns None (and skips the file) when
+    the page 1 pre-filter rejects it or a budget runs out.
+    """
+    start_rss = rss_bytes()
+    with outcome.stage("open"):
+        pdf = pdfplumber.open(open_pdf(source))
+    with pdf:
+        first_page = None
+        if PREFILTER and profile["prefilter"]:
+            with outcome.stage("prefilter"):
+                first_page = first_page_text(pdf)
+                reason = first_page_rejects(first_page, CONSIGNEE_NAME)
+            if reason:
+                outcome.pages_read = 1
+                outcome.pages_skipped = len(pdf.pages) - 1
+                outcome.layout = "prefilter"
+                if outcome.trace is not None:
+                    outcome.record("layout", {"layout": "prefilter", "pages_skipped": outcome.pages_skipped})
+                return outcome.skip(reason)
+
+        with outcome.stage("extract_text"):
+            # The prefilter has already laid out page 1 in full, so reading its regions again saves nothing
+            template = match_template(pdf) if ROI_EXTRACTION and first_page is None else None
+            texts = None
+            if template:
+                texts, pages_read = region_texts(pdf, template)
+                if texts is not None and (not covers_fields(texts, profile["markers"])
+                                          or charges_outside(pdf, template)):
+                    texts = None
+            if texts is None:
+                outcome.layout = "full-text"
+                text = read_full_text(pdf, outcome, profile, first_page)
+                if outcome.trace is not None:
+                    outcome.record("layout", {"layout": "full-text", "pages_read": outcome.pages_read,
+                                              "pages_skipped": outcome.pages_skipped,
+                                              "peak_memory_mb": outcome.peak_memory_mb})
+                return text
+            outcome.pages_read += pages_read
+            outcome.pages_skipped += len(pdf.pages) - pages_read
+            outcome.peak_memory_bytes = max(0, rss_bytes() - start_rss)
+            outcome.layout = template.name
+            if outcome.trace is not None:
+                outcome.record("layout", {"layout": template.name, "pages_read": pages_read,
+                                          "pages_skipped": outcome.pages_skipped})
+    return "\n".join(text for text in texts if text)
+
+
+def number_lines(text):
+    """ Prefixes every line with its 1-based number, as the "lines" layout rules expect. """
+    return [f"{line_number}: {line.strip()}" for line_number, line in enumerate(text.split("\n"), start=1)]
+
+
+def parse_text_layout(text):
+    """ app.py-style parse: header fields by regex over the whole text, VAT statuses of every charge row. """
+    invoice_no = INVOICE_NUMBER.search(text) or CREDIT_NOTE_NUMBER.search(text)
+    invoice_date = INVOICE_DATE.search(text) or ANY_DATE.search(text)
+    subtotal = SUBTOTAL.search(text)
+    total_aed = TOTAL_AED.search(text)
+    fields = {
+        "invoice_no": invoice_no.group(1) if invoice_no else "N/A",
+        "invoice_date": invoice_date.group(1) if invoice_date else "N/A",
+        "subtotal": float(subtotal.group(1).replace(",", "")) if subtotal else 0,
+        "total_aed": float(total_aed.group(1).replace(",", "")) if total_aed else 0,
+        "vat_value": 0,
+    }
+
+    # Every row after CHARGE DESCRIPTION counts; only the VAT status is used
+    charge_rows = []
+    found_charge_table = False
+    for line in text.split("\n"):
+        if "CHARGE DESCRIPTION" in line:
+            found_charge_table = True
+            continue
+        if found_charge_table:
+            match = TEXT_CHARGE_ROW.search(line)
+            if match:
+                charge_rows.append((match.group(2) or "Taxable", 0))
+    return fields, charge_rows
+
+
+def split_on_base_names(lines, outcome):
+    """ server5.py rule: on the line under SHIPPER/CONSIGNEE, the longest known party name is the consignee. """
+    for i, line in enumerate(lines):
+        if "SHIPPER" in line and "CONSIGNEE" in line:
+            if i + 1 >= len(lines):
+                break
+            names_line = lines[i + 1]
+            if outcome.trace is not None:
+                outcome.record("shipper_consignee_lines", [line, names_line])
+            match = party_names.matcher().find_longest(names_line)
+            if match:
+                name, start, end = match
+                return " ".join((names_line[:start] + names_line[end:]).split()), name
+            return names_line.strip(), "N/A"  # Fallback if no match
+    return "N/A", "N/A"
+
+
+def split_on_base_name_suffix(lines):
+    """ server6.py rule: the longest known party name ending the line under SHIPPER CONSIGNEE is the consignee. """
+    for i, line in enumerate(lines):
+        if "SHIPPER CONSIGNEE" in line:
+            if i + 1 < len(lines):
+                next_line = lines[i + 1].split(": ", 1)[1]  # Remove line number
+                match = party_names.matcher().find_suffix(next_line)
+                if match:
+                    name, start, _ = match
+                    return next_line[:start].strip(), name
+                return next_line.strip(), "N/A"
+            break
+    return "N/A", "N/A"
+
+
+def apply_profile(text, source, outcome, profile):
+    """ Applies a profile's field, accounting and consignee rules to a document's text. """
+    consignee_mode = profile["consignee"]
+
+    if consignee_mode == "text-filter" and CONSIGNEE_NAME not in text:
+        return outcome.skip("consignee mismatch")
+
+    if profile["layout"] == "lines":
+        if not text:
+            return None
+        lines = number_lines(text)
+        if outcome.trace is not None:
+            outcome.record("lines", lines)
+        scanner = LINE_SCANNER_WITH_CONSIGNEE if consignee_mode == "field-check" else LINE_SCANNER
+        fields, charge_rows = scanner.scan(lines)  # One pass over the lines for every field
+    else:
+        lines = text.split("\n")
+        if outcome.trace is not None:
+            outcome.record("lines", number_lines(text))
+        fields, charge_rows = parse_text_layout(text)
+
+    fields.setdefault("consignee", "N/A")
+    fields["shipper"] = "N/A"
+    if consignee_mode == "text-filter":
+        fields["consignee"] = CONSIGNEE_NAME
+    elif consignee_mode == "base-names":
+        fields["shipper"], fields["consignee"] = split_on_base_names(lines, outcome)
+    elif consignee_mode == "base-names-suffix":
+        fields["shipper"], fields["consignee"] = split_on_base_name_suffix(lines)
+
+    if outcome.trace is not None:
+        outcome.record("fields", dict(fields))  # Copied: the accounting rules below update fields
+        outcome.record("charge_rows", charge_rows)
+    vat_entries = {vat_status for vat_status, _ in charge_rows}
+
+    if profile["accounting"] == "subtotal":
+        # If VAT entries contain taxable charges, skip; otherwise Subtotal is the Non-Taxable Amount
+        if not vat_entries.issubset(VALID_NON_TAXABLE_TERMS):
+            return outcome.skip("taxable charges present")
+        fields.update(non_taxable=fields["subtotal"], taxable=0, vat_value=0)
+    else:
+        non_taxable = sum(value for status, value in charge_rows if status in VALID_NON_TAXABLE_TERMS)
+        taxable = sum(value for status, value in charge_rows if status not in VALID_NON_TAXABLE_TERMS)
+        fields.update(non_taxable=non_taxable, taxable=taxable)
+
+        # Skip all-non-taxable invoices, but keep "TAX INVOICE" files where the exemption applies
+        is_tax_invoice = profile["tax_invoice_exemption"] and "TAX INVOICE" in source.name.upper()
+        if not is_tax_invoice and vat_entries and vat_entries.issubset(VALID_NON_TAXABLE_TERMS):
+            return outcome.skip("all non-taxable")
+
+    if consignee_mode == "field-check" and CONSIGNEE_NAME not in fields["consignee"]:
+        return outcome.skip("consignee mismatch")
+
+    invoice_details = {column: fields[field] for column, field in profile["columns"]}
+    if outcome.trace is not None:
+        outcome.record("result", invoice_details)
+    return invoice_details
+
+
+def extract_invoice_data(source, outcome, profile):
+    """ Runs one PDF through a profile's rules; returns the output row, or None when skipped or failed. """
+    try:
+        text = read_text(source, outcome, profile)
+        if text is None:
+            return None  # Rejected while reading (pre-filter or over budget)
+        with outcome.stage("parse"):
+            return apply_profile(text, source, outcome, profile)
+    except Exception as e:
+        return outcome.fail(e)
+
+
+def extract_for_pool(source, profile_name, trace=None):
+    """ Process-pool entry point: extracts one PDF under the named profile into a fresh FileOutcome.
+
+    trace is True to record events for every file, or a frozenset of the file names to record.
+    """
+    outcome = FileOutcome(source.name)
+    if trace is True or (trace and source.name in trace):
+        outcome.trace = []
+    outcome.data = extract_invoice_data(source, outcome, PROFILES[profile_name])
+    return outcome
+
+
+def cache_tag(source, profile_name):
+    """ Cache version for a file: rules, profile, ROI and pre-filter modes, party-name list and, where it applies, the TAX INVOICE exemption. """
+    profile = PROFILES[profile_name]
+    tag = f"{RULES_VERSION}:{profile_name}"
+    if ROI_EXTRACTION:
+        tag += ":roi"
+    if PREFILTER and profile["prefilter"]:
+        tag += ":prefilter"
+    if profile["consignee"] in ("base-names", "base-names-suffix"):
+        tag += f":names-{party_names.matcher().version}"  # Editing the names file invalidates these results
+    if profile["tax_invoice_exemption"] and "TAX INVOICE" in source.name.upper():
+        tag += ":tax-invoice"
+    return tag
+
+
+def pipeline(profile_name):
+    """ Returns picklable (extract_func, cache_tag) callables bound to a profile. """
+    get_profile(profile_name)
+    return partial(extract_for_pool, profile_name=profile_name), partial(cache_tag, profile_name=profile_name)
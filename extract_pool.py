@@ -0,0 +1,33 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import threading
+
+# Number of worker processes used to extract uploaded PDFs.
+# pdfplumber layout analysis is CPU-bound pure Python, so we need processes, not threads.
+# Set EXTRACT_WORKERS=1 to run extraction inline in the request (the old behaviour).
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", os.cpu_count() or 1))
+
+_pool = None  # Created lazily so each gunicorn worker gets its own pool after fork
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """ Returns the shared extraction process pool, creating it on first use. """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+    return _pool
+
+
+def iter_in_pool(func, items):
+    """ Runs func over items across all cores, yielding each result in input order as soon as it is ready. """
+    items = list(items)
+    if EXTRACT_WORKERS <= 1 or len(items) <= 1:
+        return (func(item) for item in items)  # Not worth the pickling round-trip
+    return get_pool().map(func, items)
+
+
+def map_in_pool(func, items):
+    """ Runs func over items across all cores and returns the results in input order. """
+    return list(iter_in_pool(func, items))
@@ -0,0 +1,122 @@
+from contextlib import contextmanager
+import time
+
+
+class FileOutcome:
+    """ Per-file extraction context: what one PDF produced, or why it was dropped.
+
+    A fresh one is created for every file (inside the pool worker), so nothing is shared between
+    concurrent requests. It is picklable and is what the pool sends back to the request.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.data = None
+        self.skip_reason = None  # One of a fixed set of reasons (a metric label)
+        self.skip_detail = None  # Per-file specifics, shown after the reason
+        self.error = None
+        self.pages_read = 0
+        self.pages_skipped = 0
+        self.peak_memory_bytes = 0  # Worker RSS growth while this file's pages were read
+        self.layout = None  # Matched layout template, "full-text", "prefilter" (rejected from page 1), or None when cached
+        self.timings = {}  # Stage -> seconds spent on this file in the worker (open, extract_text, parse)
+        self.trace = None  # List of (event, detail) when this file is traced, see request_trace.py
+        self.duplicates = []  # Other files with the same invoice number, filled in from the ledger
+
+    def skip(self, reason, detail=None):
+        """ Marks the file as deliberately skipped; returns None so callers can `return outcome.skip(...)`. """
+        self.skip_reason = reason
+        self.skip_detail = detail
+        self.record("skip", self.reason)
+        return None
+
+    def fail(self, error):
+        """ Records a parse error (the first one wins); returns None like skip(). """
+        if self.error is None:
+            self.error = f"parse error: {error}"
+            self.record("error", self.error)
+        return None
+
+    def record(self, event, detail):
+        """ Adds a trace event when this file is traced. detail is stored as is; nothing is formatted.
+
+        Callers that build detail (a dict, a list, a copy) check outcome.trace is not None first, so
+        untraced files do not pay for it.
+        """
+        if self.trace is not None:
+            self.trace.append((event, detail))
+
+    @contextmanager
+    def stage(self, name):
+        """ Adds the time spent in the block to this file's timing for the named stage. """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+
+    def count_pages(self, reader):
+        """ Records how many pages a PageText reader opened and skipped, and its peak memory. """
+        self.pages_read += reader.pages_read
+        self.pages_skipped += reader.pages_skipped
+        self.peak_memory_bytes = max(self.peak_memory_bytes, reader.peak_memory_bytes)
+
+    @property
+    def peak_memory_mb(self):
+        return round(self.peak_memory_bytes / (1024 * 1024), 1)
+
+    @property
+    def status(self):
+        if self.data:
+            return "ok"
+        return "skipped" if self.skip_reason else "error"
+
+    @property
+    def reason(self):
+        if self.skip_reason and self.skip_detail:
+            return f"{self.skip_reason}: {self.skip_detail}"
+        return self.skip_reason or self.error or "parse error: no text extracted"
+
+
+def duplicate_json(outcome):
+    """ Flags a file whose invoice number the ledger has already seen in other files. """
+    return {"file": outcome.name, "invoice_no": outcome.data.get("Invoice No") or outcome.data.get("Document No"),
+            "seen_in": outcome.duplicates}
+
+
+class RequestContext:
+    """ Per-request accumulator: extracted rows in upload order plus skipped files and their reasons.
+
+    With by_file (ZIP uploads), rows are also keyed by the member's path inside the archive.
+    """
+
+    def __init__(self, by_file=False):
+        self.by_file = {} if by_file else None
+        self.results = []
+        self.skipped = []
+        self.files = []
+        self.pages_skipped = 0
+        self.layouts = {}
+        self.duplicates = []
+
+    def add(self, outcome):
+        self.pages_skipped += outcome.pages_skipped
+        self.files.append({"file": outcome.name, "status": outcome.status, "pages_read": outcome.pages_read,
+                           "peak_memory_mb": outcome.peak_memory_mb})
+        if outcome.layout:
+            self.layouts[outcome.layout] = self.layouts.get(outcome.layout, 0) + 1
+        if outcome.data:
+            self.results.append(outcome.data)
+            if self.by_file is not None:
+                self.by_file[outcome.name] = outcome.data
+        else:
+            self.skipped.append({"file": outcome.name, "reason": outcome.reason})
+        if outcome.duplicates:
+            self.duplicates.append(duplicate_json(outcome))
+
+    def to_json(self):
+        body = {"results": self.results, "skipped": self.skipped, "pages_skipped": self.pages_skipped,
+                "layouts": self.layouts, "files": self.files, "duplicates": self.duplicates}
+        if self.by_file is not None:
+            body["by_file"] = self.by_file
+        return body
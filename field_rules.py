@@ -0,0 +1,86 @@
+from collections import namedtuple
+import re
+
+# One named field to pull out of the numbered lines.
+#   keyword: cheap upper-case substring that must be on the line before the regex is tried
+#   pattern: regex with a "value" group
+#   collect: "first" keeps the first match, "sum" adds up every match
+FieldRule = namedtuple("FieldRule", "name keyword pattern collect parse default")
+
+# The charge table runs from the start marker to the end marker; rows need "status" and "amount" groups.
+TableRule = namedtuple("TableRule", "start end pattern")
+
+
+def stripped(value):
+    return value.strip()
+
+
+def amount(value):
+    return float(value.replace(",", ""))
+
+
+DOCUMENT_FIELDS = [
+    FieldRule("invoice_no", "NUMBER", r"(?i)(?:INVOICE NUMBER|CREDIT NOTE NUMBER)\s*(?P<value>[\w-]+)", "first", stripped, "N/A"),
+    FieldRule("invoice_date", "DATE", r"(?i)(?:INVOICE DATE|DATE)\s*(?P<value>[\dA-Za-z-]+)", "first", stripped, "N/A"),
+    FieldRule("vat_value", "VAT", r"VAT\s*(?P<value>[\d.,]+)", "sum", amount, 0),
+    FieldRule("subtotal", "SUBTOTAL", r"SUBTOTAL\s*(?P<value>[\d.,]+)", "first", amount, 0),
+    FieldRule("total_aed", "TOTAL AED", r"TOTAL AED\s*(?P<value>[\d.,]+)", "first", amount, 0),
+]
+
+CHARGE_TABLE = TableRule(
+    "CHARGE DESCRIPTION",
+    "TOTAL CHARGES",
+    r"(\d+): (.+?)\s+(?P<status>Zero Rated|Not Taxable|Not Applicable|5%=\d+\.\d+)?\s+([\d.,]+)\s+(?P<amount>[\d.,]+)",
+)
+
+
+class FieldScanner:
+    """ Compiles a rule table once and extracts every field plus the charge table in one pass over the lines. """
+
+    def __init__(self, rules, table=None):
+        self.rules = rules
+        self.by_keyword = {}  # keyword -> [(rule, compiled pattern)]
+        for rule in rules:
+            self.by_keyword.setdefault(rule.keyword, []).append((rule, re.compile(rule.pattern)))
+        self.table = table
+        self.row_pattern = re.compile(table.pattern) if table else None
+
+    def scan(self, lines):
+        """ Returns ({field name: value}, [(vat_status, charge_value), ...]). """
+        values = {rule.name: rule.default for rule in self.rules}
+        found = set()
+        rows = []
+        in_table = False
+        table = self.table
+
+        for line in lines:
+            upper = line.upper()
+            for keyword, compiled_rules in self.by_keyword.items():
+                if keyword not in upper:
+                    continue
+                for rule, pattern in compiled_rules:
+                    if rule.collect == "first" and rule.name in found:
+                        continue
+                    match = pattern.search(line)
+                    if not match:
+                        continue
+                    value = rule.parse(match.group("value"))
+                    if rule.collect == "sum":
+                        values[rule.name] += value
+                    else:
+                        values[rule.name] = value
+                    found.add(rule.name)
+
+            if table is None:
+                continue
+            if table.start in line:
+                in_table = True
+                continue
+            if table.end in line:
+                in_table = False
+            if in_table:
+                match = self.row_pattern.search(line)
+                if match:
+                    rows.append((match.group("status") or "Taxable", amount(match.group("amount"))))
+
+        return values, rows
@@ -0,0 +1,33 @@
+import os
+
+# Read by gunicorn from the working directory (see Procfile). The app, pdfplumber/pdfminer and
+# openpyxl are imported and warmed up once in the master, then shared copy-on-write by the workers
+# (and the extraction processes they fork); see warmup.py. PRELOAD_APP=0 makes every worker import
+# and warm up on its own instead.
+preload_app = os.environ.get("PRELOAD_APP", "1") != "0"
+
+# Background jobs (jobs.py), traces and the warm-up state live in the worker's memory, so a second
+# worker would answer GET /jobs/<id> with 404 for another worker's jobs. Scale with --threads and
+# EXTRACT_WORKERS (the extraction processes) instead.
+workers = 1
+
+
+def on_starting(server):
+    if server.cfg.workers != 1:
+        raise RuntimeError(f"Run a single gunicorn worker (got {server.cfg.workers}): jobs are kept in worker memory")
+
+
+def when_ready(server):
+    if preload_app:
+        from warmup import startup
+        try:
+            startup.preload()
+        except Exception:
+            server.log.exception("Warm-up failed; workers will warm up on their own")
+            return
+        server.log.info("App preloaded and warmed up: %s", startup.seconds)
+
+
+def post_worker_init(worker):
+    from warmup import startup
+    startup.start(lambda status: worker.log.info("Worker %s ready: %s", worker.pid, status["seconds"]))
@@ -0,0 +1,211 @@
+from concurrent.futures import ThreadPoolExecutor
+from extraction_context import duplicate_json
+from flask import request, jsonify
+from pdf_source import read_uploads, release
+from result_cache import iter_with_cache
+import os
+import threading
+import time
+import uuid
+
+# Background batches: POST /jobs returns straight away, extraction runs on these threads
+# (each of which still fans its files out over the process pool).
+# Jobs live in the memory of the worker process that accepted them, so gunicorn.conf.py pins a single
+# gunicorn worker (scale with --threads and EXTRACT_WORKERS).
+# Queued and running jobs hold their uploads, so past JOB_MAX_PENDING of them POST /jobs is refused
+# with 503 and Retry-After until some finish.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", 3600))  # How long finished jobs are kept
+JOB_MAX_FINISHED = int(os.environ.get("JOB_MAX_FINISHED", 100))  # Oldest finished jobs beyond this are dropped
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", 20))  # Queued plus running jobs
+JOB_RETRY_AFTER_SECONDS = 5
+
+
+class JobStore:
+    """ Thread-safe registry of extraction jobs with a bounded queue and bounded retention of finished ones. """
+
+    def __init__(self, ttl_seconds=JOB_TTL_SECONDS, max_finished=JOB_MAX_FINISHED, max_pending=JOB_MAX_PENDING):
+        self.ttl_seconds = ttl_seconds
+        self.max_finished = max_finished
+        self.max_pending = max_pending
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def full(self):
+        """ True when max_pending jobs are already queued or running. """
+        with self.lock:
+            return self._pending() >= self.max_pending
+
+    def create(self, total, by_file=False):
+        """ Registers a queued job and returns its id, or None when the queue is full. """
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            if self._pending() >= self.max_pending:
+                return None
+            self._expire()
+            self.jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "total": total,
+                "processed": 0,
+                "results": [],
+                "skipped": [],
+                "by_file": {} if by_file else None,  # ZIP uploads: rows keyed by archive path
+                "duplicates": [],
+                "pages_skipped": 0,
+                "error": None,
+                "created": time.time(),
+                "finished": None,
+            }
+        return job_id
+
+    def update(self, job_id, **changes):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.update(changes)
+
+    def record(self, job_id, outcome):
+        """ Adds one file's outcome to the job's partial results. """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job["processed"] += 1
+            job["pages_skipped"] += outcome.pages_skipped
+            if outcome.data:
+                job["results"].append(outcome.data)
+                if job["by_file"] is not None:
+                    job["by_file"][outcome.name] = outcome.data
+            else:
+                job["skipped"].append({"file": outcome.name, "reason": outcome.reason})
+            if outcome.duplicates:
+                job["duplicates"].append(duplicate_json(outcome))
+
+    def finish(self, job_id, status, error=None):
+        self.update(job_id, status=status, error=error, finished=time.time())
+
+    def snapshot(self, job_id):
+        """ Returns a copy of the job safe to serialise outside the lock, or None if unknown/expired. """
+        with self.lock:
+            self._expire()
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            job["results"] = list(job["results"])
+            job["skipped"] = list(job["skipped"])
+            job["duplicates"] = list(job["duplicates"])
+            if job["by_file"] is not None:
+                job["by_file"] = dict(job["by_file"])
+            return job
+
+    def _pending(self):
+        return sum(1 for job in self.jobs.values() if not job["finished"])
+
+    def _expire(self):
+        now = time.time()
+        finished = sorted((job["finished"], job_id) for job_id, job in self.jobs.items() if job["finished"])
+        for position, (finished_at, job_id) in enumerate(finished):
+            if now - finished_at > self.ttl_seconds or len(finished) - position > self.max_finished:
+                del self.jobs[job_id]
+
+
+job_store = JobStore()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="extract-job")
+    return _executor
+
+
+def run_job(job_id, uploads, extract_func, cache_tag):
+    """ Extracts a job's files in upload order, publishing each outcome as it arrives. """
+    job_store.update(job_id, status="running")
+    try:
+        for outcome in uploads.ignored:
+            job_store.record(job_id, outcome)
+        for outcome in iter_with_cache(extract_func, uploads.sources, cache_tag):
+            job_store.record(job_id, outcome)
+        job_store.finish(job_id, "done")
+    except Exception as e:
+        job_store.finish(job_id, "failed", error=str(e))
+    finally:
+        release(uploads.sources)
+
+
+def job_result(job):
+    result = {"results": job["results"], "skipped": job["skipped"], "pages_skipped": job["pages_skipped"],
+              "duplicates": job["duplicates"]}
+    if job["by_file"] is not None:
+        result["by_file"] = job["by_file"]
+    return result
+
+
+def job_status(job):
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "total": job["total"],
+        "processed": job["processed"],
+        "results": job["results"],
+        "skipped": job["skipped"],
+        "pages_skipped": job["pages_skipped"],
+        "error": job["error"],
+    }
+
+
+def queue_full():
+    response = jsonify({"error": f"Too many jobs queued or running ({job_store.max_pending}); retry later"})
+    response.headers["Retry-After"] = str(JOB_RETRY_AFTER_SECONDS)
+    return response, 503
+
+
+def register_job_routes(app, request_pipeline):
+    """ Adds POST /jobs, GET /jobs/<id> and GET /jobs/<id>/result to the app.
+
+    request_pipeline() returns the (extract_func, cache_tag) pair for the current request.
+    """
+
+    @app.route("/jobs", methods=["POST"])
+    def create_job():
+        if "file" not in request.files:
+            return jsonify({"error": "No file uploaded"}), 400
+
+        extract_func, cache_tag = request_pipeline()
+        if job_store.full():
+            return queue_full()  # Before the uploads are read
+
+        # The request stream is gone once we return, so read the uploads (or expand the ZIP) now
+        uploads = read_uploads(request.files.getlist("file"))
+        total = len(uploads.sources) + len(uploads.ignored)
+
+        job_id = job_store.create(total, by_file=uploads.archive)
+        if job_id is None:  # Filled up while this request read its uploads
+            release(uploads.sources)
+            return queue_full()
+        get_executor().submit(run_job, job_id, uploads, extract_func, cache_tag)
+        return jsonify({"id": job_id, "status": "queued", "total": total}), 202
+
+    @app.route("/jobs/<job_id>", methods=["GET"])
+    def get_job(job_id):
+        job = job_store.snapshot(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown or expired job"}), 404
+        return jsonify(job_status(job)), 200
+
+    @app.route("/jobs/<job_id>/result", methods=["GET"])
+    def get_job_result(job_id):
+        job = job_store.snapshot(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown or expired job"}), 404
+        if job["status"] == "failed":
+            return jsonify({"error": job["error"]}), 500
+        if job["status"] != "done":
+            return jsonify(job_status(job)), 202  # Not finished yet; poll again
+        return jsonify(job_result(job)), 200
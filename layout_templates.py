@@ -0,0 +1,115 @@
+from collections import namedtuple
+from functools import lru_cache
+import os
+import re
+
+# Region-of-interest extraction for known carrier templates, opt-in with ROI_EXTRACTION=1. The first
+# page's header band is read (cheaply, as a crop) to recognise the template; then only that template's
+# regions are laid out instead of every page in full. Anything unrecognised, a region read that is
+# missing a field the profile needs, or a charge or VAT line anywhere outside the regions (the footer
+# band of page 1, any later page) falls back to the full-text path. Text outside the regions is only
+# scanned as raw characters for those markers, never laid out.
+ROI_EXTRACTION = os.environ.get("ROI_EXTRACTION", "0") == "1"
+FINGERPRINT_BAND = 0.2  # Top fraction of the first page used to recognise the template
+PAGE_SIZE_TOLERANCE = 2  # Points either way when matching page sizes
+
+# regions: (page index, x0, top, x1, bottom) as fractions of that page's width/height, top to bottom.
+# The whole charge table (CHARGE DESCRIPTION .. TOTAL CHARGES) must sit inside a single region. Anchors
+# and regions are tuples, so region boxes can be cached per template and page size.
+LayoutTemplate = namedtuple("LayoutTemplate", "name page_size anchors regions")
+
+# Only layouts measured on a carrier's real documents belong here, with anchors no other carrier prints
+# in its header band. None has been measured yet, so every file takes the full-text path.
+TEMPLATES = []
+
+# Charge rows, VAT markers and the table's own headings: any of these outside the regions means the
+# regions do not hold the whole table. Spaces are optional as raw characters carry no layout.
+OUTSIDE_MARKERS = re.compile(r"\d+(?:\.\d+)?%=|Zero\s*Rated|Not\s*Taxable|Not\s*Applicable|\bVAT\b|"
+                             r"CHARGE\s*DESCRIPTION|TOTAL\s*CHARGES|TOTAL\s*AED")
+
+TABLE_START = "CHARGE DESCRIPTION"
+TABLE_END = "TOTAL CHARGES"
+TOTALS = "TOTAL AED"
+
+
+def fingerprint(page):
+    """ Returns the first page's rounded size and the text of its header band. """
+    band = page.crop((0, 0, page.width, page.height * FINGERPRINT_BAND)).extract_text() or ""
+    return (round(page.width), round(page.height)), band
+
+
+def match_template(pdf):
+    """ Returns the LayoutTemplate whose size and anchors match the first page, or None. """
+    if not TEMPLATES or not pdf.pages:
+        return None
+    (width, height), band = fingerprint(pdf.pages[0])
+    for template in TEMPLATES:
+        template_width, template_height = template.page_size
+        if abs(width - template_width) > PAGE_SIZE_TOLERANCE or abs(height - template_height) > PAGE_SIZE_TOLERANCE:
+            continue
+        if all(anchor.search(band) for anchor in _anchors(template.anchors)):
+            return template
+    return None
+
+
+@lru_cache(maxsize=64)
+def _anchors(anchors):
+    return [re.compile(anchor) for anchor in anchors]
+
+
+@lru_cache(maxsize=256)
+def region_boxes(regions, width, height):
+    """ Absolute bounding boxes of a template's regions on a page of the given size (cached per size). """
+    return [(page_index, (x0 * width, top * height, x1 * width, bottom * height))
+            for page_index, x0, top, x1, bottom in regions]
+
+
+def _centred_in(bbox):
+    """ True for objects whose centre lies in bbox, so a line on a region border is read exactly once. """
+    x0, top, x1, bottom = bbox
+
+    def test(obj):
+        return x0 <= (obj["x0"] + obj["x1"]) / 2 < x1 and top <= (obj["top"] + obj["bottom"]) / 2 < bottom
+    return test
+
+
+def region_texts(pdf, template):
+    """ Extracts the text of each of the template's regions, in order. Returns (texts, pages_read). """
+    if any(region[0] >= len(pdf.pages) for region in template.regions):
+        return None, 0  # Shorter than the template expects
+    texts = []
+    pages_read = set()
+    first = pdf.pages[0]
+    for page_index, bbox in region_boxes(template.regions, first.width, first.height):
+        page = pdf.pages[page_index]
+        pages_read.add(page_index)
+        texts.append(page.filter(_centred_in(bbox)).crop(bbox).extract_text() or "")
+    return texts, len(pages_read)
+
+
+def charges_outside(pdf, template):
+    """ True when a charge or VAT marker appears outside the template's regions on any page. """
+    first = pdf.pages[0]
+    boxes = region_boxes(template.regions, first.width, first.height)
+    for page_index, page in enumerate(pdf.pages):
+        inside = [_centred_in(bbox) for index, bbox in boxes if index == page_index]
+        text = "".join(char["text"] for char in page.chars if not any(test(char) for test in inside))
+        if OUTSIDE_MARKERS.search(text):
+            return True
+    return False
+
+
+def covers_fields(texts, required_markers):
+    """ True when the regions contain every marker the profile needs, the whole charge table and the totals after it. """
+    text = "\n".join(texts)
+    if not all(marker.search(text) for marker in required_markers):
+        return False
+    # Rows between the table's header and its total are only guaranteed present if one region holds
+    # both, in that order, with the totals following
+    table = [region for region in texts if TABLE_START in region or TABLE_END in region]
+    if len(table) != 1:
+        return False
+    start = table[0].find(TABLE_START)
+    end = table[0].find(TABLE_END, max(start, 0))
+    return start >= 0 and end >= 0 and table[0].find(TOTALS, end) >= 0
+
@@ -0,0 +1,260 @@
+from datetime import datetime
+from flask import jsonify, request
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Every extracted document is kept in a local SQLite ledger, so month-end reporting is a query
+# instead of a re-upload. Rows are keyed by PDF content hash and profile; a re-upload parsed under
+# the same rules (cache tag) is answered from here even after the result cache has evicted it.
+# Queries without ?profile= count each document once, as its most recent extraction.
+# The same invoice number arriving in a different file is flagged as a duplicate.
+# LEDGER_DB= (empty) turns the ledger off.
+LEDGER_DB = os.environ.get("LEDGER_DB", "ledger.sqlite3")
+LEDGER_QUERY_LIMIT = int(os.environ.get("LEDGER_QUERY_LIMIT", 1000))  # Most rows /ledger/invoices returns
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    sha256 TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    cache_tag TEXT NOT NULL,
+    file_name TEXT,
+    invoice_no TEXT,
+    invoice_date TEXT,
+    invoice_day TEXT,
+    consignee TEXT,
+    shipper TEXT,
+    vat_value REAL,
+    taxable REAL,
+    non_taxable REAL,
+    total_aed REAL,
+    data TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    uploads INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (sha256, profile)
+);
+CREATE INDEX IF NOT EXISTS invoices_invoice_no ON invoices (invoice_no);
+CREATE INDEX IF NOT EXISTS invoices_invoice_day ON invoices (invoice_day);
+CREATE INDEX IF NOT EXISTS invoices_consignee ON invoices (consignee);
+"""
+
+# Output keys per ledger column; the profiles name some fields differently, so the first key present wins
+FIELD_KEYS = {
+    "invoice_no": ("Invoice No", "Document No"),
+    "invoice_date": ("Invoice Date", "Document Date"),
+    "consignee": ("Consignee", "Consignee Name"),
+    "shipper": ("Shipper",),
+    "vat_value": ("VAT Value",),
+    "taxable": ("Taxable Amount",),
+    "non_taxable": ("Non Taxable Amount",),
+    "total_aed": ("Total AED",),
+}
+DATE_FORMATS = ("%d-%b-%Y", "%d-%b-%y", "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%Y-%m-%d")
+MISSING = (None, "", "N/A")
+
+
+class LedgerQueryError(ValueError):
+    pass
+
+
+def parse_day(value):
+    """ Returns an invoice date as YYYY-MM-DD (what range queries compare), or None if unreadable. """
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def ledger_fields(data):
+    fields = {}
+    for column, keys in FIELD_KEYS.items():
+        fields[column] = next((data[key] for key in keys if data.get(key) not in MISSING), None)
+    return fields
+
+
+def tag_profile(cache_tag):
+    """ The profile a cache tag was built for (engine.cache_tag: "<rules version>:<profile>[:...]"). """
+    return cache_tag.split(":")[1]
+
+
+class Ledger:
+    """ SQLite store of extracted documents, with one connection per thread. """
+
+    def __init__(self, path=LEDGER_DB):
+        self.path = path
+        self.local = threading.local()
+
+    def connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")  # Readers never wait on the writer
+            connection.executescript(SCHEMA)
+            self.local.connection = connection
+        return connection
+
+    def lookup(self, sha256, cache_tag):
+        """ Returns the stored row for a document parsed under cache_tag, or None (also if the ledger is unusable). """
+        try:
+            found = self.connection().execute(
+                "SELECT data FROM invoices WHERE sha256 = ? AND profile = ? AND cache_tag = ?",
+                (sha256, tag_profile(cache_tag), cache_tag)).fetchone()
+        except sqlite3.Error:
+            return None
+        return json.loads(found["data"]) if found else None
+
+    def record(self, source, cache_tag, data):
+        """ Stores (or refreshes) one extracted document.
+
+        Returns the other files the same invoice number was seen in, as a list of
+        {"file", "sha256", "first_seen"}; empty when the number is new. Like the disk cache, a
+        ledger that cannot be written (locked past the timeout, disk full) never fails the upload.
+        """
+        try:
+            return self._record(source, cache_tag, data)
+        except sqlite3.Error:
+            return []
+
+    def _record(self, source, cache_tag, data):
+        fields = ledger_fields(data)
+        now = time.time()
+        connection = self.connection()
+        with connection:
+            connection.execute(
+                "INSERT INTO invoices (sha256, profile, cache_tag, file_name, invoice_no, invoice_date, invoice_day,"
+                " consignee, shipper, vat_value, taxable, non_taxable, total_aed, data, first_seen, last_seen)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (sha256, profile) DO UPDATE SET cache_tag = excluded.cache_tag,"
+                " file_name = excluded.file_name, invoice_no = excluded.invoice_no,"
+                " invoice_date = excluded.invoice_date, invoice_day = excluded.invoice_day,"
+                " consignee = excluded.consignee, shipper = excluded.shipper, vat_value = excluded.vat_value,"
+                " taxable = excluded.taxable, non_taxable = excluded.non_taxable, total_aed = excluded.total_aed,"
+                " data = excluded.data, last_seen = excluded.last_seen, uploads = uploads + 1",
+                (source.sha256, tag_profile(cache_tag), cache_tag, source.name, fields["invoice_no"],
+                 fields["invoice_date"], parse_day(fields["invoice_date"]), fields["consignee"], fields["shipper"],
+                 fields["vat_value"], fields["taxable"], fields["non_taxable"], fields["total_aed"],
+                 json.dumps(data), now, now))
+        if fields["invoice_no"] is None:
+            return []
+        others = connection.execute(
+            "SELECT file_name, sha256, MIN(first_seen) AS first_seen FROM invoices"
+            " WHERE invoice_no = ? AND sha256 != ? GROUP BY sha256 ORDER BY first_seen",
+            (fields["invoice_no"], source.sha256)).fetchall()
+        return [{"file": row["file_name"], "sha256": row["sha256"], "first_seen": row["first_seen"]} for row in others]
+
+    def invoices(self, start=None, end=None, consignee=None, invoice_no=None, profile=None, limit=LEDGER_QUERY_LIMIT):
+        where, params = filters(start, end, consignee, invoice_no, profile)
+        rows = self.connection().execute(
+            "SELECT sha256, profile, file_name, invoice_no, invoice_date, invoice_day, consignee, shipper, vat_value,"
+            f" taxable, non_taxable, total_aed, first_seen, last_seen, uploads FROM {documents(profile)}{where}"
+            " ORDER BY invoice_day, invoice_no LIMIT ?", params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    def totals(self, start=None, end=None, profile=None):
+        """ Document count and amount sums per consignee. """
+        where, params = filters(start, end, None, None, profile)
+        rows = self.connection().execute(
+            "SELECT COALESCE(consignee, 'N/A') AS consignee, COUNT(*) AS invoices, SUM(vat_value) AS vat_value,"
+            " SUM(taxable) AS taxable, SUM(non_taxable) AS non_taxable, SUM(total_aed) AS total_aed"
+            f" FROM {documents(profile)}{where} GROUP BY COALESCE(consignee, 'N/A') ORDER BY consignee",
+            params).fetchall()
+        return [{key: round(value, 2) if isinstance(value, float) else value for key, value in dict(row).items()}
+                for row in rows]
+
+    def duplicates(self, profile=None):
+        """ Invoice numbers stored from more than one distinct file. """
+        where, params = filters(None, None, None, None, profile)
+        where = f"{where} AND" if where else " WHERE"
+        rows = self.connection().execute(
+            "SELECT invoice_no, file_name, sha256, MIN(first_seen) AS first_seen FROM invoices"
+            f"{where} invoice_no IN (SELECT invoice_no FROM invoices WHERE invoice_no IS NOT NULL"
+            " GROUP BY invoice_no HAVING COUNT(DISTINCT sha256) > 1)"
+            " GROUP BY invoice_no, sha256 ORDER BY invoice_no, first_seen", params).fetchall()
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row["invoice_no"], []).append(
+                {"file": row["file_name"], "sha256": row["sha256"], "first_seen": row["first_seen"]})
+        return [{"invoice_no": invoice_no, "files": files} for invoice_no, files in grouped.items()]
+
+
+def documents(profile):
+    """ The rows a query runs over: one profile's, or else each document's most recently seen row, so a
+    file uploaded under several profiles is listed and summed once. """
+    if profile:
+        return "invoices"
+    return ("(SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY sha256 ORDER BY last_seen DESC, profile)"
+            " AS version FROM invoices) WHERE version = 1)")
+
+
+def filters(start, end, consignee, invoice_no, profile):
+    """ Builds the WHERE clause shared by the ledger queries. """
+    clauses, params = [], []
+    if start:
+        clauses.append("invoice_day >= ?")
+        params.append(start)
+    if end:
+        clauses.append("invoice_day <= ?")
+        params.append(end)
+    if consignee:
+        clauses.append("consignee = ?")
+        params.append(consignee)
+    if invoice_no:
+        clauses.append("invoice_no = ?")
+        params.append(invoice_no)
+    if profile:
+        clauses.append("profile = ?")
+        params.append(profile)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+ledger = Ledger() if LEDGER_DB else None
+
+
+def query_day(name):
+    """ A ?from= / ?to= argument as YYYY-MM-DD (any invoice date format is accepted). """
+    value = request.args.get(name)
+    if not value:
+        return None
+    day = parse_day(value)
+    if day is None:
+        raise LedgerQueryError(f"Unreadable date for {name}: {value!r}; use YYYY-MM-DD")
+    return day
+
+
+def register_ledger_routes(app):
+    """ Adds GET /ledger/invoices, /ledger/totals and /ledger/duplicates to the app.
+
+    /ledger/invoices and /ledger/totals take ?from=YYYY-MM-DD&to=YYYY-MM-DD (inclusive) and ?profile=;
+    /ledger/invoices also filters on ?consignee= and ?invoice_no=. Without ?profile=, a document
+    extracted under several profiles appears once, as its latest extraction.
+    """
+
+    @app.errorhandler(LedgerQueryError)
+    def bad_ledger_query(e):
+        return jsonify({"error": str(e)}), 400
+
+    @app.before_request
+    def require_ledger():
+        if request.path.startswith("/ledger/") and ledger is None:
+            return jsonify({"error": "The ledger is disabled (LEDGER_DB is empty)"}), 404
+
+    @app.route("/ledger/invoices", methods=["GET"])
+    def ledger_invoices():
+        limit = min(request.args.get("limit", LEDGER_QUERY_LIMIT, type=int), LEDGER_QUERY_LIMIT)
+        return jsonify({"invoices": ledger.invoices(query_day("from"), query_day("to"), request.args.get("consignee"),
+                                                    request.args.get("invoice_no"), request.args.get("profile"),
+                                                    limit)}), 200
+
+    @app.route("/ledger/totals", methods=["GET"])
+    def ledger_totals():
+        return jsonify({"totals": ledger.totals(query_day("from"), query_day("to"), request.args.get("profile"))}), 200
+
+    @app.route("/ledger/duplicates", methods=["GET"])
+    def ledger_duplicates():
+        return jsonify({"duplicates": ledger.duplicates(request.args.get("profile"))}), 200
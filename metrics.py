@@ -0,0 +1,132 @@
+from contextlib import contextmanager
+from flask import Response, g, has_request_context, request
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+import time
+
+# Where upload time goes. Request-level stages (receive: multipart parse, read: hashing/spooling the
+# uploads, cache: lookups, extract: waiting on the pool, ledger: recording results, total) are timed in the web process; per-file stages (open, prefilter, extract_text, parse) are timed inside the pool worker, carried
+# back on the FileOutcome and observed here when the outcome arrives.
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+registry = CollectorRegistry()
+REQUEST_STAGE_SECONDS = Histogram("invoice_request_stage_seconds", "Time per request spent in each stage.",
+                                  ["path", "stage"], buckets=STAGE_BUCKETS, registry=registry)
+FILE_STAGE_SECONDS = Histogram("invoice_file_stage_seconds", "Time per extracted PDF spent in each stage.",
+                               ["stage"], buckets=STAGE_BUCKETS, registry=registry)
+FILES = Counter("invoice_files", "PDFs processed, by outcome.", ["status"], registry=registry)
+FILES_SKIPPED = Counter("invoice_files_skipped", "PDFs not returned, by reason.", ["reason"], registry=registry)
+FILE_PEAK_MEMORY = Histogram("invoice_file_peak_memory_bytes", "Worker RSS growth while reading one PDF.",
+                             buckets=tuple(mb * 1024 * 1024 for mb in (1, 4, 16, 64, 128, 256, 512, 1024, 2048)),
+                             registry=registry)
+PAGES = Counter("invoice_pages", "PDF pages, by whether their text was extracted.", ["result"], registry=registry)
+# Work the page 1 pre-filter saved: files rejected before full extraction and the pages they did not need
+PREFILTER_REJECTED = Counter("invoice_prefilter_rejections", "PDFs rejected from page 1 before full extraction.",
+                             registry=registry)
+PREFILTER_PAGES_AVOIDED = Counter("invoice_prefilter_pages_avoided", "Pages never read because of the pre-filter.",
+                                  registry=registry)
+# Cold start of this worker, by phase (see warmup.py)
+STARTUP_SECONDS = Gauge("invoice_startup_seconds", "Seconds this process spent starting up, by phase.", ["phase"],
+                        registry=registry)
+
+
+class CacheCollector:
+    """ Exposes a ResultCache's stats() at scrape time. """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def collect(self):
+        stats = self.cache.stats()
+        lookups = CounterMetricFamily("invoice_cache_lookups", "Result cache lookups, by outcome.", labels=["result"])
+        for result in ("memory_hits", "disk_hits", "misses"):
+            lookups.add_metric([result], stats[result])
+        yield lookups
+        yield CounterMetricFamily("invoice_cache_stores", "Outcomes written to the result cache.", value=stats["stores"])
+        yield CounterMetricFamily("invoice_cache_evictions", "Disk cache files evicted.", value=stats["evictions"])
+        yield GaugeMetricFamily("invoice_cache_memory_items", "Entries in the in-memory cache.", value=stats["memory_items"])
+        yield GaugeMetricFamily("invoice_cache_disk_bytes", "Bytes used by the disk cache.", value=stats["disk_bytes"] or 0)
+
+
+_cache_collectors = {}
+
+
+def observe_outcome(outcome):
+    """ Records one file's counters and worker-side stage timings (cache hits carry no timings).
+
+    Inside a request, the timings are also added to that request's Server-Timing breakdown
+    (summed across pool workers).
+    """
+    FILES.labels(outcome.status).inc()
+    if outcome.status != "ok":
+        # Error messages are unbounded, so all parse errors share one label
+        FILES_SKIPPED.labels(outcome.skip_reason or "parse error").inc()
+    PAGES.labels("read").inc(outcome.pages_read)
+    PAGES.labels("skipped").inc(outcome.pages_skipped)
+    if outcome.pages_read:  # Cache hits read nothing
+        FILE_PEAK_MEMORY.observe(outcome.peak_memory_bytes)
+    if outcome.layout == "prefilter":
+        PREFILTER_REJECTED.inc()
+        PREFILTER_PAGES_AVOIDED.inc(outcome.pages_skipped)
+    for stage, seconds in outcome.timings.items():
+        FILE_STAGE_SECONDS.labels(stage).observe(seconds)
+    if has_request_context():
+        timings = request_timings()
+        for stage, seconds in outcome.timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def request_timings():
+    """ Stage -> seconds for the current request, reported in its Server-Timing header. """
+    if "stage_seconds" not in g:
+        g.stage_seconds = {}
+    return g.stage_seconds
+
+
+@contextmanager
+def timed(stage):
+    """ Adds the time spent in the block to the current request's stage (no-op outside a request). """
+    if not has_request_context():
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = request_timings()
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def server_timing_header(timings):
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def register_metrics(app, cache, paths=("/upload", "/jobs")):
+    """ Adds GET /metrics and a Server-Timing header (plus stage histograms) to the given paths. """
+    if id(cache) not in _cache_collectors:  # Several apps in one process share the registry
+        _cache_collectors[id(cache)] = CacheCollector(cache)
+        registry.register(_cache_collectors[id(cache)])
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        if request.path in paths and request.method == "POST":
+            with timed("receive"):
+                request.files  # Parses the multipart body now, so its time is measured on its own
+
+    @app.after_request
+    def add_server_timing(response):
+        if request.path not in paths or "request_started" not in g:
+            return response
+        timings = dict(request_timings())
+        timings["total"] = time.perf_counter() - g.request_started  # Streamed bodies are still being produced
+        for stage, seconds in timings.items():
+            if stage in ("open", "prefilter", "extract_text", "parse"):
+                continue  # Already observed per file
+            REQUEST_STAGE_SECONDS.labels(request.path, stage).observe(seconds)
+        response.headers["Server-Timing"] = server_timing_header(timings)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,83 @@
+import os
+import resource
+import sys
+
+# Per-file budgets, so one several-hundred-page statement cannot push a worker past its memory limit.
+# A file that hits a budget before its required markers have all been seen is rejected with a reason.
+MAX_PAGES_PER_FILE = int(os.environ.get("MAX_PAGES_PER_FILE", 500))
+FILE_MEMORY_BUDGET_MB = int(os.environ.get("FILE_MEMORY_BUDGET_MB", 512))  # RSS growth while reading one file
+PAGE_BUDGET_EXCEEDED = "page budget exceeded"
+MEMORY_BUDGET_EXCEEDED = "memory budget exceeded"
+# Budget skips depend on the settings (and, for memory, on the worker), not only on the file, so
+# they are never cached
+BUDGET_REASONS = (PAGE_BUDGET_EXCEEDED, MEMORY_BUDGET_EXCEEDED)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes():
+    """ Current resident set size of this process (peak RSS where /proc is not available). """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KiB on Linux
+
+
+class PageText:
+    """ Lazily extracts text one page at a time, running layout analysis once per page.
+
+    Blank pages are not yielded. When required_markers (compiled regexes) are given, iteration
+    stops as soon as every marker has been seen, so trailing pages are never opened. Each page's
+    parsed objects are released as soon as its text is out, so memory stays flat however long the
+    document is; reading also stops at max_pages or once the process has grown by more than
+    memory_budget_mb, recording why in `stopped` (one of BUDGET_REASONS) and the counts in `stopped_detail`. The counts live on the instance, so concurrent
+    extractions never share state. first_page is page 1's text when the caller has already extracted
+    it (see prefilter.py), so that page is not laid out again.
+    """
+
+    def __init__(self, pdf, required_markers=(), max_pages=MAX_PAGES_PER_FILE, memory_budget_mb=FILE_MEMORY_BUDGET_MB,
+                 first_page=None):
+        self.pdf = pdf
+        self.first_page = first_page
+        self.required_markers = list(required_markers)
+        self.max_pages = max_pages
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.pages_read = 0
+        self.pages_skipped = 0
+        self.peak_memory_bytes = 0  # Largest RSS growth over the start of the read
+        self.complete = not self.required_markers
+        self.stopped = None
+        self.stopped_detail = None
+
+    def __iter__(self):
+        pages = self.pdf.pages
+        pending = list(self.required_markers)
+        start_rss = rss_bytes()
+        try:
+            for page in pages:
+                if self.pages_read >= self.max_pages:
+                    self.stopped = PAGE_BUDGET_EXCEEDED
+                    self.stopped_detail = f"read {self.pages_read} of {len(pages)} pages"
+                    break
+                if self.pages_read == 0 and self.first_page is not None:
+                    text = self.first_page
+                else:
+                    text = page.extract_text()
+                growth = rss_bytes() - start_rss
+                page.close()  # Drop the page's layout objects and char cache
+                self.pages_read += 1
+                self.peak_memory_bytes = max(self.peak_memory_bytes, growth)
+                if text:
+                    pending = [marker for marker in pending if not marker.search(text)]
+                    yield text
+                if self.required_markers and not pending:
+                    self.complete = True
+                    break  # Header fields and the end of the charge table are all in hand
+                if growth > self.memory_budget:
+                    self.stopped = MEMORY_BUDGET_EXCEEDED
+                    self.stopped_detail = f"grew {growth // (1024 * 1024)} MB after {self.pages_read} of {len(pages)} pages"
+                    break
+        finally:
+            self.pages_skipped = len(pages) - self.pages_read
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import re
+import threading
+import time
+
+# Known shipper/consignee names, one per line, matched by a token-level Aho-Corasick automaton so a
+# line is scanned once however many names there are. The file is re-read when its mtime changes
+# (checked at most every PARTY_NAMES_CHECK_SECONDS, in every process), so edits apply without a restart.
+PARTY_NAMES_FILE = os.environ.get("PARTY_NAMES_FILE",
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), "party_names.txt"))
+PARTY_NAMES_CHECK_SECONDS = float(os.environ.get("PARTY_NAMES_CHECK_SECONDS", 5))
+
+WORD = re.compile(r"[^\s\-/]+")  # Hyphens and slashes separate words, like whitespace
+NOT_ALNUM = re.compile(r"[\W_]+")
+
+
+def tokenize(text):
+    """ Returns (token, start, end) per word: upper-cased with punctuation dropped ("S.A." -> "SA").
+
+    start/end are offsets into text, so matches can be cut out of the original line.
+    """
+    tokens = []
+    for match in WORD.finditer(text):
+        token = NOT_ALNUM.sub("", match.group().upper())
+        if token:
+            tokens.append((token, match.start(), match.end()))
+    return tokens
+
+
+class PartyMatcher:
+    """ Aho-Corasick automaton over name tokens; finds the longest known name in one left-to-right pass. """
+
+    def __init__(self, names):
+        self.names = []
+        self.goto = [{}]
+        self.fail = [0]
+        self.longest = [None]  # Per state: (token count, name) of the longest name ending there
+        for name in names:
+            tokens = [token for token, _, _ in tokenize(name)]
+            if tokens:
+                self._add(tokens, name)
+        self._link()
+        self.version = hashlib.sha256("\n".join(sorted(self.names)).encode("utf-8")).hexdigest()[:12]
+
+    def _add(self, tokens, name):
+        state = 0
+        for token in tokens:
+            if token not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.longest.append(None)
+                self.goto[state][token] = len(self.goto) - 1
+            state = self.goto[state][token]
+        if self.longest[state] is None:  # The first spelling listed wins
+            self.longest[state] = (len(tokens), name)
+            self.names.append(name)
+
+    def _link(self):
+        queue = list(self.goto[0].values())
+        for state in queue:  # Breadth first, so every fail target is linked before it is used
+            for token, child in self.goto[state].items():
+                queue.append(child)
+                if state:  # Children of the root fall back to the root
+                    fallback = self.fail[state]
+                    while fallback and token not in self.goto[fallback]:
+                        fallback = self.fail[fallback]
+                    self.fail[child] = self.goto[fallback].get(token, 0)
+                if self.longest[child] is None:
+                    self.longest[child] = self.longest[self.fail[child]]
+
+    def _scan(self, tokens):
+        """ Yields (end token index, (token count, name) or None) for every position. """
+        state = 0
+        for i, (token, _, _) in enumerate(tokens):
+            while state and token not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(token, 0)
+            yield i, self.longest[state]
+
+    def find_longest(self, text):
+        """ Returns (name, start, end) of the longest known name anywhere in text (rightmost on ties), or None. """
+        tokens = tokenize(text)
+        best = None
+        for i, found in self._scan(tokens):
+            if found and (best is None or found[0] >= best[0][0]):
+                best = (found, i)
+        if best is None:
+            return None
+        (count, name), last = best
+        return name, tokens[last - count + 1][1], tokens[last][2]
+
+    def find_suffix(self, text):
+        """ Returns (name, start, end) of the longest known name that ends the text, or None. """
+        tokens = tokenize(text)
+        found = None
+        for _, found in self._scan(tokens):
+            pass
+        if not found:
+            return None
+        count, name = found
+        return name, tokens[-count][1], tokens[-1][2]
+
+
+def read_names(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+class PartyNames:
+    """ The current PartyMatcher for a names file, rebuilt when the file changes. """
+
+    def __init__(self, path=PARTY_NAMES_FILE, check_seconds=PARTY_NAMES_CHECK_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self.lock = threading.Lock()
+        self.current = None
+        self.mtime = None
+        self.checked = 0.0
+        self.loaded = None
+
+    def matcher(self):
+        now = time.monotonic()
+        if self.current is not None and now - self.checked < self.check_seconds:
+            return self.current
+        with self.lock:
+            if self.current is None or now - self.checked >= self.check_seconds:
+                self.checked = now
+                self._reload_if_changed()
+            return self.current
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self.mtime:
+                return
+            matcher = PartyMatcher(read_names(self.path))
+        except OSError:
+            if self.current is None:
+                raise  # Nothing to fall back to on first load
+            return  # Keep serving the last good list (e.g. mid-replace)
+        self.current, self.mtime, self.loaded = matcher, mtime, time.time()
+
+    def status(self):
+        matcher = self.matcher()
+        return {"path": self.path, "names": len(matcher.names), "version": matcher.version, "loaded": self.loaded}
+
+
+party_names = PartyNames()
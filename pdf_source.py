@@ -0,0 +1,189 @@
+from collections import namedtuple
+from contextlib import contextmanager
+from extraction_context import FileOutcome
+from io import BytesIO
+from metrics import timed
+import hashlib
+import os
+import tempfile
+import zipfile
+
+# Uploads up to this size stay in memory; larger ones are spooled to a temp file, as is every file
+# once a request holds SPOOL_REQUEST_BYTES in memory (so many small files or archive members cannot
+# add up in memory)
+SPOOL_THRESHOLD = int(os.environ.get("SPOOL_THRESHOLD", 16 * 1024 * 1024))
+SPOOL_REQUEST_BYTES = int(os.environ.get("SPOOL_REQUEST_BYTES", 64 * 1024 * 1024))
+CHUNK_SIZE = 1024 * 1024
+
+# A ZIP upload is expanded member by member straight from the request stream (nothing is unpacked
+# to disk except members spooled as above). Decompression-bomb limits; breaking any rejects the archive.
+ZIP_MAX_MEMBERS = int(os.environ.get("ZIP_MAX_MEMBERS", 5000))
+ZIP_MAX_MEMBER_BYTES = int(os.environ.get("ZIP_MAX_MEMBER_BYTES", 200 * 1024 * 1024))
+ZIP_MAX_TOTAL_BYTES = int(os.environ.get("ZIP_MAX_TOTAL_BYTES", 2 * 1024 * 1024 * 1024))
+ZIP_MAX_RATIO = int(os.environ.get("ZIP_MAX_RATIO", 200))  # Uncompressed / compressed size per member
+
+# An uploaded PDF: exactly one of data (bytes) or path (spooled temp file) is set.
+# sha256 is computed while reading so the result cache never re-reads the file.
+PDFSource = namedtuple("PDFSource", "name data path sha256")
+
+# What a request uploaded: the PDFs to extract, FileOutcomes for archive members that are not PDFs,
+# and whether it was a ZIP archive (whose results are then keyed by member path).
+Uploads = namedtuple("Uploads", "sources ignored archive")
+
+
+class ArchiveRejected(ValueError):
+    pass
+
+
+def _read_stream(name, stream, size, limit=None, in_memory=0):
+    """ Hashes a stream of known (claimed) size into a PDFSource, spooling it to a temp file above
+    SPOOL_THRESHOLD or when it would take the request's in_memory bytes past SPOOL_REQUEST_BYTES.
+    Raises ArchiveRejected if more than limit bytes actually come out. """
+    if size <= SPOOL_THRESHOLD and in_memory + size <= SPOOL_REQUEST_BYTES:
+        data = stream.read() if limit is None else stream.read(limit + 1)
+        if limit is not None and len(data) > limit:
+            raise ArchiveRejected(f"{name} expands beyond {limit} bytes")
+        return PDFSource(name, data, None, hashlib.sha256(data).hexdigest())
+
+    digest = hashlib.sha256()
+    written = 0
+    with tempfile.NamedTemporaryFile(prefix="invoice-", suffix=".pdf", delete=False) as tmp:
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if limit is not None and written > limit:
+                    raise ArchiveRejected(f"{name} expands beyond {limit} bytes")
+                digest.update(chunk)
+                tmp.write(chunk)
+        except Exception:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    return PDFSource(name, None, tmp.name, digest.hexdigest())
+
+
+def _stream_size(stream):
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def read_upload(file, in_memory=0):
+    """ Reads an uploaded file straight from the request stream, without saving it under uploads/.
+    in_memory is what the request's earlier files already hold in memory. """
+    with timed("read"):
+        return _read_stream(os.path.basename(file.filename or ""), file.stream, _stream_size(file.stream),
+                            in_memory=in_memory)
+
+
+def is_zip(file):
+    """ True for a .zip upload, or any upload starting with the ZIP local-file signature. """
+    if (file.filename or "").lower().endswith(".zip"):
+        return True
+    head = file.stream.read(4)
+    file.stream.seek(0)
+    return head == b"PK\x03\x04"
+
+
+def read_zip(file):
+    """ Expands a ZIP upload into PDFSources named by their path inside the archive.
+
+    Members are read one at a time from the archive, never extracted to disk by name; once the members
+    held in memory reach SPOOL_REQUEST_BYTES the rest are spooled. Directories and
+    OS metadata are dropped; other non-PDF members come back as skipped FileOutcomes.
+    """
+    sources, ignored = [], []
+    try:
+        with timed("read"), zipfile.ZipFile(file.stream) as archive:
+            members = [info for info in archive.infolist() if not info.is_dir()
+                       and not info.filename.startswith("__MACOSX/")
+                       and not os.path.basename(info.filename).startswith(".")]
+            if len(members) > ZIP_MAX_MEMBERS:
+                raise ArchiveRejected(f"archive has {len(members)} members; the limit is {ZIP_MAX_MEMBERS}")
+            declared = sum(info.file_size for info in members)
+            if declared > ZIP_MAX_TOTAL_BYTES:
+                raise ArchiveRejected(f"archive expands to {declared} bytes; the limit is {ZIP_MAX_TOTAL_BYTES}")
+
+            remaining = ZIP_MAX_TOTAL_BYTES
+            in_memory = 0
+            for info in members:
+                if not info.filename.lower().endswith(".pdf"):
+                    outcome = FileOutcome(info.filename)
+                    outcome.skip("not a PDF")
+                    ignored.append(outcome)
+                    continue
+                if info.file_size > ZIP_MAX_MEMBER_BYTES:
+                    raise ArchiveRejected(f"{info.filename} expands to {info.file_size} bytes; "
+                                          f"the limit is {ZIP_MAX_MEMBER_BYTES}")
+                if info.file_size > max(info.compress_size, 1) * ZIP_MAX_RATIO:
+                    raise ArchiveRejected(f"{info.filename} has a compression ratio above {ZIP_MAX_RATIO}")
+                # Declared sizes can lie, so the bytes actually inflated are capped as well
+                limit = min(ZIP_MAX_MEMBER_BYTES, remaining, max(info.compress_size, 1) * ZIP_MAX_RATIO)
+                with archive.open(info) as member:
+                    source = _read_stream(info.filename, member, info.file_size, limit, in_memory)
+                sources.append(source)
+                remaining -= os.path.getsize(source.path) if source.path else len(source.data)
+                in_memory += 0 if source.path else len(source.data)
+    except zipfile.BadZipFile as e:
+        release(sources)
+        raise ArchiveRejected(f"not a valid ZIP archive: {e}")
+    except RuntimeError as e:  # Encrypted members
+        release(sources)
+        raise ArchiveRejected(str(e))
+    except Exception:
+        release(sources)
+        raise
+    return sources, ignored
+
+
+def read_uploads(files):
+    """ Reads a request's uploads: either PDFs, or exactly one ZIP archive of PDFs. """
+    if any(is_zip(file) for file in files):
+        if len(files) != 1:
+            raise ArchiveRejected("upload a single ZIP archive on its own, not alongside other files")
+        sources, ignored = read_zip(files[0])
+        return Uploads(sources, ignored, True)
+
+    sources = []
+    in_memory = 0
+    try:
+        for file in files:
+            source = read_upload(file, in_memory)
+            sources.append(source)
+            in_memory += 0 if source.path else len(source.data)
+    except Exception:
+        release(sources)
+        raise
+    return Uploads(sources, [], False)
+
+
+def open_pdf(source):
+    """ Returns what pdfplumber.open needs: a BytesIO sharing the upload's buffer, or the spool path. """
+    if source.data is not None:
+        return BytesIO(source.data)  # BytesIO over bytes shares the buffer until written to
+    return source.path
+
+
+def release(sources):
+    """ Deletes any temp files spooled for these sources. """
+    for source in sources:
+        if source.path:
+            try:
+                os.remove(source.path)
+            except OSError:
+                pass
+
+
+@contextmanager
+def spooled_uploads(files):
+    """ Reads the uploads (see read_uploads) and removes spooled temp files afterwards. """
+    uploads = read_uploads(files)
+    try:
+        yield uploads
+    finally:
+        release(uploads.sources)
+
@@ -0,0 +1,28 @@
+import os
+import re
+
+# First-stage filter for the profiles that keep a single consignee (consignee-filter, consignee-check).
+# Carrier invoices print their document type and the SHIPPER/CONSIGNEE block on page 1, so when page 1
+# has both and does not name the wanted consignee, the file is rejected there: the remaining pages are
+# never read, no layout template is matched and no rule runs. Anything else (no document type or
+# consignee block on page 1) goes on to full extraction, which makes the final call as before.
+# Page 1's text is handed on to the full-text read (PageText's first_page), so files that pass do
+# not extract it twice.
+PREFILTER = os.environ.get("PREFILTER", "1") != "0"
+
+DOCUMENT_TYPE = re.compile(r"(?i)INVOICE NUMBER|CREDIT NOTE NUMBER")
+CONSIGNEE_BLOCK = re.compile(r"(?i)CONSIGNEE")
+
+
+def first_page_text(pdf):
+    """ Page 1's text ("" when blank), or None for a PDF without pages. """
+    if not pdf.pages:
+        return None
+    return pdf.pages[0].extract_text() or ""
+
+
+def first_page_rejects(text, consignee_name):
+    """ Returns a skip reason when page 1's text is an invoice header for another consignee, otherwise None. """
+    if text and DOCUMENT_TYPE.search(text) and CONSIGNEE_BLOCK.search(text) and consignee_name not in text:
+        return "consignee mismatch"
+    return None
@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from flask import jsonify, request
+from functools import partial
+import os
+import threading
+import time
+import uuid
+
+# Opt-in debug traces, replacing the unconditional stdout dumps the old server4/server5 printed.
+# ?trace=1 traces every file of a request, ?trace=a.pdf,b.pdf only those files. Traced files bypass the
+# cache lookup so the trace reflects a real parse. The worker records raw events (no formatting); the
+# last TRACE_BUFFER_REQUESTS traces are kept in memory and served from GET /traces/<trace id>.
+TRACE_BUFFER_REQUESTS = int(os.environ.get("TRACE_BUFFER_REQUESTS", 50))
+TRACE_MAX_LINES = int(os.environ.get("TRACE_MAX_LINES", 2000))  # Per event, so one huge PDF can't fill memory
+
+
+class TraceBuffer:
+    """ Thread-safe ring buffer of the most recent request traces. """
+
+    def __init__(self, capacity=TRACE_BUFFER_REQUESTS):
+        self.capacity = capacity
+        self.traces = OrderedDict()
+        self.lock = threading.Lock()
+
+    def put(self, trace_id, trace):
+        with self.lock:
+            self.traces[trace_id] = trace
+            while len(self.traces) > self.capacity:
+                self.traces.popitem(last=False)
+
+    def get(self, trace_id):
+        with self.lock:
+            return self.traces.get(trace_id)
+
+
+trace_buffer = TraceBuffer()
+
+
+def traced(selection, name):
+    """ True when a trace selection (True for every file, or a frozenset of file names) covers name. """
+    return selection is True or (bool(selection) and name in selection)
+
+
+def _event_json(event, detail):
+    if isinstance(detail, list) and len(detail) > TRACE_MAX_LINES:
+        detail = detail[:TRACE_MAX_LINES] + [f"... {len(detail) - TRACE_MAX_LINES} more"]
+    return {"event": event, "detail": detail}
+
+
+class RequestTrace:
+    """ Collects the traced files of one request and stores them in the ring buffer when done. """
+
+    def __init__(self, selection, profile_name):
+        self.id = uuid.uuid4().hex
+        self.selection = selection
+        self.profile_name = profile_name
+        self.files = []
+
+    def bind(self, extract_func):
+        """ Tells the pool worker which files to record events for. """
+        return partial(extract_func, trace=self.selection)
+
+    def wants(self, source):
+        return traced(self.selection, source.name)
+
+    def add(self, outcome):
+        if outcome.trace is not None:
+            self.files.append({
+                "file": outcome.name,
+                "status": outcome.status,
+                "reason": None if outcome.status == "ok" else outcome.reason,
+                "events": [_event_json(event, detail) for event, detail in outcome.trace],
+            })
+
+    def save(self):
+        trace_buffer.put(self.id, {"id": self.id, "profile": self.profile_name, "created": time.time(),
+                                   "files": self.files})
+
+
+def start_trace(profile_name):
+    """ Returns a RequestTrace when the request asked for ?trace=..., else None. """
+    value = request.args.get("trace", "").strip()
+    if not value or value.lower() in ("0", "false", "off"):
+        return None
+    if value.lower() in ("1", "true", "all", "on"):
+        return RequestTrace(True, profile_name)
+    return RequestTrace(frozenset(name.strip() for name in value.split(",") if name.strip()), profile_name)
+
+
+def register_trace_routes(app):
+    """ Adds GET /traces/<trace_id>. """
+
+    @app.route("/traces/<trace_id>", methods=["GET"])
+    def get_trace(trace_id):
+        trace = trace_buffer.get(trace_id)
+        if trace is None:
+            return jsonify({"error": "Unknown or expired trace"}), 404
+        return jsonify(trace), 200
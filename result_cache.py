@@ -0,0 +1,189 @@
+from collections import OrderedDict
+from extract_pool import iter_in_pool
+from extraction_context import FileOutcome
+from ledger import ledger
+from metrics import observe_outcome, timed
+from page_text import BUDGET_REASONS
+import hashlib
+import json
+import os
+import threading
+
+# Repeat uploads of the same PDF are answered from here instead of re-parsing.
+# Tier 1 is an in-process LRU, tier 2 is a directory of JSON files that survives worker restarts.
+CACHE_DIR = os.environ.get("CACHE_DIR", "cache")
+CACHE_MEMORY_ITEMS = int(os.environ.get("CACHE_MEMORY_ITEMS", 1024))
+CACHE_DISK_BYTES = int(os.environ.get("CACHE_DISK_BYTES", 256 * 1024 * 1024))
+
+
+def cache_key(content_sha256, rules_version):
+    """ Builds the cache key from the PDF content hash and the rule-set version that parsed it. """
+    return hashlib.sha256(f"{content_sha256}:{rules_version}".encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """ Two-tier (memory LRU + size-capped disk) cache of extraction outcomes. """
+
+    def __init__(self, directory=CACHE_DIR, memory_items=CACHE_MEMORY_ITEMS, disk_bytes=CACHE_DISK_BYTES):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.disk_size = None  # Measured lazily on first use
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        """ Returns the cached outcome for key, or None on a miss. """
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return self.memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # Mark as recently used for disk eviction
+        except (OSError, ValueError):
+            with self.lock:
+                self.counters["misses"] += 1
+            return None
+
+        with self.lock:
+            self.counters["disk_hits"] += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        """ Stores an outcome in both tiers, evicting the oldest disk entries when over budget. """
+        with self.lock:
+            self._remember(key, value)
+            self.counters["stores"] += 1
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)  # Atomic, so other workers never read half a file
+            size = os.path.getsize(path)
+        except OSError:
+            return
+
+        with self.lock:
+            if self.disk_size is None:
+                self.disk_size = sum(size for _, size, _ in self._disk_entries())
+            else:
+                self.disk_size += size
+            if self.disk_size > self.disk_bytes:
+                self._evict_disk()
+
+    def _disk_entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((os.path.join(root, name), stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict_disk(self):
+        """ Deletes least recently used files until the disk tier is back under 90% of its budget. """
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        self.disk_size = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.9
+        for path, size, _ in entries:
+            if self.disk_size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.disk_size -= size
+            self.counters["evictions"] += 1
+
+    def stats(self):
+        """ Returns hit/miss counters and current tier sizes. """
+        with self.lock:
+            if self.disk_size is None:
+                self.disk_size = sum(size for _, size, _ in self._disk_entries())
+            stats = dict(self.counters)
+            stats["memory_items"] = len(self.memory)
+            stats["disk_bytes"] = self.disk_size
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0
+        return stats
+
+
+result_cache = ResultCache()
+
+
+def iter_with_cache(extract_func, sources, cache_tag, refresh=None):
+    """ Answers repeat PDFs from the cache and sends only the misses to the process pool.
+
+    extract_func(source) must return a FileOutcome; cache_tag(source) returns the rule-set version
+    the file is parsed under. Sources for which refresh(source) is true skip the lookup and are
+    re-extracted (the cache is still updated). Documents the cache has lost are still answered from
+    the ledger, and every extracted document is recorded there, with outcome.duplicates listing other
+    files carrying the same invoice number. Outcomes are yielded in input order, each one as soon as it
+    (and everything before it) is available.
+    """
+    tags = []
+    keys = []
+    cached_outcomes = {}
+    misses = []
+    with timed("cache"):
+        for i, source in enumerate(sources):
+            tag = cache_tag(source)
+            key = cache_key(source.sha256, tag)
+            tags.append(tag)
+            keys.append(key)
+            refreshing = refresh and refresh(source)
+            cached = None if refreshing else result_cache.get(key)
+            if cached is None and ledger and not refreshing:
+                data = ledger.lookup(source.sha256, tag)  # Known documents outlive cache eviction
+                if data:
+                    cached = {"data": data, "skip_reason": None}
+                    result_cache.put(key, cached)
+            if cached is None:
+                misses.append(source)
+            else:
+                outcome = FileOutcome(source.name)
+                outcome.data, outcome.skip_reason = cached["data"], cached["skip_reason"]
+                cached_outcomes[i] = outcome
+
+    extracted = iter_in_pool(extract_func, misses)
+    for i in range(len(sources)):
+        if i in cached_outcomes:
+            outcome = cached_outcomes[i]
+        else:
+            with timed("extract"):  # Wall time waiting on the pool
+                outcome = next(extracted)
+            # Parse errors are not cached so they get retried, nor budget skips, which a larger budget may avoid
+            if outcome.data or (outcome.skip_reason and outcome.skip_reason not in BUDGET_REASONS):
+                result_cache.put(keys[i], {"data": outcome.data, "skip_reason": outcome.skip_reason})
+        if ledger and outcome.data:
+            with timed("ledger"):
+                outcome.duplicates = ledger.record(sources[i], tags[i], outcome.data)
+        observe_outcome(outcome)
+        yield outcome
+
+
+def extract_with_cache(extract_func, sources, cache_tag, refresh=None):
+    """ List form of iter_with_cache. """
+    return list(iter_with_cache(extract_func, sources, cache_tag, refresh))
@@ -0,0 +1,150 @@
+from flask import Response, request
+from openpyxl import Workbook
+from pdf_source import read_uploads, release
+from result_cache import iter_with_cache
+import csv
+import io
+import os
+import tempfile
+
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+FORMATS = {"csv": "text/csv", "xlsx": XLSX}
+CHUNK_SIZE = 1024 * 1024
+
+# The columns json_to_column_extractor.html builds, in its order: (heading, keys to try, value when missing).
+# The profiles name the same field differently, so the first key present wins.
+TOOL_COLUMNS = [
+    ("Invoice Date", ("Document Date", "Invoice Date"), "N/A"),
+    ("Invoice No", ("Document No", "Invoice No"), "N/A"),
+    ("Non Taxable Amount", ("Non Taxable Amount",), None),
+    ("Taxable Amount", ("Taxable Amount",), None),
+    ("VAT Value", ("VAT Value",), None),
+]
+PARTY_COLUMNS = [
+    ("Shipper", ("Shipper",), "N/A"),
+    ("Consignee", ("Consignee", "Consignee Name"), "N/A"),
+]
+FILE_COLUMN = ("File", (), None)  # Filled from the outcome, not the row
+
+
+class UnknownFormat(ValueError):
+    pass
+
+
+def wants_spreadsheet():
+    """ The requested export format ("csv" or "xlsx"), or None for the usual JSON. """
+    export_format = request.args.get("format", "").lower()
+    if export_format and export_format not in FORMATS:
+        raise UnknownFormat(f"Unknown format {export_format!r}; expected one of: {', '.join(FORMATS)}")
+    return export_format or None
+
+
+def _flag(name):
+    return request.args.get(name, "").lower() in ("1", "yes", "true")
+
+
+def export_columns(profile):
+    """ Columns for this request's export.
+
+    By default these are the HTML tool's columns; ?parties=yes adds Shipper and Consignee (its
+    "Include Consignee & Shipper" option), ?columns=profile uses the profile's own columns instead,
+    and ?file=yes starts each row with the file name (the archive path for ZIP uploads).
+    """
+    if request.args.get("columns") == "profile":
+        columns = [(heading, (heading,), None) for heading, _ in profile["columns"]]
+    else:
+        columns = TOOL_COLUMNS + (PARTY_COLUMNS if _flag("parties") else [])
+    if _flag("file"):
+        columns = [FILE_COLUMN] + columns
+    return columns
+
+
+def export_row(columns, outcome):
+    row = []
+    for column in columns:
+        if column is FILE_COLUMN:
+            row.append(outcome.name)
+            continue
+        _, keys, missing = column
+        row.append(next((outcome.data[key] for key in keys if outcome.data.get(key) not in (None, "")), missing))
+    return row
+
+
+def _csv_rows(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if value is None else value for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _xlsx_file(rows, skipped, path):
+    """ Writes the rows to the .xlsx at path in write-only mode (rows go straight to disk as they arrive)
+    and yields the finished file in chunks. Skipped files get a sheet of their own. """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Invoices")
+    for row in rows:
+        sheet.append(row)
+    skipped_sheet = workbook.create_sheet("Skipped")
+    skipped_sheet.append(["File", "Reason"])
+    for outcome in skipped:
+        skipped_sheet.append([outcome.name, outcome.reason])
+    workbook.save(path)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def spreadsheet_response(files, extract_func, cache_tag, export_format, columns, tracing=None):
+    """ Streams the extracted invoices as a CSV or XLSX sheet, one row per invoice in upload order.
+
+    CSV rows are sent as soon as each file is extracted. An XLSX is only readable once complete, so
+    its rows are spooled to disk as they arrive and the file is sent at the end; memory stays flat
+    either way. Skipped files are left out of the rows (XLSX lists them on a "Skipped" sheet).
+    Spooled uploads and the temp workbook are removed when the server closes the response, whether
+    or not the body was ever sent.
+    """
+    uploads = read_uploads(files)
+    skipped = list(uploads.ignored)
+    temp_files = []
+
+    def rows():
+        yield [heading for heading, _, _ in columns]
+        for outcome in iter_with_cache(extract_func, uploads.sources, cache_tag, tracing and tracing.wants):
+            if tracing:
+                tracing.add(outcome)
+            if outcome.data:
+                yield export_row(columns, outcome)
+            else:
+                skipped.append(outcome)
+
+    def generate():
+        if export_format == "csv":
+            yield from _csv_rows(rows())
+        else:
+            fd, path = tempfile.mkstemp(prefix="export-", suffix=".xlsx")
+            os.close(fd)
+            temp_files.append(path)
+            yield from _xlsx_file(rows(), skipped, path)
+
+    def close():
+        release(uploads.sources)
+        for path in temp_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if tracing:
+            tracing.save()
+
+    response = Response(generate(), mimetype=FORMATS[export_format])
+    response.call_on_close(close)  # Also runs if the client disconnects, or the body is never iterated
+    response.headers["Content-Disposition"] = f"attachment; filename=invoices.{export_format}"
+    if tracing:
+        response.headers["X-Trace-Id"] = tracing.id
+    return response
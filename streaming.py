@@ -0,0 +1,65 @@
+from flask import Response, request
+from pdf_source import read_uploads, release
+from result_cache import iter_with_cache
+import json
+
+NDJSON = "application/x-ndjson"
+
+
+def wants_ndjson():
+    """ True when the client asked for Accept: application/x-ndjson (or ?stream=ndjson from a plain form). """
+    if request.args.get("stream") == "ndjson":
+        return True
+    accept = request.accept_mimetypes
+    return accept[NDJSON] > accept["application/json"]
+
+
+def ndjson_record(outcome):
+    if outcome.status == "ok":
+        record = {"file": outcome.name, "status": "ok", "layout": outcome.layout,
+                  "peak_memory_mb": outcome.peak_memory_mb, "data": outcome.data}
+        if outcome.duplicates:
+            record["duplicate_of"] = outcome.duplicates  # Same invoice number already in the ledger
+        return record
+    return {"file": outcome.name, "status": outcome.status, "reason": outcome.reason,
+            "peak_memory_mb": outcome.peak_memory_mb}
+
+
+def ndjson_response(files, extract_func, cache_tag, tracing=None):
+    """ Streams one JSON line per uploaded file, in upload order, as soon as each is extracted.
+
+    Skipped and failed files get inline records with a reason (ZIP members that are not PDFs come
+    first); a final summary line closes the stream. With a RequestTrace, the trace is saved once the
+    stream ends and its id is in the X-Trace-Id header. Spooled uploads are removed when the server
+    closes the response, whether or not the body was ever sent.
+    """
+    uploads = read_uploads(files)
+    sources = uploads.sources
+
+    def generate():
+        summary = {"status": "summary", "files": len(sources) + len(uploads.ignored), "extracted": 0, "skipped": 0,
+                   "errors": 0, "pages_skipped": 0, "layouts": {}}
+        for outcome in uploads.ignored:
+            summary["skipped"] += 1
+            yield json.dumps(ndjson_record(outcome)) + "\n"
+        for outcome in iter_with_cache(extract_func, sources, cache_tag, tracing and tracing.wants):
+            if tracing:
+                tracing.add(outcome)
+            record = ndjson_record(outcome)
+            summary[{"ok": "extracted", "skipped": "skipped", "error": "errors"}[outcome.status]] += 1
+            summary["pages_skipped"] += outcome.pages_skipped
+            if outcome.layout:
+                summary["layouts"][outcome.layout] = summary["layouts"].get(outcome.layout, 0) + 1
+            yield json.dumps(record) + "\n"
+        yield json.dumps(summary) + "\n"
+
+    def close():
+        release(sources)
+        if tracing:
+            tracing.save()
+
+    response = Response(generate(), mimetype=NDJSON)
+    response.call_on_close(close)  # Also runs if the client disconnects, or the body is never iterated
+    if tracing:
+        response.headers["X-Trace-Id"] = tracing.id
+    return response
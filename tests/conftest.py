@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))  # synthetic_invoices builds the test PDFs
+
+# Read when the app's modules are imported: keep the cache and ledger out of the working tree, and
+# extract in the test process
+STATE_DIR = tempfile.mkdtemp(prefix="invoice-tests-")
+os.environ.setdefault("CACHE_DIR", os.path.join(STATE_DIR, "cache"))
+os.environ.setdefault("LEDGER_DB", os.path.join(STATE_DIR, "ledger.sqlite3"))
+os.environ.setdefault("EXTRACT_WORKERS", "1")
+
+
+@pytest.fixture
+def synthetic_template(monkeypatch):
+    """ Registers the layout synthetic_invoices draws as the only template, as no real one is listed. """
+    import layout_templates
+    template = layout_templates.LayoutTemplate("synthetic-tax-invoice-a4", (595, 842), ("TAX INVOICE", "INVOICE NUMBER"), (
+        (0, 0, 0, 1, 0.15),     # Title, document number and date, shipper/consignee
+        (0, 0, 0.15, 1, 0.85),  # Charge table and totals, above the remittance footer
+    ))
+    monkeypatch.setattr(layout_templates, "TEMPLATES", [template])
+    return template
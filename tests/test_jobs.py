@@ -0,0 +1,25 @@
+""" Background jobs: the queue of queued and running jobs is bounded. """
+from app import app
+from jobs import JobStore, job_store
+from synthetic_invoices import corpus, invoice_pdf
+
+
+def test_store_refuses_jobs_past_max_pending():
+    store = JobStore(max_pending=2)
+    first, second = store.create(1), store.create(1)
+    assert first and second
+    assert store.full() and store.create(1) is None
+    store.finish(first, "done")
+    assert not store.full() and store.create(1)
+
+
+def test_post_jobs_is_refused_with_503_when_the_queue_is_full(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_store, "max_pending", 0)
+    spec = corpus(1, 7)[0]
+    path = tmp_path / spec.file_name
+    path.write_bytes(invoice_pdf(spec, 7))
+    with open(path, "rb") as f:
+        response = app.test_client().post("/jobs", data={"file": [(f, spec.file_name)]},
+                                          content_type="multipart/form-data")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
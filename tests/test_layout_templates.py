@@ -0,0 +1,108 @@
+""" Region-of-interest extraction: which files are read by region and which fall back to the full text,
+including those with a charge line outside the regions. """
+import re
+
+import pytest
+
+import engine
+import layout_templates
+from layout_templates import covers_fields
+from pdf_source import PDFSource
+from synthetic_invoices import InvoiceSpec, invoice_pdf, make_pdf
+
+FOOTER_LINE = 50  # First line index whose text sits in page 1's footer band (below 0.85 of the height)
+HEADER = ["TAX INVOICE", "INVOICE NUMBER INV-1", "INVOICE DATE 03-Mar-2025", "SHIPPER CONSIGNEE",
+          "ACME LOGISTICS LLC D H TRADING GROUP SPC CO", "CONSIGNEE D H TRADING GROUP SPC CO", "",
+          "CHARGE DESCRIPTION VAT AMOUNT TOTAL"]
+ROWS = ["Ocean Freight 1 5%=5.00 100.00 105.00", "Terminal Handling 2 Zero Rated 50.00 50.00"]
+TOTALS = ["TOTAL CHARGES 155.00", "SUBTOTAL 150.00", "VAT 5.00", "TOTAL AED 155.00"]
+
+
+def page(body, footer=()):
+    return body + [""] * (FOOTER_LINE - len(body)) + list(footer)
+
+
+@pytest.fixture(autouse=True)
+def template(synthetic_template):
+    return synthetic_template
+
+
+def extract(data, profile_name, roi=True, monkeypatch=None):
+    monkeypatch.setattr(engine, "ROI_EXTRACTION", roi)
+    return engine.extract_for_pool(PDFSource("INV-1.pdf", data, None, "sha"), profile_name)
+
+
+def spec(rows, terms_pages=0):
+    return InvoiceSpec("INV-1.pdf", "invoice", "INV-1", "D H TRADING GROUP SPC CO", True, rows, "mixed", terms_pages)
+
+
+def test_single_page_table_is_read_by_region(monkeypatch):
+    data = invoice_pdf(spec(8, terms_pages=2))
+    roi = extract(data, "tax-invoice", True, monkeypatch)
+    full = extract(data, "tax-invoice", False, monkeypatch)
+    assert roi.layout == "synthetic-tax-invoice-a4"
+    assert roi.pages_read == 1 and roi.pages_skipped == 2
+    assert roi.data == full.data and roi.status == "ok"
+
+
+def test_prefilter_profiles_do_not_lay_out_page_one_again(monkeypatch):
+    # consignee-check has already extracted page 1 whole to check the consignee
+    data = invoice_pdf(spec(8, terms_pages=2))
+    roi = extract(data, "consignee-check", True, monkeypatch)
+    assert roi.layout == "full-text"
+    assert roi.data == extract(data, "consignee-check", False, monkeypatch).data
+
+
+def test_table_running_onto_page_two_falls_back_to_full_text(monkeypatch):
+    data = invoice_pdf(spec(60))
+    roi = extract(data, "tax-invoice", True, monkeypatch)
+    assert roi.layout == "full-text"
+    assert roi.data == extract(data, "tax-invoice", False, monkeypatch).data
+
+
+@pytest.mark.parametrize("footer", [TOTALS, TOTALS[1:]], ids=["table-end-in-footer", "totals-in-footer"])
+def test_table_end_or_totals_in_footer_fall_back_to_full_text(footer, monkeypatch):
+    body = HEADER + ROWS + TOTALS[:len(TOTALS) - len(footer)]
+    data = make_pdf([page(body, footer)])
+    roi = extract(data, "tax-invoice", True, monkeypatch)
+    assert roi.layout == "full-text"
+    assert roi.data["Total AED"] == 155.0
+    assert roi.data == extract(data, "tax-invoice", False, monkeypatch).data
+
+
+ROWS_0 = ["Terminal Handling 1 Zero Rated 100.00 100.00", "Storage 2 Not Taxable 50.00 50.00"]
+TOTALS_0 = ["TOTAL CHARGES 150.00", "SUBTOTAL 150.00", "VAT 0.00", "TOTAL AED 150.00"]
+STRAY = "Inspection 3 5%=10.00 200.00 210.00"
+
+
+def test_charge_line_in_the_footer_falls_back_to_full_text(monkeypatch):
+    # With the table and totals complete in the regions, the stray row is only seen by the full text:
+    # the "text" layout counts every row after CHARGE DESCRIPTION, so the file is skipped
+    data = make_pdf([page(HEADER + ROWS_0 + TOTALS_0, [STRAY])])
+    roi = extract(data, "subtotal", True, monkeypatch)
+    assert roi.layout == "full-text"
+    assert roi.skip_reason == "taxable charges present"
+
+
+def test_charge_line_on_a_later_page_falls_back_to_full_text(monkeypatch):
+    data = make_pdf([page(HEADER + ROWS_0 + TOTALS_0), [STRAY]])
+    roi = extract(data, "subtotal", True, monkeypatch)
+    assert roi.layout == "full-text"
+    assert roi.data == extract(data, "subtotal", False, monkeypatch).data
+
+
+def test_no_templates_are_listed_without_a_real_carrier_layout(monkeypatch):
+    monkeypatch.undo()
+    assert layout_templates.TEMPLATES == []
+    assert not layout_templates.ROI_EXTRACTION  # Opt-in
+
+
+def test_covers_fields_needs_the_table_in_order_with_totals_after_it():
+    markers = [re.compile("INVOICE NUMBER")]
+    header = "INVOICE NUMBER INV-1"
+    table = "CHARGE DESCRIPTION\nrow\nTOTAL CHARGES 1\nTOTAL AED 1"
+    assert covers_fields([header, table], markers)
+    assert not covers_fields([header, "CHARGE DESCRIPTION\nrow"], markers)
+    assert not covers_fields([header + "\nCHARGE DESCRIPTION", "TOTAL CHARGES 1\nTOTAL AED 1"], markers)
+    assert not covers_fields([header, "TOTAL AED 1\nCHARGE DESCRIPTION\nrow\nTOTAL CHARGES 1"], markers)
+    assert not covers_fields(["CHARGE DESCRIPTION\nTOTAL CHARGES 1\nTOTAL AED 1"], [re.compile("INVOICE NUMBER")])
@@ -0,0 +1,42 @@
+""" The ledger's reports count each document once, however many profiles it was uploaded under. """
+import pytest
+
+from ledger import Ledger
+from pdf_source import PDFSource
+
+INVOICES = [
+    (PDFSource("INV-1.pdf", None, None, "a" * 64), {"Invoice No": "INV-1", "Invoice Date": "03-Mar-2025",
+                                                      "Consignee": "D H TRADING GROUP SPC CO", "Total AED": 30000.0}),
+    (PDFSource("INV-2.pdf", None, None, "b" * 64), {"Invoice No": "INV-2", "Invoice Date": "04-Mar-2025",
+                                                      "Consignee": "D H TRADING GROUP SPC CO", "Total AED": 18753.25}),
+]
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = Ledger(str(tmp_path / "ledger.sqlite3"))
+    for profile_name in ("subtotal", "shipper-consignee"):
+        for source, data in INVOICES:
+            assert ledger.record(source, f"engine-1:{profile_name}", data) == []
+    return ledger
+
+
+def test_totals_count_each_document_once(ledger):
+    assert ledger.totals() == [{"consignee": "D H TRADING GROUP SPC CO", "invoices": 2, "vat_value": None,
+                                "taxable": None, "non_taxable": None, "total_aed": 48753.25}]
+    assert ledger.totals(profile="subtotal")[0]["invoices"] == 2
+    assert ledger.totals(start="2025-03-04")[0]["total_aed"] == 18753.25
+
+
+def test_invoices_list_each_document_once_as_its_latest_extraction(ledger):
+    invoices = ledger.invoices()
+    assert [row["invoice_no"] for row in invoices] == ["INV-1", "INV-2"]
+    assert {row["profile"] for row in invoices} == {"shipper-consignee"}
+    assert [row["profile"] for row in ledger.invoices(profile="subtotal")] == ["subtotal", "subtotal"]
+
+
+def test_a_new_file_with_the_same_number_is_a_duplicate(ledger):
+    source = PDFSource("INV-1 copy.pdf", None, None, "c" * 64)
+    others = ledger.record(source, "engine-1:subtotal", INVOICES[0][1])
+    assert [other["sha256"] for other in others] == ["a" * 64]
+    assert ledger.totals()[0]["invoices"] == 3
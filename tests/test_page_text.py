@@ -0,0 +1,17 @@
+""" Per-file budgets: a file that runs out of pages stops with a fixed reason and the counts beside it. """
+import io
+import re
+
+import pdfplumber
+
+from page_text import PAGE_BUDGET_EXCEEDED, PageText
+from synthetic_invoices import make_pdf
+
+
+def test_page_budget_stops_with_a_fixed_reason():
+    with pdfplumber.open(io.BytesIO(make_pdf([["PAGE ONE"], ["PAGE TWO"], ["PAGE THREE"]]))) as pdf:
+        pages = PageText(pdf, [re.compile("NEVER PRINTED")], max_pages=2)
+        assert list(pages) == ["PAGE ONE", "PAGE TWO"]
+    assert pages.stopped == PAGE_BUDGET_EXCEEDED and not pages.complete
+    assert pages.stopped_detail == "read 2 of 3 pages"
+    assert pages.pages_read == 2 and pages.pages_skipped == 1
@@ -0,0 +1,71 @@
+""" The party-name automaton: longest and suffix matches, punctuation-blind tokens, and file reloads. """
+import os
+
+import pytest
+
+from party_names import PartyMatcher, PartyNames
+
+
+def test_short_name_inside_a_long_one_gives_the_long_one():
+    matcher = PartyMatcher(["ZARA", "ZARA HOME LLC"])
+    text = "ACME ZARA HOME LLC DUBAI"
+    name, start, end = matcher.find_longest(text)
+    assert name == "ZARA HOME LLC" and text[start:end] == "ZARA HOME LLC"
+    assert matcher.find_longest("ACME ZARA DUBAI")[0] == "ZARA"
+
+
+def test_overlapping_names_give_the_rightmost_on_ties():
+    matcher = PartyMatcher(["ACME LOGISTICS", "LOGISTICS LLC"])
+    assert matcher.find_longest("ACME LOGISTICS LLC")[0] == "LOGISTICS LLC"
+    assert matcher.find_longest("ACME LOGISTICS LTD")[0] == "ACME LOGISTICS"
+
+
+def test_a_failed_long_name_still_finds_the_name_inside_it():
+    # "A B C" is a prefix of "A B C D", so the name "B C" is only reached through the fail links
+    matcher = PartyMatcher(["A B C D", "B C", "C X Y"])
+    assert matcher.find_longest("A B C X")[0] == "B C"
+    assert matcher.find_longest("A B C X Y")[0] == "C X Y"
+    assert matcher.find_longest("A B C D")[0] == "A B C D"
+    assert matcher.find_longest("A B D") is None
+
+
+def test_suffix_only_matches_names_that_end_the_text():
+    matcher = PartyMatcher(["ZARA", "ZARA HOME LLC"])
+    assert matcher.find_suffix("ACME ZARA HOME LLC DUBAI") is None
+    text = "ACME GENERAL TRADING ZARA HOME LLC"
+    name, start, end = matcher.find_suffix(text)
+    assert name == "ZARA HOME LLC" and text[start:end] == "ZARA HOME LLC"
+    assert matcher.find_suffix("MASSIMO ZARA")[0] == "ZARA"
+    assert matcher.find_suffix("") is None
+
+
+@pytest.mark.parametrize("text", ["INDITEX SA", "Inditex, S.A.", "INDITEX S.A", "inditex sa."])
+def test_punctuation_and_case_are_ignored(text):
+    matcher = PartyMatcher(["INDITEX S.A.", "D H TRADING GROUP SPC CO"])
+    name, start, end = matcher.find_longest(f"CONSIGNEE {text}")
+    assert name == "INDITEX S.A." and f"CONSIGNEE {text}"[start:end].upper().startswith("INDITEX")
+
+
+def test_hyphens_and_slashes_separate_words_and_the_first_spelling_wins():
+    matcher = PartyMatcher(["D H TRADING", "INDITEX S.A.", "INDITEX SA", "AL-FUTTAIM"])
+    assert matcher.names == ["D H TRADING", "INDITEX S.A.", "AL-FUTTAIM"]
+    assert matcher.find_longest("AL FUTTAIM/D H-TRADING")[0] == "D H TRADING"
+    assert matcher.find_longest("SHIPPER AL FUTTAIM")[0] == "AL-FUTTAIM"
+    assert matcher.find_longest("D.H. TRADING") is None  # "D.H." is the one word "DH"
+
+
+def test_the_names_file_is_reloaded_when_it_changes(tmp_path):
+    path = tmp_path / "party_names.txt"
+    path.write_text("# comment\nZARA\n\n")
+    names = PartyNames(str(path), check_seconds=0)
+    first = names.matcher()
+    assert first.names == ["ZARA"] and names.matcher() is first  # Unchanged file: same matcher
+
+    path.write_text("ZARA\nINDITEX S.A.\n")
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10 ** 9,) * 2)
+    reloaded = names.matcher()
+    assert reloaded.find_longest("INDITEX SA")[0] == "INDITEX S.A."
+    assert reloaded.version != first.version and names.status()["names"] == 2
+
+    path.unlink()  # Mid-replace: keep serving the last good list
+    assert names.matcher() is reloaded
@@ -0,0 +1,32 @@
+""" The page 1 pre-filter: other consignees' files stop at page 1, and files that pass reuse its text. """
+import pdfplumber.page
+
+import engine
+from pdf_source import PDFSource
+from synthetic_invoices import InvoiceSpec, invoice_pdf
+
+
+def extract(consignee, monkeypatch):
+    calls = []
+    extract_text = pdfplumber.page.Page.extract_text
+
+    def counted(page, *args, **kwargs):
+        calls.append(page.page_number)
+        return extract_text(page, *args, **kwargs)
+
+    monkeypatch.setattr(pdfplumber.page.Page, "extract_text", counted)
+    monkeypatch.setattr(engine, "ROI_EXTRACTION", False)
+    spec = InvoiceSpec("INV-1.pdf", "invoice", "INV-1", consignee, True, 8, "mixed", 2)
+    return engine.extract_for_pool(PDFSource(spec.file_name, invoice_pdf(spec), None, "sha"), "consignee-check"), calls
+
+
+def test_other_consignee_is_rejected_from_page_one(monkeypatch):
+    outcome, calls = extract("INDITEX S.A.", monkeypatch)
+    assert outcome.layout == "prefilter" and outcome.skip_reason == "consignee mismatch"
+    assert calls == [1]
+
+
+def test_page_one_text_is_extracted_once_for_files_that_pass(monkeypatch):
+    outcome, calls = extract(engine.CONSIGNEE_NAME, monkeypatch)
+    assert outcome.status == "ok" and outcome.data["Consignee Name"] == engine.CONSIGNEE_NAME
+    assert calls == [1]  # The charge table and totals are on page 1, so the terms pages are never read
@@ -0,0 +1,43 @@
+""" Every profile against what the deployment it replaced returned for the synthetic corpus.
+
+profiles_expected.json holds the /upload responses of the pre-engine app.py and server*.py (one per
+profile) for corpus(40, 7), with every fourth file named "... TAX INVOICE.pdf" for the exemption.
+server4.py took the first line containing CONSIGNEE even when nothing followed it, which on this
+corpus is the bare SHIPPER CONSIGNEE heading, and raised on every file; its expectations were
+recorded with that lookup skipping lines without a value, as the engine's field rule does.
+"""
+import json
+import os
+
+import pytest
+
+import engine
+from pdf_source import PDFSource
+from synthetic_invoices import corpus, invoice_pdf
+
+EXPECTED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles_expected.json")
+SEED = 7
+
+with open(EXPECTED_FILE) as f:
+    EXPECTED = json.load(f)
+
+
+@pytest.fixture(scope="module")
+def sources():
+    specs = corpus(40, SEED)
+    names = [f"{spec.number} TAX INVOICE.pdf" if i % 4 == 3 else spec.file_name for i, spec in enumerate(specs)]
+    return [PDFSource(name, invoice_pdf(spec, SEED), None, name) for spec, name in zip(specs, names)]
+
+
+def test_every_profile_has_expectations():
+    assert set(EXPECTED) == set(engine.PROFILES)
+    assert all(EXPECTED.values())  # Each profile keeps some files
+
+
+@pytest.mark.parametrize("roi", [True, False], ids=["roi", "full-text"])
+@pytest.mark.parametrize("profile_name", list(engine.PROFILES))
+def test_profile_matches_the_server_it_replaced(profile_name, roi, sources, synthetic_template, monkeypatch):
+    monkeypatch.setattr(engine, "ROI_EXTRACTION", roi)
+    outcomes = [engine.extract_for_pool(source, profile_name) for source in sources]
+    assert [outcome.error for outcome in outcomes if outcome.error] == []
+    assert [outcome.data for outcome in outcomes if outcome.data] == EXPECTED[profile_name]
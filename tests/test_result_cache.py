@@ -0,0 +1,120 @@
+""" The two-tier result cache, and repeat uploads answered from it without re-extracting. """
+import hashlib
+import os
+
+import pytest
+
+import metrics
+import result_cache
+from extraction_context import FileOutcome
+from page_text import PAGE_BUDGET_EXCEEDED
+from pdf_source import PDFSource
+from result_cache import ResultCache, cache_key, iter_with_cache
+
+
+def test_memory_then_disk_tier(tmp_path):
+    cache = ResultCache(str(tmp_path), memory_items=2)
+    key = cache_key("a" * 64, "engine-1:subtotal")
+    assert cache.get(key) is None
+    cache.put(key, {"data": {"Invoice No": "INV-1"}, "skip_reason": None})
+    assert cache.get(key) == {"data": {"Invoice No": "INV-1"}, "skip_reason": None}
+
+    restarted = ResultCache(str(tmp_path), memory_items=2)  # A new worker: empty memory, same directory
+    assert restarted.get(key)["data"] == {"Invoice No": "INV-1"}
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["misses"] == 1
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_key_depends_on_the_rules_version():
+    assert cache_key("a" * 64, "engine-1:subtotal") != cache_key("a" * 64, "engine-1:subtotal:roi")
+    assert cache_key("a" * 64, "engine-1:subtotal") != cache_key("b" * 64, "engine-1:subtotal")
+
+
+def test_memory_tier_is_lru_bounded(tmp_path):
+    cache = ResultCache(str(tmp_path), memory_items=2)
+    for name in "abc":
+        cache.put(name * 64, {"data": name, "skip_reason": None})
+    cache.get("b" * 64)  # b is now the most recently used
+    cache.put("d" * 64, {"data": "d", "skip_reason": None})
+    assert list(cache.memory) == ["b" * 64, "d" * 64]
+    assert cache.get("a" * 64)["data"] == "a"  # Still on disk
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_evicts_least_recently_used_files(tmp_path):
+    cache = ResultCache(str(tmp_path), memory_items=1)
+    value = {"data": "x" * 100, "skip_reason": None}
+    for i, name in enumerate("abcd"):
+        cache.put(name * 64, value)
+        os.utime(cache._path(name * 64), (i, i))  # Oldest first
+    entry_bytes = os.path.getsize(cache._path("a" * 64))
+    cache.disk_bytes = entry_bytes * 4
+    cache.put("e" * 64, value)  # Over budget: back down to 90% of it
+    remaining = sorted(os.path.basename(path)[0] for path, _, _ in cache._disk_entries())
+    assert remaining == ["c", "d", "e"]
+    assert cache.stats()["evictions"] == 2 and cache.stats()["disk_bytes"] == 3 * entry_bytes
+
+
+def test_unreadable_disk_entry_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    path = cache._path("a" * 64)
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w") as f:
+        f.write("{not json")
+    assert cache.get("a" * 64) is None
+
+
+@pytest.fixture
+def counted_extract(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "result_cache", ResultCache(str(tmp_path)))
+    monkeypatch.setattr(result_cache, "ledger", None)
+    extracted = []
+
+    def extract(source):
+        extracted.append(source.name)
+        outcome = FileOutcome(source.name)
+        if source.data == b"broken":
+            outcome.fail("no text")
+        elif source.data == b"long":
+            outcome.skip(PAGE_BUDGET_EXCEEDED, "read 500 of 812 pages")
+        else:
+            outcome.data = {"Invoice No": source.data.decode()}
+        return outcome
+    return extract, extracted
+
+
+def sources(*contents):
+    return [PDFSource(f"{i}.pdf", content, None, hashlib.sha256(content).hexdigest()) for i, content in enumerate(contents)]
+
+
+def tag(source):
+    return "engine-1:test"
+
+
+def test_repeats_come_from_the_cache_in_upload_order(counted_extract):
+    extract, extracted = counted_extract
+    first = [outcome.data for outcome in iter_with_cache(extract, sources(b"INV-1", b"INV-2"), tag)]
+    again = [outcome.data for outcome in iter_with_cache(extract, sources(b"INV-3", b"INV-2", b"INV-1"), tag)]
+    assert first == [{"Invoice No": "INV-1"}, {"Invoice No": "INV-2"}]
+    assert again == [{"Invoice No": "INV-3"}, {"Invoice No": "INV-2"}, {"Invoice No": "INV-1"}]
+    assert extracted == ["0.pdf", "1.pdf", "0.pdf"]  # Only INV-3 was new the second time
+
+
+def test_parse_errors_are_retried_and_refresh_skips_the_lookup(counted_extract):
+    extract, extracted = counted_extract
+    for _ in range(2):
+        list(iter_with_cache(extract, sources(b"broken", b"INV-1"), tag))
+    assert extracted == ["0.pdf", "1.pdf", "0.pdf"]
+    list(iter_with_cache(extract, sources(b"INV-1"), tag, refresh=lambda source: True))
+    assert extracted[-1] == "0.pdf"
+
+
+def test_budget_skips_are_retried_and_counted_under_a_fixed_label(counted_extract):
+    extract, extracted = counted_extract
+    labels = {"reason": "page budget exceeded"}
+    before = metrics.registry.get_sample_value("invoice_files_skipped_total", labels) or 0
+    for _ in range(2):
+        outcomes = list(iter_with_cache(extract, sources(b"long"), tag))
+    assert extracted == ["0.pdf", "0.pdf"]  # A larger budget may read it, so it is not cached
+    assert outcomes[0].reason == "page budget exceeded: read 500 of 812 pages"
+    assert metrics.registry.get_sample_value("invoice_files_skipped_total", labels) == before + 2
@@ -0,0 +1,46 @@
+""" CSV/XLSX exports remove spooled uploads and the temp workbook when the server closes them. """
+import io
+import os
+import tempfile
+
+import pytest
+from flask import request
+from openpyxl import load_workbook
+
+import pdf_source
+from app import app
+from engine import pipeline
+from spreadsheet_export import TOOL_COLUMNS, spreadsheet_response
+from synthetic_invoices import corpus, invoice_pdf
+
+
+def upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_source, "SPOOL_THRESHOLD", 0)  # Spool every upload to a temp file
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    spec = corpus(1, 7)[0]
+    path = tmp_path.parent / spec.file_name
+    path.write_bytes(invoice_pdf(spec, 7))
+    return path
+
+
+@pytest.mark.parametrize("export_format", ["csv", "xlsx"])
+def test_temp_files_are_removed_when_an_unread_response_closes(export_format, tmp_path, monkeypatch):
+    path = upload(tmp_path, monkeypatch)
+    with open(path, "rb") as f, app.test_request_context("/upload", method="POST", data={"file": [(f, path.name)]},
+                                                          content_type="multipart/form-data"):
+        response = spreadsheet_response(request.files.getlist("file"), *pipeline("subtotal"), export_format,
+                                        TOOL_COLUMNS)
+        assert os.listdir(tmp_path)  # Spooled, and the body is never read
+        response.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_temp_workbook_is_removed_after_an_xlsx_export(tmp_path, monkeypatch):
+    path = upload(tmp_path, monkeypatch)
+    with open(path, "rb") as f:
+        response = app.test_client().post("/upload?format=xlsx", data={"file": [(f, path.name)]},
+                                          content_type="multipart/form-data")
+    workbook = load_workbook(io.BytesIO(response.get_data()))
+    response.close()
+    assert workbook.sheetnames == ["Invoices", "Skipped"]
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,41 @@
+""" NDJSON responses remove spooled uploads when the server closes them, even if never iterated. """
+import os
+import tempfile
+
+from flask import request
+
+import pdf_source
+from app import app
+from engine import pipeline
+from streaming import ndjson_response
+from synthetic_invoices import corpus, invoice_pdf
+
+
+def upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_source, "SPOOL_THRESHOLD", 0)  # Spool every upload to a temp file
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    spec = corpus(1, 7)[0]
+    path = tmp_path.parent / spec.file_name
+    path.write_bytes(invoice_pdf(spec, 7))
+    return path
+
+
+def test_spooled_uploads_are_removed_when_an_unread_response_closes(tmp_path, monkeypatch):
+    path = upload(tmp_path, monkeypatch)
+    with open(path, "rb") as f, app.test_request_context("/upload", method="POST", data={"file": [(f, path.name)]},
+                                                          content_type="multipart/form-data"):
+        response = ndjson_response(request.files.getlist("file"), *pipeline("subtotal"))
+        assert os.listdir(tmp_path)  # Spooled, and the body is never read
+        response.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_spooled_uploads_are_removed_after_the_stream(tmp_path, monkeypatch):
+    path = upload(tmp_path, monkeypatch)
+    with open(path, "rb") as f:
+        response = app.test_client().post("/upload?stream=ndjson", data={"file": [(f, path.name)]},
+                                          content_type="multipart/form-data")
+    lines = response.get_data(as_text=True).splitlines()
+    response.close()
+    assert lines[-1].startswith('{"status": "summary"')
+    assert os.listdir(tmp_path) == []
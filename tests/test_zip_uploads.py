@@ -0,0 +1,98 @@
+""" ZIP uploads: members are keyed by archive path, and the decompression-bomb limits reject the archive. """
+import io
+import os
+import tempfile
+import zipfile
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import pdf_source
+from app import app
+from synthetic_invoices import corpus, invoice_pdf
+
+SPECS = corpus(2, 7)
+PDFS = [invoice_pdf(spec, 7) for spec in SPECS]
+
+
+def archive(members, compression=zipfile.ZIP_DEFLATED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression) as zf:
+        for name, data in members:
+            if name.endswith("/"):
+                zf.writestr(zipfile.ZipInfo(name), b"")
+            else:
+                zf.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def upload(*files, profile="tax-invoice"):
+    return app.test_client().post(f"/upload?profile={profile}", data={"file": list(files)},
+                                  content_type="multipart/form-data")
+
+
+def test_members_are_keyed_by_archive_path():
+    response = upload((archive([("march/", b""), ("march/a.pdf", PDFS[0]), ("march/b.PDF", PDFS[1]),
+                                ("notes.txt", b"hello"), ("__MACOSX/march/._a.pdf", b"x"),
+                                ("march/.DS_Store", b"x")]), "batch.zip"), profile="subtotal")
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["skipped"][0] == {"file": "notes.txt", "reason": "not a PDF"}
+    assert [f["file"] for f in body["files"]] == ["notes.txt", "march/a.pdf", "march/b.PDF"]
+    assert set(body["by_file"]) <= {"march/a.pdf", "march/b.PDF"}
+    assert body["by_file"] and list(body["by_file"].values()) == body["results"]
+
+
+@pytest.mark.parametrize("setting, value, members, message", [
+    ("ZIP_MAX_MEMBERS", 1, [("a.pdf", PDFS[0]), ("b.pdf", PDFS[1])], "2 members; the limit is 1"),
+    ("ZIP_MAX_TOTAL_BYTES", len(PDFS[0]), [("a.pdf", PDFS[0]), ("b.pdf", PDFS[1])], "archive expands to"),
+    ("ZIP_MAX_MEMBER_BYTES", 1000, [("a.pdf", PDFS[0])], "a.pdf expands to"),
+    ("ZIP_MAX_RATIO", 200, [("bomb.pdf", b"\0" * (1024 * 1024))], "compression ratio above 200"),
+], ids=["members", "total-bytes", "member-bytes", "ratio"])
+def test_limits_reject_the_archive(setting, value, members, message, monkeypatch):
+    monkeypatch.setattr(pdf_source, setting, value)
+    response = upload((archive(members), "batch.zip"))
+    assert response.status_code == 413
+    assert message in response.get_json()["error"]
+
+
+def test_inflated_bytes_are_capped_whatever_the_declared_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_source, "SPOOL_THRESHOLD", 0)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    with pytest.raises(pdf_source.ArchiveRejected, match="expands beyond 100 bytes"):
+        pdf_source._read_stream("a.pdf", io.BytesIO(PDFS[0]), 10, limit=100)
+    assert os.listdir(tmp_path) == []  # The partly spooled member is removed
+
+
+def test_spooled_members_are_removed_when_a_later_member_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_source, "SPOOL_THRESHOLD", 0)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    response = upload((archive([("a.pdf", PDFS[0]), ("bomb.pdf", b"\0" * (1024 * 1024))]), "batch.zip"))
+    assert response.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("zipped", [True, False], ids=["archive", "plain-uploads"])
+def test_files_past_the_request_memory_budget_are_spooled(zipped, tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_source, "SPOOL_REQUEST_BYTES", len(PDFS[0]))
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    members = [("a.pdf", PDFS[0]), ("b.pdf", PDFS[1]), ("c.pdf", PDFS[0])]
+    if zipped:
+        files = [FileStorage(archive(members), "batch.zip")]
+    else:
+        files = [FileStorage(io.BytesIO(data), name) for name, data in members]
+    with pdf_source.spooled_uploads(files) as uploads:
+        assert [source.path is None for source in uploads.sources] == [True, False, False]
+        assert len(os.listdir(tmp_path)) == 2
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("files, message", [
+    ([(archive([("a.pdf", PDFS[0])]), "a.zip"), (io.BytesIO(PDFS[1]), "b.pdf")], "single ZIP archive"),
+    ([(io.BytesIO(b"PK\x03\x04 not really a zip"), "a.pdf")], "not a valid ZIP archive"),
+], ids=["zip-with-other-files", "corrupt"])
+def test_unusable_uploads_are_rejected(files, message):
+    response = upload(*files)
+    assert response.status_code == 413
+    assert message in response.get_json()["error"]
@@ -0,0 +1,158 @@
+from engine import PROFILES, extract_for_pool
+from extract_pool import EXTRACT_WORKERS, map_in_pool
+from flask import jsonify
+from functools import partial
+from io import BytesIO
+from metrics import STARTUP_SECONDS
+from openpyxl import Workbook
+from pdf_source import PDFSource
+from spreadsheet_export import TOOL_COLUMNS
+import os
+import threading
+import time
+
+# Cold-start handling. With gunicorn.conf.py the app, pdfplumber/pdfminer and openpyxl are imported
+# once in the master and run() exercises them there before the fork, so every worker (and every
+# extraction process it forks) shares those pages copy-on-write instead of importing its own copy.
+# Each worker then starts its extraction pool and warms it in the background; GET /ready answers 503
+# until that is done. Elsewhere (flask run, python app.py) the first /ready call starts the warm-up.
+
+WARMUP_LINES = [
+    "TAX INVOICE", "INVOICE NUMBER WARMUP-1", "INVOICE DATE 01-Jan-2025", "SHIPPER CONSIGNEE",
+    "WARMUP SHIPPER D H TRADING GROUP SPC CO", "CHARGE DESCRIPTION VAT AMOUNT TOTAL",
+    "Ocean Freight Zero Rated 10.00 10.00", "SUBTOTAL 10.00", "VAT 0.00", "TOTAL AED 10.00", "TOTAL CHARGES 10.00",
+]
+
+
+def warmup_pdf(lines=WARMUP_LINES):
+    """ A one-page, Helvetica-only PDF of the given lines. """
+    text = "\n".join(f"1 0 0 1 20 {280 - i * 14} Tm ({line}) Tj" for i, line in enumerate(lines))
+    stream = f"BT\n/F1 10 Tf\n{text}\nET".encode("latin-1")
+    objects = [
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Type /Pages /Kids [4 0 R] /Count 1 >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 400 300] /Contents 3 0 R /Resources << /Font << /F1 1 0 R >> >> >>",
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+    ]
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 5 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
+
+
+def process_started():
+    """ Wall-clock start of this process (its fork, for a worker), from /proc; None where unavailable. """
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime "))
+    except (OSError, IndexError, ValueError, StopIteration):
+        return None
+    return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def warm_extraction():
+    """ Extracts the warm-up PDF under every profile, inline (imports, regexes, party names, layout code). """
+    source = PDFSource("warmup.pdf", warmup_pdf(), None, "warmup")
+    for profile_name in PROFILES:
+        extract_for_pool(source, profile_name)
+
+
+def warm_spreadsheet():
+    """ Writes a one-row XLSX in write-only mode, as ?format=xlsx does. """
+    row = [heading for heading, _, _ in TOOL_COLUMNS]
+    workbook = Workbook(write_only=True)
+    workbook.create_sheet("Invoices").append(row)
+    workbook.save(BytesIO())
+
+
+def warm_pool():
+    """ Starts this process's extraction pool (its processes fork from this, already warm, process). """
+    source = PDFSource("warmup.pdf", warmup_pdf(), None, "warmup")
+    map_in_pool(partial(extract_for_pool, profile_name="subtotal"), [source] * EXTRACT_WORKERS)
+
+
+class Startup:
+    """ What this process's start-up cost, and whether it is ready to serve uploads. """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.preloaded = False  # Warmed in the gunicorn master before forking
+        self.seconds = {}  # Phase -> seconds: import (process start to app loaded), warmup, pool, ready
+        self.started = False
+        self.ready = threading.Event()
+        self.error = None
+
+    def app_imported(self):
+        """ Called once the app module has loaded (in the master when preloading). """
+        started = process_started()
+        if started is not None and "import" not in self.seconds:
+            self.seconds["import"] = round(time.time() - started, 3)
+
+    def run(self):
+        """ Warms the modules in this process. Never starts a process pool, so it is safe before a fork. """
+        started = time.perf_counter()
+        warm_extraction()
+        warm_spreadsheet()
+        self.seconds["warmup"] = round(time.perf_counter() - started, 3)
+
+    def preload(self):
+        """ gunicorn master, after preloading the app: warm up once for every worker. """
+        self.run()
+        self.preloaded = True
+        record_startup(self.seconds)
+
+    def start(self, report=None):
+        """ Worker side: warms up (unless the master already did) and the pool, in the background.
+        report(status) is called once the worker is ready. """
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._warm, args=(report,), name="warmup", daemon=True).start()
+
+    def _warm(self, report):
+        try:
+            if not self.preloaded:
+                self.run()
+            started = time.perf_counter()
+            warm_pool()
+            self.seconds["pool"] = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            self.error = f"warm-up failed: {e}"  # Still serve; requests just pay the cold start
+        started = process_started()
+        if started is not None:
+            self.seconds["ready"] = round(time.time() - started, 3)  # This process's start to ready
+        record_startup(self.seconds)
+        self.ready.set()
+        if report:
+            report(self.status())
+
+    def status(self):
+        return {"ready": self.ready.is_set(), "preloaded": self.preloaded, "pid": os.getpid(),
+                "seconds": dict(self.seconds), "error": self.error}
+
+
+def record_startup(seconds):
+    for phase, value in seconds.items():
+        STARTUP_SECONDS.labels(phase).set(value)
+
+
+startup = Startup()
+
+
+def register_readiness_routes(app):
+    """ Adds GET /ready: 200 once warm-up has finished in this worker, 503 (with progress) before. """
+
+    @app.route("/ready", methods=["GET"])
+    def ready():
+        startup.start()  # No-op under gunicorn.conf.py, which starts it when the worker boots
+        return jsonify(startup.status()), 200 if startup.ready.is_set() else 503